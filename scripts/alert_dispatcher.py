@@ -0,0 +1,331 @@
+"""
+Alert Dispatcher - 异步告警投递
+
+扫描循环只调用 submit()（非阻塞），投递在后台线程的 asyncio 事件循环中完成：
+1. 去抖：同一 (symbol, 方向) 在 debounce_seconds 内只投递第一条（按信号时间，--stride 1 的连续触发只发一次）
+2. 有界队列：队列满时丢弃新告警并计数，扫描循环永不阻塞
+3. 批量：每批最多 batch_size 条，或等待 batch_interval 秒后发出
+4. 重试：每个 sink 独立重试，指数退避 (带抖动)，超过 max_retries 记为该 sink 失败
+5. 统计：投递延迟 (入队 -> 投递成功) p50/p99、去抖/丢弃/失败/重试计数；
+   至少一个 sink 投递成功的告警计为 delivered，全部 sink 失败才计为 failed，另按 sink 统计失败条数
+
+Sink：
+- WebhookSink: POST JSON {"alerts": [...]} 到 HTTP 接收端
+- FileSink: 追加 JSONL（dashboard 读取该文件作为告警流）
+
+使用：
+    python scripts/alert_dispatcher.py    # 本地 HTTP 接收端演示（含随机失败以验证重试）
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+import urllib.request
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from metrics import REGISTRY
+
+ALERTS_TOTAL = REGISTRY.counter('alerts_total', '告警数 (submitted/debounced/dropped/delivered/failed)', ['outcome'])
+ALERT_RETRIES = REGISTRY.counter('alert_retries_total', '告警投递重试次数', ['sink'])
+ALERT_SINK_FAILURES = REGISTRY.counter('alert_sink_failures_total', '重试耗尽后投递失败的告警数', ['sink'])
+ALERT_DELIVERY_LAG = REGISTRY.histogram('alert_delivery_lag_seconds', '告警入队到投递成功的延迟 (秒)')
+ALERT_QUEUE_DEPTH = REGISTRY.gauge('alert_queue_depth', '告警投递队列深度')
+
+# =================配置=================
+ALERT_FEED = "data/alert_feed.jsonl"
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_BATCH_INTERVAL = 0.5   # 秒
+DEFAULT_DEBOUNCE = 300.0       # 秒
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE = 0.5             # 秒
+BACKOFF_MAX = 30.0             # 秒
+# =====================================
+
+
+class WebhookSink:
+    """HTTP webhook（标准库 urllib，在线程中执行，不阻塞事件循环）"""
+
+    def __init__(self, url: str, timeout: float = 5.0, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.name = f"webhook:{url}"
+
+    def _post(self, body: bytes):
+        req = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            if resp.status >= 300:
+                raise IOError(f"HTTP {resp.status}")
+
+    async def send(self, alerts: List[dict]):
+        body = json.dumps({'alerts': alerts}, ensure_ascii=False, default=str).encode('utf-8')
+        await asyncio.to_thread(self._post, body)
+
+
+class FileSink:
+    """追加写 JSONL（每批一次 write）"""
+
+    def __init__(self, path: str = ALERT_FEED):
+        self.path = path
+        self.name = f"file:{path}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _write(self, text: str):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(text)
+
+    async def send(self, alerts: List[dict]):
+        text = "".join(json.dumps(a, ensure_ascii=False, default=str) + "\n" for a in alerts)
+        await asyncio.to_thread(self._write, text)
+
+
+class AlertDispatcher:
+    """非阻塞告警投递器（后台线程运行 asyncio 事件循环）"""
+
+    def __init__(
+        self,
+        sinks: Sequence,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_interval: float = DEFAULT_BATCH_INTERVAL,
+        debounce_seconds: float = DEFAULT_DEBOUNCE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.sinks = list(sinks)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.debounce_seconds = debounce_seconds
+        self.max_retries = max_retries
+
+        self._last_sent: Dict[tuple, float] = {}
+        self._debounce_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'debounced': 0, 'dropped': 0, 'delivered': 0, 'failed': 0, 'retries': 0}
+        self.sink_failures: Dict[str, int] = {sink.name: 0 for sink in self.sinks}
+        self._latencies: List[float] = []
+
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    # ---------------- 扫描线程调用 ----------------
+
+    def submit(self, alert: dict) -> bool:
+        """
+        提交告警（非阻塞）；被去抖时返回 False，否则返回 True 表示已交给事件循环入队。
+
+        去抖检查与去抖时间的占位在同一把锁内完成，并发提交的同一 key 只有一条通过。
+        返回 True 后队列仍可能已满：此时在事件循环中丢弃并计入 dropped，同时撤销占位，
+        被丢弃的告警不会让同一 key 在去抖窗口内被继续抑制。
+        """
+        ts = alert.get('ts', time.time())
+        key = (alert.get('symbol'), alert.get('type'))
+        with self._debounce_lock:
+            self.stats['submitted'] += 1
+            ALERTS_TOTAL.inc(outcome='submitted')
+            if self._debounced(alert, ts):
+                return False
+            prev = self._last_sent.get(key)
+            self._last_sent[key] = ts
+        alert = dict(alert, _enqueued_at=time.time())
+        self._loop.call_soon_threadsafe(self._enqueue, alert, key, ts, prev)
+        return True
+
+    def _debounced(self, alert: dict, ts: float) -> bool:
+        """(调用方持有 _debounce_lock) 同一 (symbol, 方向) 在去抖窗口内已有告警被接受则计数并返回 True"""
+        last = self._last_sent.get((alert.get('symbol'), alert.get('type')))
+        if last is not None and 0 <= ts - last < self.debounce_seconds:
+            self.stats['debounced'] += 1
+            ALERTS_TOTAL.inc(outcome='debounced')
+            return True
+        return False
+
+    def close(self, timeout: float = 10.0):
+        """等待已入队告警投递完毕（最多 timeout 秒）后停止"""
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    def summary(self) -> dict:
+        out = dict(self.stats)
+        with self._debounce_lock:
+            out['sink_failures'] = {name: n for name, n in self.sink_failures.items() if n}
+            lat = np.array(self._latencies) * 1000 if self._latencies else None
+        out['latency_p50_ms'] = float(np.percentile(lat, 50)) if lat is not None else None
+        out['latency_p99_ms'] = float(np.percentile(lat, 99)) if lat is not None else None
+        out['queue_depth'] = self._queue.qsize()
+        return out
+
+    # ---------------- 事件循环内部 ----------------
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._worker = self._loop.create_task(self._consume())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _enqueue(self, alert: dict, key: tuple, ts: float, prev: Optional[float]):
+        try:
+            self._queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            with self._debounce_lock:
+                self.stats['dropped'] += 1
+                ALERTS_TOTAL.inc(outcome='dropped')
+                # 撤销 submit 的占位（之后若已有同一 key 的新占位则保留）
+                if self._last_sent.get(key) == ts:
+                    if prev is None:
+                        del self._last_sent[key]
+                    else:
+                        self._last_sent[key] = prev
+        ALERT_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def _next_batch(self) -> List[dict]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self):
+        while True:
+            batch = await self._next_batch()
+            ALERT_QUEUE_DEPTH.set(self._queue.qsize())
+            payload = [{k: v for k, v in a.items() if not k.startswith('_')} for a in batch]
+            results = await asyncio.gather(*(self._send_with_retry(s, payload) for s in self.sinks))
+            now = time.time()
+            # 每个 sink 整批成功或失败；告警只要有一个 sink 投递成功即为 delivered
+            outcome = 'delivered' if any(results) else 'failed'
+            lags = [now - a['_enqueued_at'] for a in batch]
+            with self._debounce_lock:
+                self.stats[outcome] += len(batch)
+                for sink, ok in zip(self.sinks, results):
+                    if not ok:
+                        self.sink_failures[sink.name] += len(batch)
+                if outcome == 'delivered':
+                    self._latencies.extend(lags)
+                    del self._latencies[:-10000]
+            ALERTS_TOTAL.inc(len(batch), outcome=outcome)
+            for sink, ok in zip(self.sinks, results):
+                if not ok:
+                    ALERT_SINK_FAILURES.inc(len(batch), sink=sink.name)
+            if outcome == 'delivered':
+                for lag in lags:
+                    ALERT_DELIVERY_LAG.observe(lag)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _send_with_retry(self, sink, alerts: List[dict]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await sink.send(alerts)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"   ⚠️ 告警投递失败 ({sink.name}, {len(alerts)} 条): {e}")
+                    return False
+                self.stats['retries'] += 1
+                ALERT_RETRIES.inc(sink=sink.name)
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        return False
+
+    async def _shutdown(self):
+        await self._queue.join()
+        self._worker.cancel()
+
+
+def alerts_from_check_signal(detector, df, idx: int, symbol: str, bar: Optional[str] = None) -> List[dict]:
+    """把 PineSignalDetector.check_signal 的结果转成告警（df 需已计算指标与状态信号）"""
+    is_long, is_short = detector.check_signal(df, idx)
+    alerts = []
+    for fired, signal_type in ((is_long, 'LONG'), (is_short, 'SHORT')):
+        if not fired:
+            continue
+        row = df.iloc[idx]
+        ts = row['timestamp'] / 1000 if 'timestamp' in df.columns else time.time()
+        alerts.append({
+            'symbol': symbol,
+            'bar': bar,
+            'type': signal_type,
+            'ts': float(ts),
+            'close': float(row['close']),
+            'osc': float(row['osc']),
+            'df_index': int(idx),
+        })
+    return alerts
+
+
+if __name__ == "__main__":
+    # 演示：本地 HTTP 接收端 + 随机失败，验证批量、去抖、重试与统计
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import pandas as pd
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from pine_signal_detector import PineSignalDetector, SignalConfig
+
+    received = []
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            if random.random() < 0.3:  # 30% 失败，触发重试
+                self.send_response(503)
+                self.end_headers()
+                return
+            received.extend(json.loads(body)['alerts'])
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/alerts"
+    print(f"Alert Dispatcher - 本地接收端: {url}")
+
+    np.random.seed(42)
+    n = 3000
+    close = 100 + np.cumsum(np.random.randn(n) * 0.5)
+    df = pd.DataFrame({
+        'timestamp': 1_700_000_000_000 + np.arange(n) * 300_000,  # 5m
+        'open': close + np.random.randn(n) * 0.1,
+        'high': close + np.abs(np.random.randn(n) * 0.3),
+        'low': close - np.abs(np.random.randn(n) * 0.3),
+        'close': close,
+    })
+    detector = PineSignalDetector(SignalConfig(use_strict_filter=False, min_ma_confirm=3, osc_threshold=30,
+                                               power_ratio=40, use_alignment_filter=False))
+    df = detector.calculate_stateful_signals(detector.calculate_indicators(df))
+
+    dispatcher = AlertDispatcher([WebhookSink(url)], batch_interval=0.2, debounce_seconds=1800)
+    t0 = time.perf_counter()
+    for i in range(120, n):
+        for alert in alerts_from_check_signal(detector, df, i, 'DEMO-USDT-SWAP', '5m'):
+            dispatcher.submit(alert)
+    print(f"扫描循环耗时: {(time.perf_counter() - t0) * 1000:.0f}ms (投递在后台进行)")
+    dispatcher.close()
+    server.shutdown()
+
+    print(f"接收端收到: {len(received)} 条")
+    print(f"统计: {dispatcher.summary()}")
@@ -0,0 +1,158 @@
+"""
+推理延迟与精度漂移基准
+
+对同一批图像分别用 .pt (ultralytics/torch) 和 .onnx (onnxruntime) 推理：
+1. 逐张计时，报告 p50 / p99 / 平均单图延迟与模型加载时间
+2. 以 .pt 结果为基准，统计 ONNX（含 INT8 量化）结果的漂移：
+   - 检测数量不一致的图片比例
+   - 最高置信度类别不一致的图片比例
+   - 同类别框按 IoU 贪心匹配后的平均 IoU 与平均置信度差
+
+使用：
+    python scripts/bench_infer.py --onnx runs/.../best.onnx --onnx runs/.../best.int8.onnx -n 200
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from infer import MODEL_PATH, TEST_SOURCE, CONF_THRESHOLD, IMGSZ, list_images, results_to_detections
+from onnx_infer import OnnxDetector, box_iou
+
+WARMUP = 5
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    arr = np.array(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(arr, 50)),
+        'p99_ms': float(np.percentile(arr, 99)),
+        'mean_ms': float(arr.mean()),
+    }
+
+
+def _time_backend(predict_one, images: List[str]):
+    """逐张推理并计时，返回 (检测结果列表, 单图延迟列表)"""
+    for path in images[:WARMUP]:
+        predict_one(path)
+    results, latencies = [], []
+    for path in images:
+        t0 = time.perf_counter()
+        results.append(predict_one(path))
+        latencies.append(time.perf_counter() - t0)
+    return results, latencies
+
+
+def compare_detections(reference: List[List[dict]], candidate: List[List[dict]]) -> Dict[str, float]:
+    """以 reference 为基准统计 candidate 的漂移"""
+    count_mismatch = top_mismatch = 0
+    ious, conf_diffs = [], []
+    unmatched = 0
+
+    for ref, cand in zip(reference, candidate):
+        if len(ref) != len(cand):
+            count_mismatch += 1
+        ref_top = max(ref, key=lambda d: d['conf'])['cls'] if ref else None
+        cand_top = max(cand, key=lambda d: d['conf'])['cls'] if cand else None
+        if ref_top != cand_top:
+            top_mismatch += 1
+
+        # 同类别按 IoU 贪心匹配
+        used = set()
+        for r in sorted(ref, key=lambda d: -d['conf']):
+            best_j, best_iou = None, 0.0
+            for j, c in enumerate(cand):
+                if j in used or c['cls'] != r['cls']:
+                    continue
+                iou = float(box_iou(np.array(r['xyxy']), np.array([c['xyxy']]))[0])
+                if iou > best_iou:
+                    best_j, best_iou = j, iou
+            if best_j is None:
+                unmatched += 1
+                continue
+            used.add(best_j)
+            ious.append(best_iou)
+            conf_diffs.append(abs(r['conf'] - cand[best_j]['conf']))
+
+    n = max(len(reference), 1)
+    return {
+        'count_mismatch_rate': count_mismatch / n,
+        'top_class_mismatch_rate': top_mismatch / n,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'mean_conf_diff': float(np.mean(conf_diffs)) if conf_diffs else 0.0,
+        'unmatched_ref_boxes': unmatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理延迟与精度漂移基准")
+    parser.add_argument('--source', type=str, default=TEST_SOURCE, help=f'图片目录 (default: {TEST_SOURCE})')
+    parser.add_argument('--pt', type=str, default=MODEL_PATH, help=f'.pt 权重 (default: {MODEL_PATH})')
+    parser.add_argument('--onnx', action='append', default=[], help='.onnx 模型 (可重复，如 FP32 与 INT8)')
+    parser.add_argument('-n', '--num-images', type=int, default=200, help='参与基准的图片数 (default: 200)')
+    parser.add_argument('--conf', type=float, default=CONF_THRESHOLD, help=f'置信度阈值 (default: {CONF_THRESHOLD})')
+    parser.add_argument('--imgsz', type=int, default=IMGSZ, help=f'输入尺寸 (default: {IMGSZ})')
+    parser.add_argument('--output-json', type=str, default=None, help='将报告保存为 JSON')
+    args = parser.parse_args()
+
+    images = list_images(args.source)[:args.num_images]
+    if not images:
+        print(f"❌ 未找到图片: {args.source}")
+        return
+    print(f"📊 基准图片: {len(images)} 张 (来源: {args.source})")
+
+    report = {'images': len(images), 'backends': {}}
+
+    # 1. torch 基准
+    from ultralytics import YOLO
+    t0 = time.perf_counter()
+    model = YOLO(args.pt)
+    load_s = time.perf_counter() - t0
+
+    def torch_predict(path):
+        res = model.predict(source=path, conf=args.conf, imgsz=args.imgsz, device='cpu', verbose=False)[0]
+        return results_to_detections(res)
+
+    ref_results, latencies = _time_backend(torch_predict, images)
+    report['backends'][args.pt] = {'load_s': load_s, **_percentiles(latencies)}
+
+    # 2. ONNX 后端
+    for onnx_path in args.onnx:
+        t0 = time.perf_counter()
+        detector = OnnxDetector(onnx_path, conf=args.conf, imgsz=args.imgsz)
+        load_s = time.perf_counter() - t0
+        results, latencies = _time_backend(detector.predict_one, images)
+        report['backends'][onnx_path] = {
+            'load_s': load_s,
+            **_percentiles(latencies),
+            'drift_vs_pt': compare_detections(ref_results, results),
+        }
+
+    # 3. 输出报告
+    print("-" * 72)
+    print(f"{'模型':40} {'加载(s)':>8} {'p50(ms)':>8} {'p99(ms)':>8} {'均值(ms)':>8}")
+    for name, r in report['backends'].items():
+        print(f"{os.path.basename(name):40} {r['load_s']:8.2f} {r['p50_ms']:8.1f} {r['p99_ms']:8.1f} {r['mean_ms']:8.1f}")
+    for name, r in report['backends'].items():
+        drift = r.get('drift_vs_pt')
+        if drift:
+            print(f"🔎 {os.path.basename(name)} 相对 .pt 的漂移: "
+                  f"数量不一致 {drift['count_mismatch_rate'] * 100:.1f}%, "
+                  f"首选类别不一致 {drift['top_class_mismatch_rate'] * 100:.1f}%, "
+                  f"平均 IoU {drift['mean_iou']:.3f}, 平均置信度差 {drift['mean_conf_diff']:.3f}")
+
+    if args.output_json:
+        with open(args.output_json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 报告已保存: {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
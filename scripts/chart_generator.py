@@ -11,11 +11,31 @@ Chart Generator - 标准化K线图像生成
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from typing import Optional, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
 from dataclasses import dataclass
 
+from metrics import REGISTRY, timed_function
+
+# matplotlib 导入约 0.5s，只在真正绘图时加载（dry-run / 标签 / 缓存命中不需要）
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+RENDER_SECONDS = REGISTRY.histogram('chart_render_seconds', '单张K线图渲染耗时 (秒)')
+RENDER_QUEUE_DEPTH = REGISTRY.gauge('render_queue_depth', '等待渲染的图表数')
+
+
+# 绘图所需的列（渲染缓存 key 也基于这些列计算）
+# 绘图/标签函数也接受按此列顺序堆叠的 (n, 11) float64 数组（或其零拷贝窗口视图）
+CHART_COLUMNS = ('open', 'high', 'low', 'close', 'SMA20', 'SMA60', 'SMA100', 'SMA120', 'EMA20', 'EMA60', 'EMA120')
+COL = {c: i for i, c in enumerate(CHART_COLUMNS)}
+MA_IDX = [COL[c] for c in ('SMA20', 'SMA60', 'SMA120', 'EMA20', 'EMA60', 'EMA120')]
+
+ChartData = Union[pd.DataFrame, np.ndarray]
+
+# 绘图逻辑版本号：修改 generate_chart 的绘制方式后必须递增，使旧的渲染缓存失效
+RENDER_VERSION = 1
+
 
 @dataclass  
 class ChartConfig:
@@ -51,51 +71,68 @@ class ChartConfig:
     ema_alpha: float = 0.5    # EMA 半透明
 
 
+@dataclass(frozen=True)
+class ChartVariant:
+    """
+    图表变体：窗口K线数 + 正方形输出尺寸
+    
+    信号始终位于图片右侧（图片最右为信号后第2根K线），紧凑变体只保留窗口右侧部分，
+    并按比例缩小画布，使每根K线占用的像素与完整版接近；标签仍由同一套函数在裁剪后的窗口上生成。
+    """
+    name: str
+    window_size: int
+    img_size: int
+    
+    @property
+    def suffix(self) -> str:
+        """数据/模型目录后缀（完整版为空，保持原有路径不变）"""
+        return '' if self.name == 'full' else f'_{self.name}'
+    
+    def chart_config(self, dpi: int = 100) -> ChartConfig:
+        return ChartConfig(fig_width=self.img_size / dpi, fig_height=self.img_size / dpi, dpi=dpi)
+
+
+CHART_VARIANTS = {
+    'full': ChartVariant('full', window_size=60, img_size=640),
+    'compact320': ChartVariant('compact320', window_size=30, img_size=320),
+    'compact256': ChartVariant('compact256', window_size=24, img_size=256),
+}
+
+
 class ChartGenerator:
     """标准化K线图像生成器"""
     
     def __init__(self, config: ChartConfig = None):
         self.config = config or ChartConfig()
     
+    @timed_function(RENDER_SECONDS)
     def generate_chart(
         self,
-        df: pd.DataFrame,
+        df: ChartData,
         signal_type: Optional[str] = None,
         output_path: Optional[str] = None,
         show_signal_marker: bool = True,
-    ) -> Tuple[plt.Figure, plt.Axes]:
-        """生成K线图"""
+    ) -> Tuple['plt.Figure', 'plt.Axes']:
+        """生成K线图（df 可以是 DataFrame，也可以是 stack_chart_columns 的窗口视图）"""
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as patches
+
         cfg = self.config
         
-        # 必需的列
-        required_cols = ['open', 'high', 'low', 'close', 'SMA20', 'SMA60', 'SMA100', 'SMA120', 'EMA20', 'EMA60', 'EMA120']
-        for col in required_cols:
-            if col not in df.columns:
-                # 兼容旧逻辑，如果没有SMA100，尝试用SMA120代替或报错
-                if col == 'SMA100' and 'SMA120' in df.columns:
-                    df['SMA100'] = df['SMA120']
-                else:
-                    raise ValueError(f"Missing required column: {col}")
-        
-        # 数据准备
-        n = len(df)
+        # 数据准备（不修改传入的数据）
+        data = stack_chart_columns(df)
+        n = len(data)
         dates = np.arange(n)
         
-        opens = df['open'].values
-        highs = df['high'].values
-        lows = df['low'].values
-        closes = df['close'].values
-        trend_ma_vals = df['SMA100'].values
+        opens = data[:, COL['open']]
+        highs = data[:, COL['high']]
+        lows = data[:, COL['low']]
+        closes = data[:, COL['close']]
+        trend_ma_vals = data[:, COL['SMA100']]
         
         # 坐标范围
-        ma_cols = ['SMA20', 'SMA60', 'SMA120', 'EMA20', 'EMA60', 'EMA120']
-        
         x_min, x_max = 0, n - 1
-        y_min_data = min(df['low'].min(), df[ma_cols].min().min())
-        y_max_data = max(df['high'].max(), df[ma_cols].max().max())
-        y_pad = (y_max_data - y_min_data) * 0.05
-        y_min_limit = y_min_data - y_pad
-        y_max_limit = y_max_data + y_pad
+        y_min_limit, y_max_limit = _y_limits(data)
         
         # 创建图形
         fig = plt.figure(figsize=(cfg.fig_width, cfg.fig_height), dpi=cfg.dpi)
@@ -111,14 +148,14 @@ class ChartGenerator:
         ema_cols = ['EMA20', 'EMA60', 'EMA120']
         ema_colors = [cfg.col_ema20, cfg.col_ema60, cfg.col_ema120]
         for col, color in zip(ema_cols, ema_colors):
-            ax.plot(dates, df[col].values, color=color, 
+            ax.plot(dates, data[:, COL[col]], color=color, 
                    linewidth=cfg.ma_linewidth, alpha=cfg.ema_alpha)
                    
         # 2. 绘制 SMA (不透明)
         sma_cols = ['SMA20', 'SMA60', 'SMA120']
         sma_colors = [cfg.col_sma20, cfg.col_sma60, cfg.col_sma120]
         for col, color in zip(sma_cols, sma_colors):
-            ax.plot(dates, df[col].values, color=color, 
+            ax.plot(dates, data[:, COL[col]], color=color, 
                    linewidth=cfg.ma_linewidth, alpha=cfg.ma_alpha)
         
         # 绘制K线
@@ -152,9 +189,9 @@ class ChartGenerator:
         # 隐藏坐标轴
         ax.axis('off')
         
-        # 保存
+        # 保存（output_path 可以是文件路径，也可以是 BytesIO 等文件对象）
         if output_path:
-            plt.savefig(output_path, facecolor='white', dpi=cfg.dpi)
+            plt.savefig(output_path, facecolor='white', dpi=cfg.dpi, format='png')
             plt.close(fig)
             return None, None
         
@@ -162,7 +199,7 @@ class ChartGenerator:
     
     def generate_yolo_label(
         self,
-        df: pd.DataFrame,
+        df: ChartData,
         cluster_start_idx: Optional[int] = None,
         cluster_end_idx: Optional[int] = None,
         class_id: int = 0,
@@ -171,7 +208,7 @@ class ChartGenerator:
         生成 YOLO 格式的标签
         
         Args:
-            df: K线数据
+            df: K线数据（DataFrame 或 stack_chart_columns 的窗口视图）
             cluster_start_idx: 粘合区起始索引（在 df 内）
             cluster_end_idx: 粘合区结束索引（在 df 内）
             class_id: 类别ID (0=LONG, 1=SHORT)
@@ -182,22 +219,17 @@ class ChartGenerator:
         if cluster_start_idx is None or cluster_end_idx is None:
             return ""
         
-        n = len(df)
-        ma_cols = ['SMA20', 'SMA60', 'SMA120', 'EMA20', 'EMA60', 'EMA120']
+        data = stack_chart_columns(df)
+        n = len(data)
         
         # 坐标范围（与绘图一致）
         x_min, x_max = 0, n - 1
-        y_min_data = min(df['low'].min(), df[ma_cols].min().min())
-        y_max_data = max(df['high'].max(), df[ma_cols].max().max())
-        y_pad = (y_max_data - y_min_data) * 0.05
-        y_min_limit = y_min_data - y_pad
-        y_max_limit = y_max_data + y_pad
+        y_min_limit, y_max_limit = _y_limits(data)
         
         # 粘合区的价格范围
-        cluster_df = df.iloc[cluster_start_idx:cluster_end_idx + 1]
-        cluster_data = cluster_df[ma_cols]
-        box_min_price = cluster_data.min().min()
-        box_max_price = cluster_data.max().max()
+        cluster_data = data[cluster_start_idx:cluster_end_idx + 1, MA_IDX]
+        box_min_price = np.fmin.reduce(cluster_data, axis=None)
+        box_max_price = np.fmax.reduce(cluster_data, axis=None)
         
         price_pad = (box_max_price - box_min_price) * 0.15
         box_min_price -= price_pad
@@ -230,28 +262,153 @@ class ChartGenerator:
         # Class 0 = ma_cluster
         return f"{class_id} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}"
 
+    def generate_yolo_labels_batch(
+        self,
+        df: pd.DataFrame,
+        signal_indices,
+        class_ids,
+        window_size: int,
+        end_offset: int = 2,
+        adhesion_threshold_pct: float = 0.5,
+    ) -> List[str]:
+        """
+        批量生成 YOLO 标签（与逐信号调用 find_adhesion_region + generate_yolo_label 结果逐字一致）
+        
+        每个信号的窗口为 df 中 [sig + end_offset - window_size + 1, sig + end_offset]，
+        与 sliding_window_detect 的截取方式相同。坐标范围使用整表的滚动最小/最大值，
+        粘合区起点使用预计算的粘合段起点，粘合区价格范围使用稀疏表做区间查询。
+        
+        Args:
+            df: 已计算指标的完整 DataFrame
+            signal_indices: 信号K线在 df 中的位置索引
+            class_ids: 每个信号的类别ID
+            window_size: 图像窗口大小
+            end_offset: 图片右边界相对信号K线的偏移
+            adhesion_threshold_pct: 粘合阈值（价格的百分比）
+            
+        Returns:
+            与 signal_indices 一一对应的 YOLO 标签字符串列表
+        """
+        sig = np.asarray(signal_indices, dtype=np.int64)
+        if len(sig) == 0:
+            return []
+        
+        ma_cols = ['SMA20', 'SMA60', 'SMA120', 'EMA20', 'EMA60', 'EMA120']
+        win_end = sig + end_offset
+        win_start = np.maximum(0, win_end - window_size + 1)
+        
+        # 坐标范围（与绘图一致）：固定窗口的滚动最小/最大值
+        ma_vals = df[ma_cols].to_numpy(dtype=np.float64)
+        ma_lo = np.fmin.reduce(ma_vals, axis=1)
+        ma_hi = np.fmax.reduce(ma_vals, axis=1)
+        row_lo = np.fmin(df['low'].to_numpy(dtype=np.float64), ma_lo)
+        row_hi = np.fmax(df['high'].to_numpy(dtype=np.float64), ma_hi)
+        roll_lo = pd.Series(row_lo).rolling(window_size, min_periods=1).min().to_numpy()
+        roll_hi = pd.Series(row_hi).rolling(window_size, min_periods=1).max().to_numpy()
+        y_min_data = roll_lo[win_end]
+        y_max_data = roll_hi[win_end]
+        y_pad = (y_max_data - y_min_data) * 0.05
+        y_min_limit = y_min_data - y_pad
+        y_max_limit = y_max_data + y_pad
+        
+        # 粘合区（窗口内的局部索引）
+        start_local, end_local = find_adhesion_regions_batch(
+            df, win_start, win_end, adhesion_threshold_pct)
+        
+        # 粘合区的价格范围
+        box_min_price = _range_reduce(ma_lo, win_start + start_local, win_end, np.fmin)
+        box_max_price = _range_reduce(ma_hi, win_start + start_local, win_end, np.fmax)
+        price_pad = (box_max_price - box_min_price) * 0.15
+        box_min_price = box_min_price - price_pad
+        box_max_price = box_max_price + price_pad
+        
+        # 归一化
+        x_span = end_local.astype(np.float64)  # x_max - x_min = n - 1
+        nx1 = start_local / x_span
+        nx2 = end_local / x_span
+        ny_top = 1.0 - (box_max_price - y_min_limit) / (y_max_limit - y_min_limit)
+        ny_bottom = 1.0 - (box_min_price - y_min_limit) / (y_max_limit - y_min_limit)
+        
+        w = np.abs(nx2 - nx1)
+        h = np.abs(ny_bottom - ny_top)
+        cx = (nx1 + nx2) / 2
+        cy = (ny_top + ny_bottom) / 2
+        
+        # Clamp（按 Python 内置 min/max 的比较语义，保证与逐信号路径一致）
+        cx = _py_max(0, _py_min(1, cx))
+        cy = _py_max(0, _py_min(1, cy))
+        w = _py_max(0.01, _py_min(1, w))
+        h = _py_max(0.01, _py_min(1, h))
+        
+        return [
+            f"{c} {x:.6f} {y:.6f} {ww:.6f} {hh:.6f}"
+            for c, x, y, ww, hh in zip(class_ids, cx, cy, w, h)
+        ]
+
+
+def stack_chart_columns(df: ChartData) -> np.ndarray:
+    """
+    将 DataFrame 按 CHART_COLUMNS 顺序堆叠为 (n, 11) float64 数组；ndarray 原样返回
+    
+    缺少 SMA100 时用 SMA120 代替（兼容旧逻辑），不修改传入的 DataFrame。
+    """
+    if isinstance(df, np.ndarray):
+        return df
+    cols = list(CHART_COLUMNS)
+    for i, col in enumerate(cols):
+        if col not in df.columns:
+            if col == 'SMA100' and 'SMA120' in df.columns:
+                cols[i] = 'SMA120'
+            else:
+                raise ValueError(f"Missing required column: {col}")
+    return df[cols].to_numpy(dtype=np.float64)
+
 
-def find_adhesion_region(df: pd.DataFrame, adhesion_threshold_pct: float = 0.5) -> Tuple[int, int]:
+def chart_windows(data: np.ndarray, window_size: int) -> np.ndarray:
+    """
+    对堆叠数组建立零拷贝滑动窗口视图
+    
+    返回形状 (n - window_size + 1, window_size, 11)，第 k 个窗口即 data[k:k + window_size]。
+    """
+    return sliding_window_view(data, window_size, axis=0).transpose(0, 2, 1)
+
+
+def _y_limits(data: np.ndarray) -> Tuple[float, float]:
+    """图表纵轴范围：最低价/最高价与6条均线的极值外扩 5%（NaN 忽略）"""
+    ma = data[:, MA_IDX]
+    y_min_data = min(np.fmin.reduce(data[:, COL['low']]), np.fmin.reduce(ma, axis=None))
+    y_max_data = max(np.fmax.reduce(data[:, COL['high']]), np.fmax.reduce(ma, axis=None))
+    y_pad = (y_max_data - y_min_data) * 0.05
+    return y_min_data - y_pad, y_max_data + y_pad
+
+
+def _adhesion_mask(sma20, sma60, sma120, close, adhesion_threshold_pct: float) -> np.ndarray:
+    """逐行判断三条 SMA 是否粘合（只依赖当前行，可以在整表上一次算完）"""
+    diff1 = np.abs(sma20 - sma60)
+    diff2 = np.abs(sma60 - sma120)
+    diff3 = np.abs(sma20 - sma120)
+    max_diff = np.fmax(np.fmax(diff1, diff2), diff3)
+    
+    threshold = close * adhesion_threshold_pct / 100.0
+    return max_diff <= threshold
+
+
+def find_adhesion_region(df: ChartData, adhesion_threshold_pct: float = 0.5) -> Tuple[int, int]:
     """
     在数据中找到均线粘合区域
     
     Args:
-        df: 包含均线列的 DataFrame
+        df: 包含均线列的 DataFrame，或 stack_chart_columns 的窗口视图
         adhesion_threshold_pct: 粘合阈值（价格的百分比）
         
     Returns:
         (start_idx, end_idx) 粘合区域的索引范围
     """
-    ma_cols = ['SMA20', 'SMA60', 'SMA120']
-    
-    # 计算均线差值
-    diff1 = (df['SMA20'] - df['SMA60']).abs()
-    diff2 = (df['SMA60'] - df['SMA120']).abs()
-    diff3 = (df['SMA20'] - df['SMA120']).abs()
-    max_diff = pd.concat([diff1, diff2, diff3], axis=1).max(axis=1)
-    
-    threshold = df['close'] * adhesion_threshold_pct / 100.0
-    is_adhesion = max_diff <= threshold
+    if isinstance(df, np.ndarray):
+        sma20, sma60, sma120, close = (df[:, COL[c]] for c in ('SMA20', 'SMA60', 'SMA120', 'close'))
+    else:
+        sma20, sma60, sma120, close = (df[c].to_numpy(dtype=np.float64) for c in ('SMA20', 'SMA60', 'SMA120', 'close'))
+    is_adhesion = _adhesion_mask(sma20, sma60, sma120, close, adhesion_threshold_pct)
     
     # 从右边（最后一根K线）往左找粘合区
     n = len(df)
@@ -259,11 +416,11 @@ def find_adhesion_region(df: pd.DataFrame, adhesion_threshold_pct: float = 0.5)
     start_idx = end_idx
     
     # 往左扩展粘合区
-    while start_idx > 0 and is_adhesion.iloc[start_idx]:
+    while start_idx > 0 and is_adhesion[start_idx]:
         start_idx -= 1
     
     # start_idx 现在指向第一个非粘合点，调整到粘合区起点
-    if not is_adhesion.iloc[start_idx]:
+    if not is_adhesion[start_idx]:
         start_idx += 1
     
     # 确保最小宽度
@@ -273,6 +430,75 @@ def find_adhesion_region(df: pd.DataFrame, adhesion_threshold_pct: float = 0.5)
     return start_idx, end_idx
 
 
+def find_adhesion_regions_batch(
+    df: pd.DataFrame,
+    window_starts,
+    window_ends,
+    adhesion_threshold_pct: float = 0.5,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量版 find_adhesion_region：对 df 中多个窗口 [start, end] 一次性求粘合区
+    
+    用整表预计算的"粘合段起点"代替逐根向左回溯。
+    
+    Returns:
+        (start_idx, end_idx) 数组，均为窗口内的局部索引，与逐窗口调用结果一致
+    """
+    ws = np.asarray(window_starts, dtype=np.int64)
+    we = np.asarray(window_ends, dtype=np.int64)
+    adh = _adhesion_mask(*(df[c].to_numpy(dtype=np.float64) for c in ('SMA20', 'SMA60', 'SMA120', 'close')),
+                         adhesion_threshold_pct)
+    
+    # run_start[i]: i 所在粘合段的起点（仅当 adh[i] 为 True 时有意义）
+    idx = np.arange(len(adh))
+    prev = np.concatenate(([False], adh[:-1]))
+    run_start = np.maximum.accumulate(np.where(adh & ~prev, idx, -1))
+    
+    end_local = we - ws
+    # 回溯到窗口左边界为止；末根不粘合时起点落在 end + 1
+    start_local = np.where(adh[we], np.maximum(run_start[we] - ws, 0), end_local + 1)
+    
+    # 确保最小宽度
+    start_local = np.where(end_local - start_local < 5, np.maximum(0, end_local - 30), start_local)
+    
+    return start_local, end_local
+
+
+def _range_reduce(values: np.ndarray, lefts: np.ndarray, rights: np.ndarray, ufunc) -> np.ndarray:
+    """
+    稀疏表区间查询：对每个 [left, right]（闭区间）求 ufunc 归约
+    
+    ufunc 需满足幂等性（如 np.fmin / np.fmax），对 NaN 的处理与 pandas skipna 一致。
+    """
+    lengths = rights - lefts + 1
+    # floor(log2(length))，用 frexp 避免浮点 log2 的舍入误差
+    level = np.frexp(lengths)[1] - 1
+    max_level = int(level.max()) if len(level) else 0
+    
+    table = [values]
+    for k in range(1, max_level + 1):
+        prev = table[-1]
+        half = 1 << (k - 1)
+        table.append(ufunc(prev[:-half], prev[half:]))
+    
+    out = np.empty(len(lefts), dtype=np.float64)
+    for k in np.unique(level):
+        m = level == k
+        span = 1 << int(k)
+        out[m] = ufunc(table[k][lefts[m]], table[k][rights[m] - span + 1])
+    return out
+
+
+def _py_min(a, arr: np.ndarray) -> np.ndarray:
+    """向量化的内置 min(a, x)：仅当 x < a 时取 x（NaN 时保留 a）"""
+    return np.where(arr < a, arr, a)
+
+
+def _py_max(a, arr: np.ndarray) -> np.ndarray:
+    """向量化的内置 max(a, x)：仅当 x > a 时取 x（NaN 时保留 a）"""
+    return np.where(arr > a, arr, a)
+
+
 if __name__ == "__main__":
     # 测试
     import numpy as np
@@ -0,0 +1,171 @@
+"""
+图表变体对比报告：精度 vs 单图延迟
+
+对每个变体（full / compact320 / compact256）：
+1. 精度：在该变体自己的验证集上运行 ultralytics val（CPU），记录 mAP50 / mAP50-95 / precision / recall
+2. 延迟：
+   - 渲染：用随机游走行情 + 变体的 ChartConfig 渲染到内存，记录单图 p50 / p99
+   - 打分：在验证集图像上逐张推理（torch 或 onnx），记录单图 p50 / p99
+3. 吞吐：按 (渲染 + 打分) 的 p50 估算每个 CPU 核每秒可评估的候选数
+
+使用：
+    python scripts/compare_variants.py --variants full,compact320,compact256
+    python scripts/compare_variants.py --backend onnx -n 100 --output-json reports/variants.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chart_generator import ChartGenerator, CHART_VARIANTS, ChartVariant, stack_chart_columns
+from pine_signal_detector import PineSignalDetector
+from infer import list_images, results_to_detections
+
+RUNS_DIR = "runs/detect"
+WARMUP = 3
+
+
+def variant_paths(variant: ChartVariant, backend: str) -> Dict[str, str]:
+    """变体对应的模型、数据集与验证集图像目录（与 train_yolo.py / prepare_yolo_data.py 的约定一致）"""
+    weights = os.path.join(RUNS_DIR, f"kline_cluster_yolo11{variant.suffix}", "weights")
+    dataset = f"data/yolo_dataset{variant.suffix}"
+    return {
+        'pt': os.path.join(weights, 'best.pt'),
+        'model': os.path.join(weights, 'best.onnx' if backend == 'onnx' else 'best.pt'),
+        'data': os.path.join(dataset, 'dataset.yaml'),
+        'val_images': os.path.join(dataset, 'val', 'images'),
+    }
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    arr = np.array(seconds) * 1000
+    return {'p50_ms': float(np.percentile(arr, 50)), 'p99_ms': float(np.percentile(arr, 99))}
+
+
+def _synthetic_chart_data(n: int = 600, seed: int = 0) -> np.ndarray:
+    """随机游走行情 + 指标，用于衡量渲染耗时（与真实行情的绘制开销相同）"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.standard_normal(n) * 0.5)
+    df = pd.DataFrame({
+        'open': close + rng.standard_normal(n) * 0.1,
+        'high': close + np.abs(rng.standard_normal(n) * 0.3),
+        'low': close - np.abs(rng.standard_normal(n) * 0.3),
+        'close': close,
+    })
+    return stack_chart_columns(PineSignalDetector().calculate_indicators(df))
+
+
+def measure_render(variant: ChartVariant, samples: int) -> Dict[str, float]:
+    chart_gen = ChartGenerator(variant.chart_config())
+    data = _synthetic_chart_data()
+    ends = np.linspace(200, len(data) - 1, samples + WARMUP).astype(int)
+    times = []
+    for i, end in enumerate(ends):
+        window = data[end - variant.window_size + 1: end + 1]
+        t0 = time.perf_counter()
+        chart_gen.generate_chart(window, output_path=io.BytesIO())
+        if i >= WARMUP:
+            times.append(time.perf_counter() - t0)
+    return _percentiles(times)
+
+
+def measure_model(paths: Dict[str, str], variant: ChartVariant, backend: str, samples: int) -> Dict[str, float]:
+    images = list_images(paths['val_images'])[:samples]
+    if not images:
+        return {}
+    if backend == 'onnx':
+        from onnx_infer import OnnxDetector
+        predict_one = OnnxDetector(paths['model'], imgsz=variant.img_size).predict_one
+    else:
+        from ultralytics import YOLO
+        model = YOLO(paths['model'])
+
+        def predict_one(path):
+            res = model.predict(source=path, imgsz=variant.img_size, device='cpu', verbose=False)[0]
+            return results_to_detections(res)
+
+    for path in images[:WARMUP]:
+        predict_one(path)
+    times = []
+    for path in images:
+        t0 = time.perf_counter()
+        predict_one(path)
+        times.append(time.perf_counter() - t0)
+    return _percentiles(times)
+
+
+def measure_accuracy(paths: Dict[str, str], variant: ChartVariant) -> Dict[str, float]:
+    from ultralytics import YOLO
+    metrics = YOLO(paths['pt']).val(data=os.path.abspath(paths['data']), imgsz=variant.img_size,
+                                     device='cpu', plots=False, verbose=False)
+    return {
+        'map50': float(metrics.box.map50),
+        'map50_95': float(metrics.box.map),
+        'precision': float(metrics.box.mp),
+        'recall': float(metrics.box.mr),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图表变体精度/延迟对比")
+    parser.add_argument('--variants', type=str, default=','.join(CHART_VARIANTS),
+                        help=f'要对比的变体 (default: {",".join(CHART_VARIANTS)})')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch', help='打分后端')
+    parser.add_argument('-n', '--num-images', type=int, default=100, help='延迟测量的样本数 (default: 100)')
+    parser.add_argument('--skip-val', action='store_true', help='跳过精度评估，只测延迟')
+    parser.add_argument('--output-json', type=str, default=None, help='将报告保存为 JSON')
+    args = parser.parse_args()
+
+    report = {}
+    names = [v.strip() for v in args.variants.split(',') if v.strip()]
+    unknown = [name for name in names if name not in CHART_VARIANTS]
+    if unknown:
+        parser.error(f"未知变体: {', '.join(unknown)} (可选: {', '.join(CHART_VARIANTS)})")
+    for name in names:
+        variant = CHART_VARIANTS[name]
+        paths = variant_paths(variant, args.backend)
+        print(f"📊 {name}: {variant.window_size} 根K线, {variant.img_size}px")
+
+        row = {'window_size': variant.window_size, 'img_size': variant.img_size,
+               'render': measure_render(variant, args.num_images)}
+        if os.path.exists(paths['model']):
+            row['score'] = measure_model(paths, variant, args.backend, args.num_images)
+        else:
+            print(f"   ⚠️ 模型不存在，跳过打分延迟: {paths['model']}")
+        if not args.skip_val and os.path.exists(paths['pt']) and os.path.exists(paths['data']):
+            row['accuracy'] = measure_accuracy(paths, variant)
+
+        if row.get('score'):
+            per_candidate = row['render']['p50_ms'] + row['score']['p50_ms']
+            row['candidates_per_cpu_s'] = 1000.0 / per_candidate
+        report[name] = row
+
+    print("-" * 96)
+    print(f"{'变体':12} {'尺寸':>6} {'mAP50':>7} {'mAP50-95':>9} {'渲染p50':>9} {'打分p50':>9} {'打分p99':>9} {'候选/核/秒':>10}")
+    for name, row in report.items():
+        acc = row.get('accuracy', {})
+        score = row.get('score', {})
+        fmt = lambda v, spec: format(v, spec) if v is not None else '-'
+        print(f"{name:12} {row['img_size']:>6} {fmt(acc.get('map50'), '7.3f'):>7} "
+              f"{fmt(acc.get('map50_95'), '9.3f'):>9} {row['render']['p50_ms']:9.1f} "
+              f"{fmt(score.get('p50_ms'), '9.1f'):>9} {fmt(score.get('p99_ms'), '9.1f'):>9} "
+              f"{fmt(row.get('candidates_per_cpu_s'), '10.1f'):>10}")
+
+    if args.output_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output_json)), exist_ok=True)
+        with open(args.output_json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 报告已保存: {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""
+Detect Checkpoint - 增量检测检查点
+
+sliding_window_detect 每次都从 min_start 重新扫描全部历史。这里按 (symbol, bar, 配置) 保存检查点：
+1. IndicatorStream: calculate_indicators + calculate_stateful_signals 的逐K线版本，携带全部状态
+   - SMA / 动能 MA: 复刻 pandas rolling mean 的带补偿滑动求和（含缓冲区），结果与整表计算逐位一致
+   - EMA: 复刻 pandas ewm(adjust=False) 的递推
+   - 动能最大值、交叉事件计数: 滑动窗口缓冲区
+   - 方案A/D 的粘合状态与粘合区高低点
+2. 检查点停在最后一根可出图的信号K线 (n - 1 - CHECKPOINT_LAG)，同时保存其之前的若干行（渲染窗口与动能回看需要）
+3. 下次运行只拉取检查点之后的新K线，逐根推进状态，只检测/渲染新信号，结果与全量重跑一致
+
+安全措施：
+- 首次保存时用整表计算结果校验回放状态，不一致则不保存（退回全量）
+- pandas 版本变化时忽略旧检查点（滑动求和的实现细节可能变化）
+
+局限：去重 (--dedup-gap) 不跨检查点合并信号。
+
+使用：
+    python scripts/sliding_window_signal.py --symbols BTC-USDT-SWAP --checkpoint   # 第二次起只处理新K线
+    python scripts/detect_checkpoint.py                                           # 列出检查点
+"""
+
+import os
+import math
+import time
+import pickle
+import sqlite3
+import argparse
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sample_index import config_hash
+
+# =================配置=================
+CHECKPOINT_DB = "data/detect_checkpoints.db"
+CHECKPOINT_LAG = 2   # 图表最右侧为信号后第 2 根K线：最后 2 根K线的信号要等下次运行才能出图
+TAIL_MARGIN = 8      # 检查点保存 max(window_size, 指标预热) + TAIL_MARGIN 行（渲染窗口 + 动能回看）
+# =====================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    symbol          TEXT NOT NULL,
+    bar             TEXT NOT NULL,
+    config_hash     TEXT NOT NULL,
+    last_ts         INTEGER NOT NULL,
+    abs_index       INTEGER NOT NULL,
+    pandas_version  TEXT,
+    payload         BLOB NOT NULL,
+    updated_at      REAL,
+    PRIMARY KEY (symbol, bar, config_hash)
+);
+"""
+
+# 逐K线计算输出的列（与 calculate_indicators + calculate_stateful_signals 一致）
+FLOAT_COLUMNS = ('SMA20', 'SMA60', 'SMA100', 'SMA120', 'EMA20', 'EMA60', 'EMA120',
+                 'total_in_window', 'bullish_cross', 'bearish_cross', 'osc', 'adhesion_high', 'adhesion_low')
+BOOL_COLUMNS = ('cross_up_1', 'cross_dn_1', 'cross_up_2', 'cross_dn_2', 'cross_up_3', 'cross_dn_3',
+                'is_dense_area', 'is_adhesion', 'is_bullish_alignment', 'is_bearish_alignment',
+                'adhesion_breakout_up', 'adhesion_breakout_down', 'breakout_above_range', 'breakout_below_range')
+
+NAN = float('nan')
+
+
+class _RollingMean:
+    """
+    pandas rolling(window).mean() 的逐点版本
+
+    复刻 pandas roll_mean：加入/移出分别使用独立的 Kahan 补偿项，连续相同值直接返回该值，
+    全正/全负窗口的符号修正。因此续算结果与整表计算逐位一致。
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buf = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same = 0
+        self.prev = NAN
+        self.started = False
+
+    def update(self, val: float) -> float:
+        if not self.started:
+            self.prev = val
+            self.started = True
+        self.buf.append(val)
+        if len(self.buf) > self.window:
+            self._remove(self.buf.popleft())
+        self._add(val)
+        return self._mean()
+
+    def _add(self, val: float):
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        self.same = self.same + 1 if val == self.prev else 1
+        self.prev = val
+
+    def _remove(self, val: float):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def _mean(self) -> float:
+        if self.nobs < self.window or self.nobs <= 0:
+            return NAN
+        result = self.sum_x / self.nobs
+        if self.same >= self.nobs:
+            return self.prev
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class _RollingMax:
+    """rolling(window).max()：窗口内非 NaN 值不足 window 个时为 NaN"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buf = deque(maxlen=window)
+
+    def update(self, val: float) -> float:
+        self.buf.append(val)
+        if len(self.buf) < self.window or any(v != v for v in self.buf):
+            return NAN
+        return max(self.buf)
+
+
+class _RollingCount:
+    """0/1 事件的 rolling(window).sum()（整数求和无舍入误差）"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buf = deque(maxlen=window)
+
+    def update(self, val: int) -> float:
+        self.buf.append(val)
+        return float(sum(self.buf)) if len(self.buf) == self.window else NAN
+
+
+class _Ema:
+    """pandas ewm(span, adjust=False).mean() 的逐点版本（与 pandas ewm 内核的运算顺序一致）"""
+
+    def __init__(self, span: int):
+        com = (span - 1) / 2
+        alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - alpha
+        self.new_wt = alpha
+        self.old_wt = 1.0
+        self.weighted = NAN
+
+    def update(self, cur: float) -> float:
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if cur == cur:
+                if self.weighted != cur:
+                    self.weighted = self.old_wt * self.weighted + self.new_wt * cur
+                    self.weighted /= (self.old_wt + self.new_wt)
+                self.old_wt = 1.0
+        elif cur == cur:
+            self.weighted = cur
+        return self.weighted
+
+
+class IndicatorStream:
+    """逐K线推进的指标与状态信号（状态可 pickle，作为检查点保存）"""
+
+    def __init__(self, config):
+        self.config = config
+        cfg = config
+        self.sma = {name: _RollingMean(period) for name, period in
+                    (('SMA20', cfg.ma_period_1), ('SMA60', cfg.ma_period_2), ('SMA100', 100), ('SMA120', cfg.ma_period_3))}
+        self.ema = {name: _Ema(period) for name, period in
+                    (('EMA20', cfg.ma_period_1), ('EMA60', cfg.ma_period_2), ('EMA120', cfg.ma_period_3))}
+        self.cross_total = _RollingCount(cfg.density_window)
+        self.cross_bull = _RollingCount(cfg.density_window)
+        self.cross_bear = _RollingCount(cfg.density_window)
+        self.osc_ma = _RollingMean(cfg.osc_ma_length)
+        self.osc_max = _RollingMax(cfg.osc_ma_length)
+        self.prev_sma = (NAN, NAN, NAN)
+        # 方案A / 方案D 的状态变量（与 calculate_stateful_signals 的循环一致）
+        self.was_bull = False
+        self.was_bear = False
+        self.adhesion_high = NAN
+        self.adhesion_low = NAN
+        self.prev_is_adhesion = False
+        self.bars = 0
+
+    def step(self, high: float, low: float, close: float) -> dict:
+        cfg = self.config
+        row = {name: m.update(close) for name, m in self.sma.items()}
+        row.update({name: m.update(close) for name, m in self.ema.items()})
+        s20, s60, s120 = row['SMA20'], row['SMA60'], row['SMA120']
+        p20, p60, p120 = self.prev_sma
+        self.prev_sma = (s20, s60, s120)
+
+        # 交叉（与 NaN 比较恒为 False，与 shift(1) 的首行一致）
+        row['cross_up_1'] = s20 > s60 and p20 <= p60
+        row['cross_dn_1'] = s20 < s60 and p20 >= p60
+        row['cross_up_2'] = s60 > s120 and p60 <= p120
+        row['cross_dn_2'] = s60 < s120 and p60 >= p120
+        row['cross_up_3'] = s20 > s120 and p20 <= p120
+        row['cross_dn_3'] = s20 < s120 and p20 >= p120
+        bull = row['cross_up_1'] or row['cross_up_2'] or row['cross_up_3']
+        bear = row['cross_dn_1'] or row['cross_dn_2'] or row['cross_dn_3']
+        row['total_in_window'] = self.cross_total.update(int(bull or bear))
+        row['bullish_cross'] = self.cross_bull.update(int(bull))
+        row['bearish_cross'] = self.cross_bear.update(int(bear))
+        row['is_dense_area'] = row['total_in_window'] >= cfg.cross_threshold
+
+        # 粘合（DataFrame.max(axis=1) 跳过 NaN）
+        diffs = [d for d in (abs(s20 - s60), abs(s60 - s120), abs(s20 - s120)) if d == d]
+        max_diff = max(diffs) if diffs else NAN
+        is_adhesion = max_diff <= close * cfg.adhesion_threshold / 100.0
+        row['is_adhesion'] = is_adhesion
+
+        # 动能振荡器
+        osc_diff = close - self.osc_ma.update(close)
+        osc_max = self.osc_max.update(abs(osc_diff))
+        row['osc'] = osc_diff / osc_max * 100 if osc_max != 0 else 0.0
+
+        row['is_bullish_alignment'] = s20 > s60 and s60 > s120
+        row['is_bearish_alignment'] = s20 < s60 and s60 < s120
+
+        # 方案A: 粘合后首次突破
+        if is_adhesion:
+            self.was_bull = True
+            self.was_bear = True
+        row['adhesion_breakout_up'] = False
+        row['adhesion_breakout_down'] = False
+        if self.was_bull and not is_adhesion and s20 == s20 and close > s20:
+            row['adhesion_breakout_up'] = True
+            self.was_bull = False
+        if self.was_bear and not is_adhesion and s20 == s20 and close < s20:
+            row['adhesion_breakout_down'] = True
+            self.was_bear = False
+
+        # 方案D: 粘合区高低点突破
+        if is_adhesion:
+            if self.adhesion_high != self.adhesion_high:
+                self.adhesion_high = high
+                self.adhesion_low = low
+            else:
+                self.adhesion_high = max(self.adhesion_high, high)
+                self.adhesion_low = min(self.adhesion_low, low)
+        elif not self.prev_is_adhesion:
+            self.adhesion_high = NAN
+            self.adhesion_low = NAN
+        row['adhesion_high'] = self.adhesion_high
+        row['adhesion_low'] = self.adhesion_low
+        row['breakout_above_range'] = self.adhesion_high == self.adhesion_high and close > self.adhesion_high
+        row['breakout_below_range'] = self.adhesion_low == self.adhesion_low and close < self.adhesion_low
+        self.prev_is_adhesion = is_adhesion
+
+        self.bars += 1
+        return row
+
+    def run(self, df: pd.DataFrame, snapshot_at: Optional[int] = None) -> Tuple[pd.DataFrame, Optional[bytes]]:
+        """
+        逐行推进 df（需有 high/low/close），返回指标列 DataFrame；
+        snapshot_at 给定时返回处理完该行之后的状态快照（pickle）
+        """
+        high = df['high'].to_numpy(dtype=float)
+        low = df['low'].to_numpy(dtype=float)
+        close = df['close'].to_numpy(dtype=float)
+        rows = []
+        snapshot = None
+        for i in range(len(df)):
+            rows.append(self.step(float(high[i]), float(low[i]), float(close[i])))
+            if i == snapshot_at:
+                snapshot = pickle.dumps(self)
+        out = pd.DataFrame(rows, columns=FLOAT_COLUMNS + BOOL_COLUMNS, index=df.index)
+        out[list(BOOL_COLUMNS)] = out[list(BOOL_COLUMNS)].astype(bool)
+        return out, snapshot
+
+
+def checkpoint_key(signal_config, chart_config, window_size: int, stride: int) -> str:
+    """检查点的配置键：信号参数、图表参数、窗口与步长任一变化都需要重新全量检测"""
+    return config_hash(signal_config, chart_config, window_size=window_size, stride=stride)
+
+
+def frames_match(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """两组指标列是否逐位一致（NaN 视为相等）"""
+    for col in FLOAT_COLUMNS:
+        x, y = a[col].to_numpy(dtype=float), b[col].to_numpy(dtype=float)
+        if not np.array_equal(x, y, equal_nan=True):
+            return False
+    for col in BOOL_COLUMNS:
+        if not np.array_equal(a[col].to_numpy(dtype=bool), b[col].to_numpy(dtype=bool)):
+            return False
+    return True
+
+
+class DetectCheckpoint:
+    """检查点存储 (SQLite)，键为 (symbol, bar, config_hash)"""
+
+    def __init__(self, db_path: str = CHECKPOINT_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def load(self, symbol: str, bar: str, cfg_hash: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT * FROM checkpoints WHERE symbol = ? AND bar = ? AND config_hash = ?",
+            (symbol, bar, cfg_hash)).fetchone()
+        if row is None:
+            return None
+        if row['pandas_version'] != pd.__version__:
+            print(f"   ⚠️ 检查点由 pandas {row['pandas_version']} 生成（当前 {pd.__version__}），忽略并全量重跑")
+            return None
+        payload = pickle.loads(row['payload'])
+        return {'last_ts': row['last_ts'], 'abs_index': row['abs_index'], **payload}
+
+    def last_ts(self, symbol: str, bar: str, cfg_hash: str) -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT last_ts, pandas_version FROM checkpoints WHERE symbol = ? AND bar = ? AND config_hash = ?",
+            (symbol, bar, cfg_hash)).fetchone()
+        return row[0] if row is not None and row[1] == pd.__version__ else None
+
+    def save(self, symbol: str, bar: str, cfg_hash: str, df: pd.DataFrame, upto: int, offset: int,
+             stream_state: bytes, tail_rows: int):
+        """保存处理到 df 第 upto 行（绝对索引 offset + upto）的检查点"""
+        payload = pickle.dumps({'stream': stream_state, 'tail': _tail(df, upto, tail_rows)})
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (symbol, bar, cfg_hash, int(df['timestamp'].iloc[upto]), offset + upto,
+                 pd.__version__, payload, time.time()))
+
+    def list(self) -> List[dict]:
+        sql = "SELECT symbol, bar, config_hash, last_ts, abs_index, pandas_version, updated_at FROM checkpoints"
+        return [dict(r) for r in self.conn.execute(sql + " ORDER BY symbol, bar")]
+
+    def close(self):
+        self.conn.close()
+
+
+class MemoryCheckpoint:
+    """
+    进程内检查点（接口同 DetectCheckpoint），用于分块检测时在块之间传递状态
+
+    只保留每个键最新的一份状态，尾部行为独立副本，不会让上一块的 DataFrame 常驻内存。
+    """
+
+    def __init__(self):
+        self._states = {}
+
+    def load(self, symbol: str, bar: str, cfg_hash: str) -> Optional[dict]:
+        return self._states.get((symbol, bar, cfg_hash))
+
+    def last_ts(self, symbol: str, bar: str, cfg_hash: str) -> Optional[int]:
+        state = self.load(symbol, bar, cfg_hash)
+        return state['last_ts'] if state is not None else None
+
+    def save(self, symbol: str, bar: str, cfg_hash: str, df: pd.DataFrame, upto: int, offset: int,
+             stream_state: bytes, tail_rows: int):
+        self._states[(symbol, bar, cfg_hash)] = {
+            'last_ts': int(df['timestamp'].iloc[upto]),
+            'abs_index': offset + upto,
+            'stream': stream_state,
+            'tail': _tail(df, upto, tail_rows),
+        }
+
+    def close(self):
+        self._states.clear()
+
+
+def _tail(df: pd.DataFrame, upto: int, tail_rows: int) -> pd.DataFrame:
+    return df.iloc[max(0, upto - tail_rows + 1): upto + 1].reset_index(drop=True).copy()
+
+
+def warmup_bars(config) -> int:
+    """指标预热所需K线数：SMA120、动能振荡器 (均线 + 最大值两段窗口)、交叉密度窗口"""
+    return max(config.ma_period_3, 2 * config.osc_ma_length, config.density_window)
+
+
+def continues_from(checkpoint: dict, df: pd.DataFrame) -> bool:
+    """df 是否与检查点衔接（第一根K线不晚于检查点之后的下一根，中间没有缺口）"""
+    ts = checkpoint['tail']['timestamp']
+    step = ts.iloc[-1] - ts.iloc[-2] if len(ts) > 1 else 0
+    return len(df) > 0 and df['timestamp'].iloc[0] <= checkpoint['last_ts'] + step
+
+
+def resume_frame(detector, checkpoint: dict, new_df: pd.DataFrame) -> Tuple[pd.DataFrame, int, int, Optional[bytes]]:
+    """
+    从检查点续算
+
+    Returns:
+        (df, offset, scan_from, snapshot)
+        df: 检查点尾部行 + 新K线（含全部指标与状态列）
+        offset: df 第 0 行在完整历史中的绝对索引
+        scan_from: 第一根新K线在 df 中的位置
+        snapshot: 推进到新的检查点位置 (len(df) - 1 - CHECKPOINT_LAG) 后的状态；新K线不足时为 None
+    """
+    tail = checkpoint['tail']
+    stream: IndicatorStream = pickle.loads(checkpoint['stream'])
+    if stream.config != detector.config:
+        raise ValueError("检查点的 SignalConfig 与当前配置不一致")
+
+    new_df = new_df[new_df['timestamp'] > checkpoint['last_ts']].reset_index(drop=True)
+    offset = checkpoint['abs_index'] - len(tail) + 1
+    scan_from = len(tail)
+    snapshot_at = len(new_df) - 1 - CHECKPOINT_LAG
+    computed, snapshot = stream.run(new_df, snapshot_at if snapshot_at >= 0 else None)
+    new_rows = pd.concat([new_df.drop(columns=[c for c in computed.columns if c in new_df.columns]), computed], axis=1)
+    df = pd.concat([tail, new_rows.reindex(columns=tail.columns)], ignore_index=True)
+    for col in BOOL_COLUMNS:
+        df[col] = df[col].astype(bool)
+    return df, offset, scan_from, snapshot
+
+
+def replay_state(detector, df: pd.DataFrame, upto: int) -> Optional[bytes]:
+    """
+    首次运行：从头回放到第 upto 行得到检查点状态，并与整表计算结果逐位比对；不一致时返回 None
+    """
+    stream = IndicatorStream(detector.config)
+    computed, snapshot = stream.run(df.iloc[:upto + 1], snapshot_at=upto)
+    if not frames_match(computed, df.iloc[:upto + 1]):
+        print("   ⚠️ 逐K线回放与整表计算不一致，本次不保存检查点")
+        return None
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量检测检查点")
+    parser.add_argument('--db', type=str, default=CHECKPOINT_DB, help=f'检查点数据库 (default: {CHECKPOINT_DB})')
+    parser.add_argument('--reset', type=str, default=None, metavar='SYMBOL', help='删除某交易对的检查点 (all 删除全部)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ 检查点数据库不存在: {args.db}")
+        return
+    store = DetectCheckpoint(args.db)
+    if args.reset:
+        with store.conn:
+            if args.reset == 'all':
+                store.conn.execute("DELETE FROM checkpoints")
+            else:
+                store.conn.execute("DELETE FROM checkpoints WHERE symbol = ?", (args.reset,))
+        print(f"🗑️ 已删除检查点: {args.reset}")
+    for row in store.list():
+        print(f"   {row['symbol']:18} {row['bar']:5} {row['config_hash']}  处理到 "
+              f"{pd.to_datetime(row['last_ts'], unit='ms')} (#{row['abs_index']})  pandas {row['pandas_version']}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
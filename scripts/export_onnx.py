@@ -0,0 +1,88 @@
+"""
+ONNX 导出脚本
+功能：
+1. 将训练好的 best.pt 导出为 ONNX（供 onnxruntime CPU 推理）
+2. 可选：动态 INT8 量化（权重量化为 int8，激活在运行时量化）
+
+使用：
+    python scripts/export_onnx.py                      # 导出 best.onnx
+    python scripts/export_onnx.py --int8               # 额外导出 best.int8.onnx
+    python scripts/export_onnx.py --imgsz 320 --dynamic
+"""
+
+import os
+import argparse
+
+# =================配置=================
+MODEL_PATH = 'runs/detect/kline_cluster_yolo11/weights/best.pt'
+DEFAULT_IMGSZ = 640
+DEFAULT_OPSET = 12
+# =====================================
+
+
+def export_onnx(
+    model_path: str = MODEL_PATH,
+    imgsz: int = DEFAULT_IMGSZ,
+    dynamic: bool = False,
+    opset: int = DEFAULT_OPSET,
+) -> str:
+    """导出 ONNX 模型，返回 .onnx 路径（与 .pt 同目录）"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    path = model.export(format='onnx', imgsz=imgsz, dynamic=dynamic, simplify=True, opset=opset)
+    return str(path)
+
+
+def quantize_int8(onnx_path: str) -> str:
+    """动态 INT8 量化，返回量化后模型路径 (*.int8.onnx)"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out_path = os.path.splitext(onnx_path)[0] + '.int8.onnx'
+    quantize_dynamic(onnx_path, out_path, weight_type=QuantType.QUInt8)
+    _copy_metadata(onnx_path, out_path)
+    return out_path
+
+
+def _copy_metadata(src_path: str, dst_path: str):
+    """把 ultralytics 写入的 names/imgsz 等元数据带到量化模型上"""
+    import onnx
+
+    src = onnx.load(src_path, load_external_data=False)
+    dst = onnx.load(dst_path)
+    existing = {p.key for p in dst.metadata_props}
+    for prop in src.metadata_props:
+        if prop.key not in existing:
+            dst.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(dst, dst_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 ONNX 模型")
+    parser.add_argument('--model', type=str, default=MODEL_PATH, help=f'.pt 权重 (default: {MODEL_PATH})')
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ, help=f'输入尺寸 (default: {DEFAULT_IMGSZ})')
+    parser.add_argument('--dynamic', action='store_true', help='动态 batch/尺寸（支持批量推理）')
+    parser.add_argument('--opset', type=int, default=DEFAULT_OPSET, help=f'ONNX opset (default: {DEFAULT_OPSET})')
+    parser.add_argument('--int8', action='store_true', help='额外导出动态 INT8 量化模型')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"❌ 模型文件不存在: {args.model}")
+        print("   请先运行 train_yolo.py 完成训练。")
+        return
+
+    print(f"🚀 导出 ONNX: {args.model} (imgsz={args.imgsz}, dynamic={args.dynamic})...")
+    onnx_path = export_onnx(args.model, imgsz=args.imgsz, dynamic=args.dynamic, opset=args.opset)
+    print(f"✅ ONNX 模型: {onnx_path}")
+
+    if args.int8:
+        print("⚙️ 动态 INT8 量化...")
+        int8_path = quantize_int8(onnx_path)
+        print(f"✅ INT8 模型: {int8_path}")
+
+    print("   推理: python scripts/infer.py --backend onnx --model <onnx 路径>")
+    print("   基准: python scripts/bench_infer.py --onnx <onnx 路径>")
+
+
+if __name__ == "__main__":
+    main()
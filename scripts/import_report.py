@@ -0,0 +1,110 @@
+"""
+Import Report - 启动导入耗时报告
+
+定时任务的短命令（dry-run 检测、单次扫描）有相当一部分时间花在 import 上。
+对每个入口模块单独起一个 `python -X importtime -c "import <模块>"` 子进程（冷启动，互不影响），输出：
+- 总导入耗时与进程墙钟时间
+- 按顶层包汇总的累计耗时 Top N (pandas / numpy / requests ...)
+- 是否加载了重依赖 (matplotlib / ultralytics / torch / cv2 / onnxruntime)：
+  这些依赖只应在绘图、推理、训练的代码路径里延迟导入
+
+用法：
+    python scripts/import_report.py                                   # 检查常用入口模块
+    python scripts/import_report.py infer train_yolo --top 15
+    python scripts/import_report.py sliding_window_signal --budget-ms 800   # 超出预算时返回 1
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, List
+
+# =================配置=================
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODULES = ('sliding_window_signal', 'live_scanner', 'infer', 'train_yolo', 'signal_store')
+HEAVY_MODULES = ('matplotlib', 'ultralytics', 'torch', 'cv2', 'onnxruntime', 'scipy')
+# =====================================
+
+
+def parse_importtime(stderr: str) -> List[tuple]:
+    """-X importtime 输出 -> [(名称, 嵌套深度, 自身微秒, 累计微秒)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cum_us)))
+    return rows
+
+
+def measure(module: str, python: str = sys.executable) -> Dict:
+    """冷启动导入 module，返回耗时明细；导入失败时 error 为最后一行报错"""
+    t0 = time.perf_counter()
+    proc = subprocess.run([python, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=SCRIPTS_DIR, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+
+    rows = parse_importtime(proc.stderr)
+    packages = {}
+    for name, _, _, cum_us in rows:
+        top = name.split('.')[0]
+        if name == top and top != module:
+            # 每个包只在第一次导入时出现一次，该行的累计时间即其全部开销
+            packages.setdefault(top, cum_us / 1000)
+    loaded = {name.split('.')[0] for name, _, _, _ in rows}
+
+    error = None
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        error = lines[-1] if lines else f"exit {proc.returncode}"
+
+    return {
+        'module': module,
+        'import_ms': next((cum / 1000 for name, _, _, cum in rows if name == module), 0.0),
+        'wall_ms': wall_ms,
+        'packages': sorted(packages.items(), key=lambda kv: kv[1], reverse=True),
+        'heavy': [m for m in HEAVY_MODULES if m in loaded],
+        'error': error,
+    }
+
+
+def print_report(result: Dict, top: int = 8):
+    print(f"📦 {result['module']}: 导入 {result['import_ms']:.0f} ms, 进程 {result['wall_ms']:.0f} ms")
+    if result['error']:
+        print(f"   ❌ 导入失败: {result['error']}")
+    for name, ms in result['packages'][:top]:
+        print(f"   {name:<24s}{ms:8.1f} ms")
+    if result['heavy']:
+        print(f"   ⚠️ 已加载重依赖: {', '.join(result['heavy'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块导入耗时报告")
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_MODULES),
+                        help='要检查的模块 (scripts/ 下的模块名)')
+    parser.add_argument('--top', type=int, default=8, help='每个模块列出的顶层包数量 (default: 8)')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='导入耗时预算 (毫秒)，任一模块超出或导入失败时返回 1')
+    args = parser.parse_args()
+
+    over = []
+    for module in args.modules:
+        result = measure(module)
+        print_report(result, args.top)
+        print()
+        if result['error'] or (args.budget_ms is not None and result['import_ms'] > args.budget_ms):
+            over.append(module)
+
+    if args.budget_ms is not None:
+        if over:
+            print(f"❌ 超出预算 {args.budget_ms:.0f} ms: {', '.join(over)}")
+        else:
+            print(f"✅ 全部在预算 {args.budget_ms:.0f} ms 内")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
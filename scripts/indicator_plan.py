@@ -0,0 +1,315 @@
+"""
+Indicator Plan - 任意均线组合的编译式指标计划
+
+calculate_indicators 固定 3 条 SMA/EMA + SMA100，每条均线一次 pandas rolling / ewm。
+试验更多均线（例如 5/10/20/60/120/250）时，这里把指标需求编译成一个计划，整体计算：
+1. SMA: 所有周期共用一份补偿前缀和。收盘价拆成 定点部分 (前缀和精确) + 小残差，
+   每个周期只需两次减法和一次除法；窗口内价格全部相同时直接取该价格（与 pandas 一致，平盘不会产生伪交叉）
+2. EMA: 所有周期在同一遍分块计算中完成。块内用闭式解 y[j] = d^(j+1)·y_prev + d^j·cumsum(a·x·d^-m)（向量化），
+   块间每个周期只递推一个标量
+3. 交叉与粘合: 所有 (快线, 慢线) 对堆叠成矩阵一次比较；粘合 = 粘合均线组的 (最大值 - 最小值)，
+   等于两两差的最大值
+4. 交叉密度: 交叉事件的整数前缀和求窗口计数
+
+与 pandas 的差异在最后一两位（SMA 约 8 成逐位相同，EMA 相对误差 < 1e-14），两条均线恰好相等的K线上
+交叉判断可能不同。用于试验与筛选；线上检测 (calculate_indicators / detect_checkpoint) 仍使用与 pandas
+逐位一致的实现。
+
+使用：
+    from indicator_plan import PlanSpec, compile_plan
+    plan = compile_plan(PlanSpec(sma_periods=(5, 10, 20, 60, 120, 250), ema_periods=(20, 60),
+                                 crosses={'5_20': ('SMA5', 'SMA20'), '20_60': ('SMA20', 'SMA60')},
+                                 adhesion=('SMA20', 'SMA60', 'SMA120')))
+    df = plan.apply(df)
+    python scripts/indicator_plan.py --sma 5,10,20,60,120,250 --ema 20,60,120   # 与 pandas 对比精度与耗时
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+# =================配置=================
+EMA_BLOCK = 512        # EMA 分块长度（自动缩小以保证 d^-B 不溢出）
+TILE_BLOCKS = 16       # EMA 每组处理的块数
+CROSS_TILE = 8192      # 交叉比较按时间分段的长度
+MAX_SCALE_EXP = 200.0  # d^-B 的上限 (10^200)
+# =====================================
+
+
+@dataclass
+class PlanSpec:
+    """指标计划的输入：均线周期、交叉定义、粘合与密度参数"""
+    sma_periods: Tuple[int, ...] = (20, 60, 100, 120)
+    ema_periods: Tuple[int, ...] = (20, 60, 120)
+    crosses: Dict[str, Tuple[str, str]] = field(default_factory=dict)  # 名称 -> (快线列, 慢线列)
+    adhesion: Tuple[str, ...] = ()      # 参与粘合判断的均线列（空表示不计算）
+    adhesion_threshold: float = 0.5     # 粘合阈值(%)
+    density_window: int = 5             # 交叉密度窗口（0 表示不计算）
+    cross_threshold: int = 4            # 密集区交叉数阈值
+
+    @classmethod
+    def from_signal_config(cls, cfg) -> 'PlanSpec':
+        """与 calculate_indicators 相同的指标集（默认周期下列名也一致）"""
+        s1, s2, s3 = (f"SMA{p}" for p in (cfg.ma_period_1, cfg.ma_period_2, cfg.ma_period_3))
+        return cls(
+            sma_periods=(cfg.ma_period_1, cfg.ma_period_2, 100, cfg.ma_period_3),
+            ema_periods=(cfg.ma_period_1, cfg.ma_period_2, cfg.ma_period_3),
+            crosses={'1': (s1, s2), '2': (s2, s3), '3': (s1, s3)},
+            adhesion=(s1, s2, s3),
+            adhesion_threshold=cfg.adhesion_threshold,
+            density_window=cfg.density_window,
+            cross_threshold=cfg.cross_threshold,
+        )
+
+
+class _PrefixSums:
+    """
+    x 的补偿前缀和，所有窗口周期共用
+
+    x = 定点部分 q·2^-e + 残差 r。e 取使 n·max|q| <= 2^53 的最大值，因此定点部分的前缀和与任意窗口差
+    都是精确的；残差不超过 2^-(e+1)，其前缀和的舍入误差远小于窗口和的最后一位。
+    窗口和只舍入一次，再除以周期，与 pandas 补偿滑动求和的结果基本逐位一致。
+    """
+
+    def __init__(self, x: np.ndarray):
+        n = len(x)
+        span = float(np.max(np.abs(x))) or 1.0
+        self.exp = math.floor(math.log2(2.0 ** 53 / n / span))
+        q = np.rint(np.ldexp(x, self.exp))
+        r = x - np.ldexp(q, -self.exp)
+        self.hi = np.ldexp(np.concatenate(([0.0], np.cumsum(q))), -self.exp)
+        self.lo = np.concatenate(([0.0], np.cumsum(r)))
+
+    def window_mean(self, period: int) -> np.ndarray:
+        """长度 period 的滚动均值（前 period - 1 个为 NaN）"""
+        n = len(self.hi) - 1
+        out = np.full(n, np.nan)
+        if period > n:
+            return out
+        window = out[period - 1:]
+        np.subtract(self.hi[period:], self.hi[:-period], out=window)
+        window += self.lo[period:] - self.lo[:-period]
+        window /= period
+        return out
+
+
+def _run_lengths(x: np.ndarray) -> np.ndarray:
+    """每个位置向前连续相同值的个数（含自身）"""
+    n = len(x)
+    starts = np.r_[True, x[1:] != x[:-1]]
+    start_idx = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    return np.arange(n) - start_idx + 1
+
+
+def fused_ema(x: np.ndarray, spans: Tuple[int, ...]) -> np.ndarray:
+    """
+    多个 ewm(span, adjust=False) 一遍计算，返回 (len(spans), n)
+
+    块内闭式解全部向量化（所有周期同时），块间每块只做一次标量递推。
+    按 TILE_BLOCKS 个块一组处理，中间数组留在缓存里。
+    """
+    n = len(x)
+    spans = np.asarray(spans, dtype=float)
+    alpha = 2.0 / (spans + 1.0)
+    decay = 1.0 - alpha
+    out = np.empty((len(spans), n))
+    if n == 0:
+        return out
+    # span <= 1 时 EMA 就是收盘价
+    trivial = decay <= 0
+    out[trivial] = x
+    if trivial.all():
+        return out
+    d = decay[~trivial][:, None]
+    k = d.shape[0]
+
+    # 块长：保证 d^-B 不超过 10^MAX_SCALE_EXP
+    block = max(1, int(min(EMA_BLOCK, MAX_SCALE_EXP * math.log(10) / -math.log(float(d.min())))))
+    nb = -(-n // block)
+    xp = np.concatenate([x, np.full(nb * block - n, x[-1])]).reshape(nb, block)
+
+    j = np.arange(block)
+    pow_j = d ** j                                # d^j
+    coef = alpha[~trivial][:, None] * d ** -j     # a·d^-j
+    carry = d * pow_j                             # d^(j+1)：块前一个值对块内各点的权重
+    decay_block = carry[:, -1].tolist()           # d^B
+
+    y = np.empty((k, nb, block))
+    prev_value = [float(x[0])] * k                # 初值 x[0]，与 adjust=False 的首值一致
+    for g in range(0, nb, TILE_BLOCKS):
+        h = min(nb, g + TILE_BLOCKS)
+        # 零初值的块内部分: d^j · cumsum(a·x·d^-m)
+        w = xp[None, g:h] * coef[:, None, :]
+        np.cumsum(w, axis=2, out=w)
+        w *= pow_j[:, None, :]
+        # 块间递推: prev_{b+1} = d^B·prev_b + w[b, -1]
+        ends = w[:, :, -1].tolist()
+        prev = np.empty((k, h - g))
+        for s in range(k):
+            p, decay_b, values = prev_value[s], decay_block[s], []
+            for end in ends[s]:
+                values.append(p)
+                p = decay_b * p + end
+            prev[s] = values
+            prev_value[s] = p
+        w += prev[:, :, None] * carry[:, None, :]
+        y[:, g:h] = w
+    out[~trivial] = y.reshape(k, -1)[:, :n]
+    out[:, 0] = x[0]
+    return out
+
+
+class IndicatorPlan:
+    """编译后的指标计划：列名、交叉矩阵索引与粘合组在编译时确定，compute 只做数组运算"""
+
+    def __init__(self, spec: PlanSpec):
+        self.spec = spec
+        self.sma_periods = tuple(dict.fromkeys(int(p) for p in spec.sma_periods))
+        self.ema_periods = tuple(dict.fromkeys(int(p) for p in spec.ema_periods))
+        self.columns = [f"SMA{p}" for p in self.sma_periods] + [f"EMA{p}" for p in self.ema_periods]
+        position = {name: i for i, name in enumerate(self.columns)}
+
+        missing = {c for pair in spec.crosses.values() for c in pair} | set(spec.adhesion)
+        missing -= set(position)
+        if missing:
+            raise ValueError(f"交叉/粘合引用了计划中没有的均线: {sorted(missing)}")
+        self.cross_names = list(spec.crosses)
+        self.fast_idx = np.array([position[spec.crosses[c][0]] for c in self.cross_names], dtype=int)
+        self.slow_idx = np.array([position[spec.crosses[c][1]] for c in self.cross_names], dtype=int)
+        self.adhesion_idx = np.array([position[c] for c in spec.adhesion], dtype=int)
+
+    def compute(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        """对收盘价序列计算全部指标，返回 列名 -> 数组"""
+        spec = self.spec
+        close = np.asarray(close, dtype=float)
+        if not np.isfinite(close).all():
+            raise ValueError("收盘价包含 NaN / inf")
+        n = len(close)
+        ma = np.empty((len(self.columns), n))
+
+        # SMA: 共用一份前缀和；窗口内全为同一价格时取该价格
+        if self.sma_periods and n:
+            sums = _PrefixSums(close)
+            runs = _run_lengths(close)
+            for i, p in enumerate(self.sma_periods):
+                ma[i] = sums.window_mean(p)
+                np.copyto(ma[i], close, where=runs >= p)
+                ma[i, :p - 1] = np.nan
+        if self.ema_periods and n:
+            ma[len(self.sma_periods):] = fused_ema(close, self.ema_periods)
+
+        out = {name: ma[i] for i, name in enumerate(self.columns)}
+
+        # 交叉: 所有 (快线, 慢线) 对一次比较（与 NaN 比较为 False，首行为 False），按时间分段留在缓存里
+        if self.cross_names:
+            up = np.zeros((len(self.cross_names), n), dtype=bool)
+            dn = np.zeros_like(up)
+            for start in range(1, n, CROSS_TILE):
+                end = min(n, start + CROSS_TILE)
+                fast, slow = ma[self.fast_idx, start - 1:end], ma[self.slow_idx, start - 1:end]
+                np.logical_and(fast[:, 1:] > slow[:, 1:], fast[:, :-1] <= slow[:, :-1], out=up[:, start:end])
+                np.logical_and(fast[:, 1:] < slow[:, 1:], fast[:, :-1] >= slow[:, :-1], out=dn[:, start:end])
+            for k, name in enumerate(self.cross_names):
+                out[f"cross_up_{name}"] = up[k]
+                out[f"cross_dn_{name}"] = dn[k]
+
+            # 交叉密度: 事件前缀和求窗口计数
+            w = spec.density_window
+            if w > 0:
+                bull, bear = up.any(axis=0), dn.any(axis=0)
+                for col, event in (('total_in_window', bull | bear), ('bullish_cross', bull), ('bearish_cross', bear)):
+                    csum = np.concatenate(([0], np.cumsum(event, dtype=np.int64)))
+                    counts = np.full(n, np.nan)
+                    if n >= w:
+                        counts[w - 1:] = csum[w:] - csum[:-w]
+                    out[col] = counts
+                out['is_dense_area'] = out['total_in_window'] >= spec.cross_threshold
+
+        # 粘合: 两两差的最大值 = 最大值 - 最小值（至少两条有效均线）
+        if len(self.adhesion_idx):
+            group = ma[self.adhesion_idx]
+            spread = np.fmax.reduce(group, axis=0) - np.fmin.reduce(group, axis=0)   # fmax/fmin 跳过 NaN
+            spread[np.sum(~np.isnan(group), axis=0) < 2] = np.nan
+            out['is_adhesion'] = spread <= close * spec.adhesion_threshold / 100.0
+        return out
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """返回添加了计划中全部指标列的 DataFrame 副本"""
+        df = df.copy()
+        for name, values in self.compute(df['close'].to_numpy(dtype=float)).items():
+            df[name] = values
+        return df
+
+
+def compile_plan(spec: PlanSpec) -> IndicatorPlan:
+    """校验并编译指标计划"""
+    return IndicatorPlan(spec)
+
+
+def _pandas_reference(df: pd.DataFrame, spec: PlanSpec) -> Dict[str, np.ndarray]:
+    """逐条均线 pandas rolling / ewm（对比基准）"""
+    close = df['close']
+    out = {f"SMA{p}": close.rolling(p).mean().to_numpy() for p in spec.sma_periods}
+    out.update({f"EMA{p}": close.ewm(span=p, adjust=False).mean().to_numpy() for p in spec.ema_periods})
+    for name, (a, b) in spec.crosses.items():
+        sa, sb = pd.Series(out[a]), pd.Series(out[b])
+        out[f"cross_up_{name}"] = ((sa > sb) & (sa.shift(1) <= sb.shift(1))).to_numpy()
+        out[f"cross_dn_{name}"] = ((sa < sb) & (sa.shift(1) >= sb.shift(1))).to_numpy()
+    return out
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from pine_signal_detector import PineSignalDetector, SignalConfig
+
+    parser = argparse.ArgumentParser(description="编译式指标计划：与 pandas 逐条计算对比")
+    parser.add_argument('--sma', type=str, default='5,10,20,60,120,250', help='SMA 周期 (逗号分隔)')
+    parser.add_argument('--ema', type=str, default='20,60,120', help='EMA 周期 (逗号分隔)')
+    parser.add_argument('--rows', type=int, default=500_000, help='模拟K线数量')
+    args = parser.parse_args()
+
+    np.random.seed(42)
+    n = args.rows
+    close = np.round(30000 + np.cumsum(np.random.randn(n) * 15), 1)
+    close[n // 3: n // 3 + 500] = close[n // 3]   # 平盘段
+    df = pd.DataFrame({'close': close, 'high': close + 5, 'low': close - 5, 'open': close})
+
+    # 1. 与 calculate_indicators 的一致性（默认配置）
+    detector = PineSignalDetector(SignalConfig())
+    ref = detector.calculate_indicators(df)
+    got = compile_plan(PlanSpec.from_signal_config(detector.config)).apply(df)
+    print("Indicator Plan - 与 calculate_indicators 对比 (默认配置)")
+    for col in ('SMA20', 'SMA60', 'SMA100', 'SMA120', 'EMA20', 'EMA60', 'EMA120'):
+        rel = np.nanmax(np.abs(got[col] - ref[col]) / ref[col].abs())
+        print(f"   {col:8} 最大相对误差 {rel:.2e}")
+    for col in ('cross_up_1', 'cross_dn_1', 'cross_up_2', 'cross_dn_2', 'cross_up_3', 'cross_dn_3',
+                'is_dense_area', 'is_adhesion'):
+        diff = int((got[col].astype(bool) != ref[col].astype(bool)).sum())
+        print(f"   {col:14} 不一致 {diff} / {n}")
+
+    # 2. 任意均线组合的耗时
+    smas = tuple(int(p) for p in args.sma.split(',') if p)
+    emas = tuple(int(p) for p in args.ema.split(',') if p)
+    names = [f"SMA{p}" for p in smas]
+    spec = PlanSpec(sma_periods=smas, ema_periods=emas,
+                    crosses={f"{a[3:]}_{b[3:]}": (a, b) for i, a in enumerate(names) for b in names[i + 1:]},
+                    adhesion=tuple(names[:3]))
+    t0 = time.perf_counter()
+    expected = _pandas_reference(df, spec)
+    t_pandas = time.perf_counter() - t0
+    plan = compile_plan(spec)
+    t0 = time.perf_counter()
+    result = plan.compute(close)
+    t_plan = time.perf_counter() - t0
+    mismatched = sum(int((result[k] != expected[k]).sum()) for k in expected if k.startswith('cross_'))
+    print(f"\n{len(smas)} SMA + {len(emas)} EMA + {len(spec.crosses)} 组交叉, {n} 根K线:")
+    print(f"   pandas 逐条: {t_pandas * 1000:.0f}ms")
+    print(f"   指标计划:   {t_plan * 1000:.0f}ms")
+    print(f"   交叉不一致: {mismatched}")
@@ -8,25 +8,215 @@ YOLO 模型推理脚本
 2. 设置置信度阈值
 3. 对指定图像或目录进行推理
 4. 显示或保存检测结果
+
+推理后端：
+- torch (默认): ultralytics 加载 .pt 权重
+- onnx: onnxruntime CPU 推理（先运行 export_onnx.py 导出），NMS 由 NumPy 实现
+
+流式模式 (--stream)：
+按批推理，每张图的检测结果立即追加到 JSONL，内存占用与图片总数无关；
+中断后加 --resume 跳过已写入的图片继续。标注图保存需显式 --save-images。
+加 --pred-cache 后按 (图像哈希, 模型哈希, conf, imgsz) 复用历史结果，只对新增/变化的图片运行模型（隐含 --stream）。
+
+使用：
+    python scripts/infer.py [图片路径或目录]
+    python scripts/infer.py [图片路径或目录] --backend onnx --model runs/.../best.onnx
+    python scripts/infer.py [图片路径或目录] --stream --batch-size 32 --resume
+    python scripts/infer.py [图片路径或目录] --stream --pred-cache
+    python scripts/infer.py data/pine_signals_compact320/images --variant compact320
 """
 
-from ultralytics import YOLO
 import os
 import sys
+import json
+import time
+import argparse
 from pathlib import Path
+from typing import Iterator, List, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import REGISTRY, add_metrics_args, start_from_args
+
+INFERENCE_SECONDS = REGISTRY.histogram('inference_seconds', '单次推理调用耗时 (秒，一批或一张)', ['backend'])
+INFERENCE_IMAGES = REGISTRY.counter('inference_images_total', '推理的图片数', ['backend'])
 
 # =================配置=================
 # 模型路径（训练完成后把最佳权重路径填在这里）
 # 默认路径: runs/detect/kline_cluster_yolo11/weights/best.pt
 MODEL_PATH = 'runs/detect/kline_cluster_yolo11/weights/best.pt'
 
+# ONNX 模型路径 (export_onnx.py 导出到 .pt 同目录)
+ONNX_MODEL_PATH = 'runs/detect/kline_cluster_yolo11/weights/best.onnx'
+
 # 测试图片路径（可以是单张图片，也可以是文件夹）
-TEST_SOURCE = "data/pine_signals/images" 
+TEST_SOURCE = "data/pine_signals/images"
 
 # 置信度阈值 (0.0 - 1.0)
-CONF_THRESHOLD = 0.25 
+CONF_THRESHOLD = 0.25
+
+# 推理输入尺寸
+IMGSZ = 640
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# 流式推理结果 (JSONL，每行一张图)
+RESULTS_JSONL = 'runs/detect/inference_results/predictions.jsonl'
+BATCH_SIZE = 16
+
+# 推理结果缓存数据库 (prediction_cache.py)
+PREDICTION_DB = 'data/predictions.db'
 # =====================================
 
+
+def list_images(source: str) -> List[str]:
+    """列出 source 下的所有图像（source 为单个文件时直接返回）"""
+    if os.path.isdir(source):
+        with os.scandir(source) as it:
+            return sorted(e.path for e in it if e.name.lower().endswith(IMAGE_EXTS))
+    return [source]
+
+
+def results_to_detections(res) -> List[dict]:
+    """ultralytics Results -> 与 ONNX 后端一致的检测列表"""
+    boxes = res.boxes
+    return [
+        {'cls': int(c), 'name': res.names[int(c)], 'conf': float(s), 'xyxy': [float(v) for v in b]}
+        for b, s, c in zip(boxes.xyxy.tolist(), boxes.conf.tolist(), boxes.cls.tolist())
+    ]
+
+
+def iter_batches(items: List[str], batch_size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+def load_processed(results_path: str) -> Set[str]:
+    """读取已写入结果文件的图片路径（用于 --resume），忽略中断时写了一半的末行"""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['image'])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def _truncate_partial_line(results_path: str):
+    """去掉中断时未写完的末行，保证追加后每行都是完整 JSON"""
+    if not os.path.exists(results_path):
+        return
+    with open(results_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+def stream_infer(backend: str = 'torch', batch_size: int = BATCH_SIZE, results_path: str = RESULTS_JSONL,
+                 resume: bool = False, save_images: bool = False, cache_db: Optional[str] = None):
+    """流式推理：按批处理并逐批追加写入 JSONL，不在内存中累积结果（cache_db 非空时复用缓存结果）"""
+    images = list_images(TEST_SOURCE)
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+
+    if resume:
+        _truncate_partial_line(results_path)
+        done = load_processed(results_path)
+        images = [p for p in images if p not in done]
+        print(f"⏩ 续跑: 跳过已处理 {len(done)} 张，剩余 {len(images)} 张")
+    elif os.path.exists(results_path):
+        os.remove(results_path)
+
+    if not images:
+        print("✅ 没有需要推理的图片")
+        return
+
+    if backend == 'onnx':
+        from onnx_infer import OnnxDetector
+        if not os.path.exists(ONNX_MODEL_PATH):
+            print(f"❌ ONNX 模型不存在: {ONNX_MODEL_PATH}")
+            return
+        detector = OnnxDetector(ONNX_MODEL_PATH, conf=CONF_THRESHOLD, imgsz=IMGSZ)
+        model_path = ONNX_MODEL_PATH
+
+        def run_batch(batch):
+            return detector.predict(batch)
+        if save_images:
+            print("⚠️ ONNX 后端不支持保存标注图，已忽略 --save-images")
+    else:
+        if not os.path.exists(MODEL_PATH):
+            print(f"❌ 模型文件不存在: {MODEL_PATH}")
+            return
+        from ultralytics import YOLO
+        model = YOLO(MODEL_PATH)
+        model_path = MODEL_PATH
+
+        def run_batch(batch):
+            results = model.predict(
+                source=batch,
+                stream=True,
+                save=save_images,
+                conf=CONF_THRESHOLD,
+                imgsz=IMGSZ,
+                project="runs/detect",
+                name="inference_results",
+                exist_ok=True,
+                verbose=False,
+            )
+            return [results_to_detections(res) for res in results]
+
+    cache = None
+    if cache_db:
+        from prediction_cache import PredictionCache
+        cache = PredictionCache(cache_db, model_path, conf=CONF_THRESHOLD, imgsz=IMGSZ)
+
+    def timed_batch(batch):
+        t0 = time.perf_counter()
+        results = run_batch(batch)
+        INFERENCE_SECONDS.observe(time.perf_counter() - t0, backend=backend)
+        INFERENCE_IMAGES.inc(len(batch), backend=backend)
+        return results
+
+    print(f"🔍 流式推理 ({backend}, 源: {TEST_SOURCE}, {len(images)} 张, 批大小: {batch_size})...")
+    processed = detected = 0
+    start = time.time()
+    with open(results_path, 'a', encoding='utf-8') as f:
+        for batch in iter_batches(images, batch_size):
+            if cache is not None:
+                results = cache.lookup(batch)
+                todo = [p for p in batch if p not in results]
+                if todo:
+                    for path, detections in zip(todo, timed_batch(todo)):
+                        results[path] = detections
+                        cache.put(path, detections)
+                    cache.flush()
+                batch_results = [results[p] for p in batch]
+            else:
+                batch_results = timed_batch(batch)
+
+            for path, detections in zip(batch, batch_results):
+                f.write(json.dumps({
+                    'image': path,
+                    'model': model_path,
+                    'conf_threshold': CONF_THRESHOLD,
+                    'detections': detections,
+                }, ensure_ascii=False) + "\n")
+                detected += bool(detections)
+            f.flush()
+            processed += len(batch)
+            if processed % (batch_size * 50) < batch_size:
+                rate = processed / max(time.time() - start, 1e-9)
+                print(f"   进度: {processed}/{len(images)} ({rate:.1f} 张/秒)")
+
+    print(f"✅ 推理完成！在 {processed} 张图片中，有 {detected} 张检测到了目标。")
+    print(f"   结果已写入: {results_path}")
+    if cache is not None:
+        print(f"📦 {cache.summary()}")
+        cache.close()
+
+
 def infer():
     """执行推理"""
     if not os.path.exists(MODEL_PATH):
@@ -36,39 +226,131 @@ def infer():
 
     print(f"🚀 加载模型: {MODEL_PATH}...")
     try:
+        from ultralytics import YOLO
         model = YOLO(MODEL_PATH)
     except Exception as e:
         print(f"❌ 加载模型失败: {e}")
         return
 
     print(f"🔍 开始推理 (源: {TEST_SOURCE}, 置信度: {CONF_THRESHOLD})...")
-    
+
     # 执行预测
     # save=True: 保存带标注的图片到 runs/detect/predict
     # conf: 置信度阈值
+    t0 = time.perf_counter()
     results = model.predict(
-        source=TEST_SOURCE, 
-        save=True, 
+        source=TEST_SOURCE,
+        save=True,
         conf=CONF_THRESHOLD,
+        imgsz=IMGSZ,
         project="runs/detect",
         name="inference_results",
         exist_ok=True
     )
-    
+    INFERENCE_SECONDS.observe(time.perf_counter() - t0, backend='torch')
+    INFERENCE_IMAGES.inc(len(results), backend='torch')
+
     print(f"✅ 推理完成！")
     print(f"   结果已保存至: runs/detect/inference_results")
-    
+
     # 打印一些统计信息
     count = 0
     for res in results:
         if len(res.boxes) > 0:
             count += 1
-            
+
     print(f"   在 {len(results)} 张图片中，有 {count} 张检测到了目标。")
 
+
+def infer_onnx():
+    """使用 onnxruntime 在 CPU 上推理"""
+    from onnx_infer import OnnxDetector
+
+    if not os.path.exists(ONNX_MODEL_PATH):
+        print(f"❌ ONNX 模型不存在: {ONNX_MODEL_PATH}")
+        print("   请先运行 export_onnx.py 导出模型。")
+        return
+
+    print(f"🚀 加载 ONNX 模型: {ONNX_MODEL_PATH}...")
+    detector = OnnxDetector(ONNX_MODEL_PATH, conf=CONF_THRESHOLD, imgsz=IMGSZ)
+
+    images = list_images(TEST_SOURCE)
+    print(f"🔍 开始推理 (源: {TEST_SOURCE}, {len(images)} 张, 置信度: {CONF_THRESHOLD})...")
+
+    count = 0
+    for path in images:
+        t0 = time.perf_counter()
+        detections = detector.predict_one(path)
+        INFERENCE_SECONDS.observe(time.perf_counter() - t0, backend='onnx')
+        INFERENCE_IMAGES.inc(backend='onnx')
+        if detections:
+            count += 1
+            best = max(detections, key=lambda d: d['conf'])
+            print(f"   {Path(path).name}: {best['name']} ({best['conf']:.2f})")
+
+    print(f"✅ 推理完成！")
+    print(f"   在 {len(images)} 张图片中，有 {count} 张检测到了目标。")
+
+
 if __name__ == "__main__":
-    # 如果命令行传入了参数，则使用命令行参数作为图片路径
-    if len(sys.argv) > 1:
-        TEST_SOURCE = sys.argv[1]
-        
-    infer()
\ No newline at end of file
+    from chart_generator import CHART_VARIANTS
+
+    parser = argparse.ArgumentParser(description="YOLO 模型推理")
+    parser.add_argument('source', nargs='?', default=TEST_SOURCE,
+                        help=f'图片路径或目录 (default: {TEST_SOURCE})')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                        help='推理后端 (default: torch)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='模型路径 (torch: .pt, onnx: .onnx)')
+    parser.add_argument('--conf', type=float, default=CONF_THRESHOLD,
+                        help=f'置信度阈值 (default: {CONF_THRESHOLD})')
+    parser.add_argument('--imgsz', type=int, default=IMGSZ,
+                        help=f'推理输入尺寸 (default: {IMGSZ})')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式推理：按批写入 JSONL，内存占用恒定')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'流式推理批大小 (default: {BATCH_SIZE})')
+    parser.add_argument('--output', type=str, default=RESULTS_JSONL,
+                        help=f'流式推理结果文件 (default: {RESULTS_JSONL})')
+    parser.add_argument('--resume', action='store_true',
+                        help='从结果文件中最后处理的图片之后继续')
+    parser.add_argument('--save-images', action='store_true',
+                        help='流式推理时同时保存标注图 (仅 torch 后端)')
+    parser.add_argument('--pred-cache', nargs='?', const=PREDICTION_DB, default=None, metavar='DB',
+                        help=f'启用推理结果缓存，隐含 --stream (默认数据库: {PREDICTION_DB})')
+    parser.add_argument('--variant', choices=list(CHART_VARIANTS), default='full',
+                        help='图表变体：决定默认模型与输入尺寸')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    if args.pred_cache and not args.stream:
+        # 推理缓存只在流式路径上生效，否则仍会对每张图重新推理
+        print("📌 --pred-cache 使用流式推理 (--stream)")
+        args.stream = True
+
+    if args.variant != 'full':
+        variant = CHART_VARIANTS[args.variant]
+        MODEL_PATH = MODEL_PATH.replace('kline_cluster_yolo11', 'kline_cluster_yolo11' + variant.suffix)
+        ONNX_MODEL_PATH = ONNX_MODEL_PATH.replace('kline_cluster_yolo11', 'kline_cluster_yolo11' + variant.suffix)
+        if args.imgsz == IMGSZ:
+            args.imgsz = variant.img_size
+
+    TEST_SOURCE = args.source
+    CONF_THRESHOLD = args.conf
+    IMGSZ = args.imgsz
+    if args.backend == 'onnx':
+        ONNX_MODEL_PATH = args.model or ONNX_MODEL_PATH
+    else:
+        MODEL_PATH = args.model or MODEL_PATH
+
+    metrics_writer = start_from_args(args)
+    try:
+        if args.stream:
+            stream_infer(args.backend, args.batch_size, args.output, args.resume, args.save_images,
+                         args.pred_cache)
+        elif args.backend == 'onnx':
+            infer_onnx()
+        else:
+            infer()
+    finally:
+        if metrics_writer is not None:
+            metrics_writer.stop()
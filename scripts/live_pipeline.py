@@ -0,0 +1,335 @@
+"""
+Live Pipeline - 规则门控的两阶段实时告警
+
+阶段一：PineSignalDetector 向量化计算全部规则，只挑出候选K线（绝大多数K线在这里被过滤）
+阶段二：只对候选K线用 ChartGenerator 渲染图表（内存中，不落盘），交给 YOLO 模型打分
+两阶段结论一致（模型检测到与规则同方向的形态且置信度达标）才发出告警，
+告警中同时包含规则侧指标与模型侧检测结果。
+
+延迟：以图表最右一根K线的收盘时间为起点，记录 拉取数据 / 规则检测 / 渲染 / 模型打分 各阶段耗时
+以及收盘到告警的总延迟，退出时输出 p50 / p99。
+
+使用：
+    python scripts/live_pipeline.py --symbols BTC-USDT-SWAP,ETH-USDT-SWAP --bar 5m
+    python scripts/live_pipeline.py --backend onnx --model runs/.../best.onnx --once
+    python scripts/live_pipeline.py --variant compact320 --backend onnx   # 紧凑右侧变体，单图延迟更低
+    python scripts/live_pipeline.py --webhook http://127.0.0.1:8000/alerts   # 告警异步投递 (alert_dispatcher.py)
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from okx_utils import fetch_candles, bar_to_seconds
+from pine_signal_detector import PineSignalDetector, SignalConfig, SIGNALS_TOTAL
+from chart_generator import ChartGenerator, ChartConfig, stack_chart_columns, CHART_VARIANTS, RENDER_QUEUE_DEPTH
+from alert_dispatcher import AlertDispatcher, WebhookSink, FileSink
+from metrics import REGISTRY, add_metrics_args, start_from_args
+
+STAGE_SECONDS = REGISTRY.histogram('pipeline_stage_seconds', '两阶段管线各阶段耗时 (秒)；close_to_alert 为收盘到告警延迟', ['stage'])
+
+# =================配置=================
+DEFAULT_SYMBOLS = "BTC-USDT-SWAP,ETH-USDT-SWAP"
+DEFAULT_BAR = "5m"
+MODEL_PATH = 'runs/detect/kline_cluster_yolo11/weights/best.pt'
+ONNX_MODEL_PATH = 'runs/detect/kline_cluster_yolo11/weights/best.onnx'
+ALERT_FILE = "data/alerts.jsonl"
+SIGNAL_NAMES = {0: 'LONG', 1: 'SHORT'}
+# =====================================
+
+
+@dataclass
+class PipelineConfig:
+    """两阶段管线参数"""
+    window_size: int = 60        # 图表窗口（与训练一致）
+    history_bars: int = 300      # 每次拉取的K线数（需覆盖 SMA120 预热 + 窗口）
+    chart_end_offset: int = 2    # 信号K线之后再收盘几根作为图表最右侧（与训练样本一致）
+    lookback_bars: int = 1       # 每轮检查最近几根可出图的K线
+    model_conf: float = 0.25     # 模型确认的最低置信度
+    settle_seconds: float = 2.0  # 收盘后等待交易所数据落定的时间
+
+
+class StageTimer:
+    """按阶段收集耗时（秒），输出 p50 / p99"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def report(self) -> List[str]:
+        lines = []
+        for stage, values in self.samples.items():
+            arr = np.array(values) * 1000
+            lines.append(f"{stage:14} n={len(arr):5d}  p50={np.percentile(arr, 50):9.1f}ms  "
+                         f"p99={np.percentile(arr, 99):9.1f}ms")
+        return lines
+
+
+class TwoStagePipeline:
+    """规则检测 -> 候选渲染 -> 模型确认"""
+
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        backend: str = 'torch',
+        bar: str = DEFAULT_BAR,
+        signal_config: SignalConfig = None,
+        chart_config: ChartConfig = None,
+        config: PipelineConfig = None,
+        alert_path: Optional[str] = ALERT_FILE,
+        dispatcher=None,
+    ):
+        self.bar = bar
+        self.bar_seconds = bar_to_seconds(bar)
+        self.detector = PineSignalDetector(signal_config or SignalConfig())
+        self.chart_gen = ChartGenerator(chart_config)
+        self.config = config or PipelineConfig()
+        self.alert_path = alert_path
+        self.dispatcher = dispatcher  # AlertDispatcher，投递在后台线程进行，不阻塞扫描
+        self.timer = StageTimer()
+        self._emitted = {}  # symbol -> {信号时间} 去重，同一根K线只告警一次（只保留检查窗口内的）
+        self.backend = backend
+        self._predict = self._load_model(model_path, backend)
+
+    def _load_model(self, model_path: str, backend: str):
+        if backend == 'onnx':
+            from onnx_infer import OnnxDetector
+            detector = OnnxDetector(model_path, conf=self.config.model_conf)
+            return detector.predict
+
+        from ultralytics import YOLO
+        from infer import results_to_detections
+        model = YOLO(model_path)
+
+        def predict(images):
+            results = model.predict(source=images, conf=self.config.model_conf, verbose=False)
+            return [results_to_detections(r) for r in results]
+        return predict
+
+    # ---------------- 阶段一：规则 ----------------
+
+    def find_candidates(self, df: pd.DataFrame):
+        """返回 (带指标的 df, 候选列表)；候选为 (信号K线索引, 'LONG'/'SHORT')"""
+        cfg = self.config
+        df = self.detector.calculate_indicators(df)
+        df = self.detector.calculate_stateful_signals(df)
+        long_mask, short_mask = self.detector.check_signals_vectorized(df)
+
+        n = len(df)
+        last = n - 1 - cfg.chart_end_offset
+        ready = df['SMA120'].notna().to_numpy()
+        candidates = []
+        for idx in range(max(0, last - cfg.lookback_bars + 1), last + 1):
+            if not ready[idx]:
+                continue
+            if long_mask[idx]:
+                candidates.append((idx, 'LONG'))
+            elif short_mask[idx]:
+                candidates.append((idx, 'SHORT'))
+        return df, candidates
+
+    # ---------------- 阶段二：渲染 + 模型 ----------------
+
+    def render(self, chart_data: np.ndarray, signal_idx: int, signal_type: str) -> np.ndarray:
+        """在内存中渲染候选图表，返回 BGR 图像"""
+        end = signal_idx + self.config.chart_end_offset
+        window = chart_data[max(0, end - self.config.window_size + 1): end + 1]
+        buf = io.BytesIO()
+        self.chart_gen.generate_chart(window, signal_type=signal_type, output_path=buf, show_signal_marker=True)
+        return cv2.imdecode(np.frombuffer(buf.getvalue(), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    @staticmethod
+    def confirm(detections: List[dict], signal_type: str) -> Optional[dict]:
+        """取与规则方向一致的最高置信度检测"""
+        same = [d for d in detections if SIGNAL_NAMES.get(d['cls']) == signal_type]
+        return max(same, key=lambda d: d['conf']) if same else None
+
+    def process(self, symbol: str, df: pd.DataFrame, fetch_seconds: float = 0.0) -> List[dict]:
+        """处理一个交易对的最新（已收盘）K线，返回本轮告警"""
+        self.timer.add('fetch', fetch_seconds)
+
+        t0 = time.perf_counter()
+        df, candidates = self.find_candidates(df)
+        self.timer.add('detect', time.perf_counter() - t0)
+
+        # 早于本轮检查窗口的信号不会再成为候选，从去重集合中移除，长时间运行时内存不增长
+        first = max(0, len(df) - 1 - self.config.chart_end_offset - self.config.lookback_bars + 1)
+        window_start = int(df['timestamp'].iloc[first]) if len(df) else 0
+        emitted = {ts for ts in self._emitted.get(symbol, ()) if ts >= window_start}
+        self._emitted[symbol] = emitted
+
+        candidates = [(i, t) for i, t in candidates if int(df['timestamp'].iloc[i]) not in emitted]
+        if not candidates:
+            return []
+        for _, signal_type in candidates:
+            SIGNALS_TOTAL.inc(type=signal_type)
+
+        t0 = time.perf_counter()
+        chart_data = stack_chart_columns(df)
+        images = []
+        for idx, signal_type in candidates:
+            RENDER_QUEUE_DEPTH.set(len(candidates) - len(images))
+            images.append(self.render(chart_data, idx, signal_type))
+        RENDER_QUEUE_DEPTH.set(0)
+        self.timer.add('render', time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        detections = self._predict(images)
+        self.timer.add('score', time.perf_counter() - t0)
+
+        alerts = []
+        for (idx, signal_type), dets in zip(candidates, detections):
+            emitted.add(int(df['timestamp'].iloc[idx]))
+            best = self.confirm(dets, signal_type)
+            if best is None or best['conf'] < self.config.model_conf:
+                continue
+
+            row = df.iloc[idx]
+            chart_end = idx + self.config.chart_end_offset
+            bar_close_ms = int(df['timestamp'].iloc[chart_end]) + self.bar_seconds * 1000
+            latency = time.time() - bar_close_ms / 1000
+            self.timer.add('close_to_alert', latency)
+
+            alerts.append({
+                'symbol': symbol,
+                'bar': self.bar,
+                'type': signal_type,
+                'ts': int(row['timestamp']) / 1000,
+                'signal_time': datetime.fromtimestamp(int(row['timestamp']) / 1000, tz=timezone.utc).isoformat(),
+                'close': float(row['close']),
+                'detector': {
+                    'osc': float(row['osc']),
+                    'cross_up_1': bool(row['cross_up_1']),
+                    'cross_dn_1': bool(row['cross_dn_1']),
+                    'adhesion_breakout_up': bool(row['adhesion_breakout_up']),
+                    'adhesion_breakout_down': bool(row['adhesion_breakout_down']),
+                    'breakout_above_range': bool(row['breakout_above_range']),
+                    'breakout_below_range': bool(row['breakout_below_range']),
+                },
+                'model': best,
+                'latency_s': round(latency, 3),
+            })
+
+        for alert in alerts:
+            self.emit(alert)
+        return alerts
+
+    def emit(self, alert: dict):
+        print(f"🔔 {alert['symbol']} {alert['type']} @ {alert['signal_time']} "
+              f"close={alert['close']} conf={alert['model']['conf']:.2f} 延迟={alert['latency_s']:.1f}s")
+        if self.alert_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.alert_path)), exist_ok=True)
+            with open(self.alert_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+        if self.dispatcher is not None:
+            self.dispatcher.submit(alert)
+
+
+def fetch_closed_candles(symbol: str, bar: str, limit: int) -> Optional[pd.DataFrame]:
+    """拉取最近 limit 根K线，去掉未收盘的最后一根"""
+    df = fetch_candles(symbol, bar=bar, limit=limit)
+    if df is None:
+        return None
+    if 'confirm' in df.columns:
+        df = df[df['confirm'].astype(str) == '1'].reset_index(drop=True)
+    return df
+
+
+def run_cycle(pipeline: TwoStagePipeline, symbols: List[str]) -> int:
+    alerts = 0
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        df = fetch_closed_candles(symbol, pipeline.bar, pipeline.config.history_bars)
+        fetch_seconds = time.perf_counter() - t0
+        if df is None or len(df) < pipeline.config.window_size + 120:
+            print(f"⚠️ {symbol}: 数据不足，跳过")
+            continue
+        alerts += len(pipeline.process(symbol, df, fetch_seconds))
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规则门控的两阶段实时告警")
+    parser.add_argument('--symbols', type=str, default=DEFAULT_SYMBOLS, help='交易对列表 (逗号分隔)')
+    parser.add_argument('--bar', type=str, default=DEFAULT_BAR, help=f'K线周期 (default: {DEFAULT_BAR})')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch', help='模型后端')
+    parser.add_argument('--model', type=str, default=None, help='模型路径 (torch: .pt, onnx: .onnx)')
+    parser.add_argument('--conf', type=float, default=0.25, help='模型确认的最低置信度')
+    parser.add_argument('--lookback', type=int, default=1, help='每轮检查最近几根可出图的K线')
+    parser.add_argument('--alerts', type=str, default=ALERT_FILE, help=f'告警输出 JSONL (default: {ALERT_FILE})')
+    parser.add_argument('--variant', choices=list(CHART_VARIANTS), default='full',
+                        help='图表变体 (需与模型训练时一致)')
+    parser.add_argument('--webhook', type=str, action='append', default=[], help='告警 webhook URL (可重复)')
+    parser.add_argument('--alert-feed', type=str, default=None,
+                        help='异步追加告警到 JSONL (dashboard 告警流读取 data/alert_feed.jsonl)')
+    parser.add_argument('--debounce', type=float, default=None,
+                        help='同一交易对同方向告警的去抖秒数 (default: 5 根K线)')
+    add_metrics_args(parser)
+    parser.add_argument('--once', action='store_true', help='只运行一轮')
+    args = parser.parse_args()
+
+    variant = CHART_VARIANTS[args.variant]
+    model_path = args.model or (ONNX_MODEL_PATH if args.backend == 'onnx' else MODEL_PATH)
+    model_path = model_path.replace('kline_cluster_yolo11/', f'kline_cluster_yolo11{variant.suffix}/') \
+        if not args.model else model_path
+    if not os.path.exists(model_path):
+        print(f"❌ 模型文件不存在: {model_path}")
+        return
+
+    dispatcher = None
+    sinks = [WebhookSink(url) for url in args.webhook]
+    if args.alert_feed:
+        sinks.append(FileSink(args.alert_feed))
+    if sinks:
+        debounce = args.debounce if args.debounce is not None else 5 * bar_to_seconds(args.bar)
+        dispatcher = AlertDispatcher(sinks, debounce_seconds=debounce)
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    pipeline = TwoStagePipeline(
+        model_path, backend=args.backend, bar=args.bar, alert_path=args.alerts, dispatcher=dispatcher,
+        chart_config=variant.chart_config(),
+        config=PipelineConfig(window_size=variant.window_size, model_conf=args.conf, lookback_bars=args.lookback),
+    )
+
+    metrics_writer = start_from_args(args)
+    print(f"🚀 两阶段管线启动: {len(symbols)} 个交易对, 周期 {args.bar}, 后端 {args.backend}")
+    try:
+        while True:
+            n_alerts = run_cycle(pipeline, symbols)
+            print(f"✅ 本轮完成，告警 {n_alerts} 条")
+            if args.once:
+                break
+            # 等到下一根K线收盘后再运行
+            now = time.time()
+            next_close = (now // pipeline.bar_seconds + 1) * pipeline.bar_seconds
+            time.sleep(next_close - now + pipeline.config.settle_seconds)
+    except KeyboardInterrupt:
+        print("\n⏹ 已停止")
+    finally:
+        print("⏱ 各阶段耗时:")
+        for line in pipeline.timer.report():
+            print(f"   {line}")
+        if dispatcher is not None:
+            dispatcher.close()
+            print(f"📮 告警投递: {dispatcher.summary()}")
+        if metrics_writer is not None:
+            metrics_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Live Scanner - K线收盘对齐的增量实时扫描
+
+sliding_window_signal.py 每次运行都会重新下载全部历史K线；实时扫描只需要最新一根。这里：
+1. 启动时为每个交易对预热一个常驻内存窗口（默认 250 根已收盘K线，覆盖 SMA120 与动能指标的预热）
+2. 每根K线收盘后（+settle 秒），用线程池并发拉取所有交易对最新的几根已收盘K线（单次请求，不翻页）
+3. 新K线追加到窗口、裁剪到固定长度，只对新K线调用 check_signal
+4. 缺口过大（例如断网后恢复）时对该交易对重新预热
+5. 每轮打印 拉取 / 检测 / 端到端 耗时
+
+信号打印到终端，并可通过 alert_dispatcher 异步投递（webhook / JSONL）。
+
+使用：
+    python scripts/live_scanner.py --top 100 --bar 5m
+    python scripts/live_scanner.py --symbols BTC-USDT-SWAP,ETH-USDT-SWAP --bar 1m --once
+    python scripts/live_scanner.py --top 100 --alert-feed data/alert_feed.jsonl
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from okx_utils import get_top_volume_pairs, fetch_candles, fetch_latest_candles, bar_to_seconds
+from pine_signal_detector import PineSignalDetector, SignalConfig
+from alert_dispatcher import AlertDispatcher, WebhookSink, FileSink, alerts_from_check_signal
+from task_scheduler import next_bar_close
+from metrics import REGISTRY, add_metrics_args, start_from_args
+
+SCAN_CYCLE_SECONDS = REGISTRY.histogram('scan_cycle_seconds', '实时扫描每轮耗时 (秒)', ['stage'])
+
+# =================配置=================
+DEFAULT_BAR = "5m"
+DEFAULT_TOP_N = 100
+# =====================================
+
+
+@dataclass
+class ScannerConfig:
+    """实时扫描配置"""
+    window_bars: int = 250      # 常驻窗口长度（需 > SMA120 + 动能MA 的预热长度）
+    workers: int = 16           # 并发拉取线程数
+    settle_seconds: float = 2.0 # 收盘后等待交易所确认K线的秒数
+    max_tail: int = 100         # 单次增量拉取的最大根数，缺口更大时重新预热
+    retry_delay: float = 1.0    # 收盘K线尚未出现时的重试等待秒数
+
+
+class SymbolWindow:
+    """单个交易对的常驻K线窗口（只保留已收盘K线）"""
+
+    def __init__(self, symbol: str, df: pd.DataFrame, size: int):
+        self.symbol = symbol
+        self.size = size
+        self.df = df.iloc[-size:].reset_index(drop=True)
+
+    @property
+    def last_ts(self) -> int:
+        return int(self.df['timestamp'].iloc[-1])
+
+    def append(self, new_df: pd.DataFrame) -> int:
+        """追加比窗口更新的K线并裁剪，返回新增根数"""
+        new_df = new_df[new_df['timestamp'] > self.last_ts]
+        if new_df.empty:
+            return 0
+        self.df = pd.concat([self.df, new_df], ignore_index=True).iloc[-self.size:].reset_index(drop=True)
+        return len(new_df)
+
+
+class LiveScanner:
+    """常驻窗口 + 增量拉取 + 只检测新K线"""
+
+    def __init__(
+        self,
+        symbols: List[str],
+        bar: str = DEFAULT_BAR,
+        signal_config: SignalConfig = None,
+        config: ScannerConfig = None,
+        dispatcher: Optional[AlertDispatcher] = None,
+    ):
+        self.symbols = list(symbols)
+        self.bar = bar
+        self.bar_ms = bar_to_seconds(bar) * 1000
+        self.detector = PineSignalDetector(signal_config or SignalConfig())
+        self.config = config or ScannerConfig()
+        self.dispatcher = dispatcher
+        self.windows: Dict[str, SymbolWindow] = {}
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="scanner")
+
+    def _session(self) -> requests.Session:
+        """每个线程一个 Session，复用 TCP/TLS 连接"""
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    # ---------------- 拉取 ----------------
+
+    def _warm_one(self, symbol: str) -> Optional[SymbolWindow]:
+        df = fetch_candles(symbol, bar=self.bar, limit=self.config.window_bars + 1)
+        if df is None:
+            return None
+        df = df[df['confirm'].astype(str) == '1']
+        if len(df) < self.config.window_bars // 2:
+            return None
+        return SymbolWindow(symbol, df, self.config.window_bars)
+
+    def warm_up(self):
+        t0 = time.perf_counter()
+        missing = [s for s in self.symbols if s not in self.windows]
+        for symbol, window in zip(missing, self._pool.map(self._warm_one, missing)):
+            if window is None:
+                print(f"⚠️ {symbol}: 预热数据不足，跳过")
+                continue
+            self.windows[symbol] = window
+        print(f"🔥 预热完成: {len(self.windows)}/{len(self.symbols)} 个交易对, "
+              f"每个 {self.config.window_bars} 根K线, 耗时 {time.perf_counter() - t0:.1f}s")
+
+    def _fetch_tail(self, symbol: str) -> Tuple[str, Optional[pd.DataFrame]]:
+        """拉取窗口之后的新K线；缺口超过 max_tail 时重新预热"""
+        window = self.windows[symbol]
+        # 最后一根已收盘K线应为 (当前时间 - 1 个周期) 所在的K线
+        expected_last = (int(time.time() * 1000) - self.bar_ms) // self.bar_ms * self.bar_ms
+        missing = max(1, (expected_last - window.last_ts) // self.bar_ms)
+        if missing > self.config.max_tail:
+            fresh = self._warm_one(symbol)
+            return symbol, fresh.df if fresh is not None else None
+        return symbol, fetch_latest_candles(symbol, self.bar, limit=int(missing) + 1, session=self._session())
+
+    # ---------------- 检测 ----------------
+
+    def evaluate(self, symbol: str, new_bars: int) -> List[dict]:
+        """只对窗口末尾的 new_bars 根新K线检查信号"""
+        df = self.detector.calculate_indicators(self.windows[symbol].df)
+        df = self.detector.calculate_stateful_signals(df)
+        alerts = []
+        for idx in range(len(df) - new_bars, len(df)):
+            if pd.isna(df['SMA120'].iloc[idx]):
+                continue
+            alerts.extend(alerts_from_check_signal(self.detector, df, idx, symbol, self.bar))
+        return alerts
+
+    def scan_cycle(self) -> dict:
+        """一轮扫描：并发拉取 -> 追加 -> 检测新K线；返回本轮统计"""
+        t_start = time.perf_counter()
+        pending = [s for s in self.symbols if s in self.windows]
+        new_counts: Dict[str, int] = {}
+        fetch_seconds = 0.0
+
+        for attempt in range(2):
+            t0 = time.perf_counter()
+            results = list(self._pool.map(self._fetch_tail, pending))
+            fetch_seconds += time.perf_counter() - t0
+            for symbol, tail in results:
+                if tail is not None and not tail.empty:
+                    added = self.windows[symbol].append(tail)
+                    if added:
+                        new_counts[symbol] = added
+            # 刚收盘的K线可能尚未出现在接口中，稍后重试一次
+            pending = [s for s in pending if s not in new_counts]
+            if not pending or attempt == 1:
+                break
+            time.sleep(self.config.retry_delay)
+
+        t0 = time.perf_counter()
+        alerts = []
+        for symbol, added in new_counts.items():
+            # 重新预热后新增根数可能等于整个窗口，最多补检 max_tail 根
+            alerts.extend(self.evaluate(symbol, min(added, self.config.max_tail)))
+        detect_seconds = time.perf_counter() - t0
+
+        for alert in alerts:
+            print(f"🔔 {alert['symbol']} {alert['type']} @ {pd.to_datetime(alert['ts'], unit='s')} "
+                  f"close={alert['close']}")
+            if self.dispatcher is not None:
+                self.dispatcher.submit(alert)
+
+        total_seconds = time.perf_counter() - t_start
+        SCAN_CYCLE_SECONDS.observe(fetch_seconds, stage='fetch')
+        SCAN_CYCLE_SECONDS.observe(detect_seconds, stage='detect')
+        SCAN_CYCLE_SECONDS.observe(total_seconds, stage='total')
+        return {
+            'symbols': len(self.windows),
+            'updated': len(new_counts),
+            'stale': len(pending),
+            'signals': len(alerts),
+            'fetch_s': fetch_seconds,
+            'detect_s': detect_seconds,
+            'total_s': total_seconds,
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="K线收盘对齐的增量实时扫描")
+    parser.add_argument('--symbols', type=str, default=None, help='交易对列表 (逗号分隔)，默认取成交量前 N')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_N, help=f'成交量前 N 个交易对 (default: {DEFAULT_TOP_N})')
+    parser.add_argument('--bar', type=str, default=DEFAULT_BAR, help=f'K线周期 (default: {DEFAULT_BAR})')
+    parser.add_argument('--window', type=int, default=250, help='常驻窗口长度 (default: 250)')
+    parser.add_argument('--workers', type=int, default=16, help='并发拉取线程数 (default: 16)')
+    parser.add_argument('--settle', type=float, default=2.0, help='收盘后的稳定延迟秒数 (default: 2)')
+    parser.add_argument('--webhook', type=str, action='append', default=[], help='告警 webhook URL (可重复)')
+    parser.add_argument('--alert-feed', type=str, default=None, help='异步追加告警到 JSONL')
+    parser.add_argument('--once', action='store_true', help='预热后只扫描下一根K线收盘')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+
+    if args.symbols:
+        symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    else:
+        symbols = get_top_volume_pairs(args.top)
+    if not symbols:
+        print("❌ 没有可扫描的交易对")
+        return
+
+    sinks = [WebhookSink(url) for url in args.webhook]
+    if args.alert_feed:
+        sinks.append(FileSink(args.alert_feed))
+    dispatcher = AlertDispatcher(sinks, debounce_seconds=5 * bar_to_seconds(args.bar)) if sinks else None
+
+    metrics_writer = start_from_args(args)
+    config = ScannerConfig(window_bars=args.window, workers=args.workers, settle_seconds=args.settle)
+    scanner = LiveScanner(symbols, bar=args.bar, config=config, dispatcher=dispatcher)
+    print(f"🚀 实时扫描启动: {len(symbols)} 个交易对, 周期 {args.bar}, {args.workers} 线程")
+    scanner.warm_up()
+
+    try:
+        while True:
+            wait = next_bar_close(args.bar, settle=config.settle_seconds) - time.time()
+            time.sleep(max(0.0, wait))
+            stats = scanner.scan_cycle()
+            print(f"📊 {time.strftime('%H:%M:%S')} 扫描 {stats['symbols']} 个交易对: "
+                  f"更新 {stats['updated']}, 未更新 {stats['stale']}, 信号 {stats['signals']} | "
+                  f"拉取 {stats['fetch_s']:.2f}s, 检测 {stats['detect_s']:.2f}s, 端到端 {stats['total_s']:.2f}s")
+            if args.once:
+                break
+    except KeyboardInterrupt:
+        print("\n⏹ 已停止")
+    finally:
+        scanner.close()
+        if dispatcher is not None:
+            dispatcher.close()
+            print(f"📮 告警投递: {dispatcher.summary()}")
+        if metrics_writer is not None:
+            metrics_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
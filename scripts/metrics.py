@@ -0,0 +1,304 @@
+"""
+Metrics - 进程内指标（Prometheus 文本格式）
+
+不引入 prometheus_client 依赖，提供最小实现：
+- Counter: 单调递增计数（请求数、错误数、信号数……）
+- Gauge: 当前值（队列深度）
+- Histogram: 固定分桶的耗时分布（请求延迟、渲染/推理耗时、告警投递延迟）
+
+各模块在导入时向全局 REGISTRY 注册指标，记录开销为一次加锁的字典更新。
+暴露方式：
+1. start_http_server(port): 后台线程提供 GET /metrics（Prometheus 抓取）
+2. MetricsFileWriter(path, interval): 后台线程周期性把文本格式写入文件（原子替换）
+3. dump(path): 程序退出时写一次
+
+指标是进程内的：多进程渲染时只统计主进程。
+
+使用：
+    from metrics import REGISTRY, timed, timed_function
+    OKX_LATENCY = REGISTRY.histogram('okx_request_seconds', 'OKX 请求延迟', ['endpoint'])
+    with timed(OKX_LATENCY, endpoint='candles'):
+        ...
+    @timed_function(RENDER_SECONDS)
+    def generate_chart(...): ...
+    python scripts/metrics.py   # 演示：打印文本格式
+"""
+
+import os
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# =================配置=================
+# 秒级耗时分桶：覆盖 1ms (检测/渲染) 到 60s (告警重试)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_FILE = "data/metrics.prom"
+# =====================================
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: 标签应为 {self.labelnames}，实际 {tuple(labels)}")
+        return tuple(str(labels[k]) for k in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                                 for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各分桶计数..., 总数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return int(state[-2]) if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self._header()
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            # +Inf 桶等于总数（包括超过最大分桶的观测）
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {int(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(state[-2])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """指标注册表；同名重复注册返回已有指标（模块可被多次导入）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已以不同类型/标签注册")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """记录 with 块的耗时（秒）"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - t0, **labels)
+
+
+def timed_function(histogram: Histogram, **labels):
+    """装饰器：记录每次调用的耗时（秒）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - t0, **labels)
+        return wrapper
+    return decorator
+
+
+def dump(path: str = METRICS_FILE, registry: Registry = REGISTRY):
+    """写出当前指标（先写临时文件再替换，读者不会看到半个文件）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+class MetricsFileWriter:
+    """后台线程每 interval 秒 dump 一次，stop() 时再写最后一次"""
+
+    def __init__(self, path: str = METRICS_FILE, interval: float = 15.0, registry: Registry = REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            dump(self.path, self.registry)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        dump(self.path, self.registry)
+
+
+def start_http_server(port: int, host: str = '0.0.0.0', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """后台线程提供 GET /metrics"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def add_metrics_args(parser):
+    """为 CLI 添加 --metrics-port / --metrics-file"""
+    parser.add_argument('--metrics-port', type=int, default=None, help='在该端口提供 Prometheus /metrics')
+    parser.add_argument('--metrics-file', type=str, nargs='?', const=METRICS_FILE, default=None,
+                        help=f'周期性写出指标文件 (default: {METRICS_FILE})')
+
+
+def start_from_args(args, interval: float = 15.0) -> Optional[MetricsFileWriter]:
+    """按 add_metrics_args 的参数启动暴露方式，返回文件写入器（退出时调用 stop）"""
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        print(f"📈 指标: http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.metrics_file:
+        print(f"📈 指标文件: {args.metrics_file} (每 {interval:.0f}s)")
+        return MetricsFileWriter(args.metrics_file, interval)
+    return None
+
+
+if __name__ == "__main__":
+    import random
+
+    requests_total = REGISTRY.counter('demo_requests_total', '演示请求数', ['endpoint', 'status'])
+    latency = REGISTRY.histogram('demo_request_seconds', '演示请求延迟', ['endpoint'])
+    depth = REGISTRY.gauge('demo_queue_depth', '演示队列深度')
+    for _ in range(1000):
+        endpoint = random.choice(['candles', 'history-candles'])
+        requests_total.inc(endpoint=endpoint, status=random.choice(['ok', 'ok', 'ok', 'error']))
+        latency.observe(random.expovariate(1 / 0.08), endpoint=endpoint)
+    depth.set(7)
+    print(REGISTRY.render())
@@ -0,0 +1,180 @@
+"""
+MTF Confluence - 多周期共振过滤
+
+5m 信号只在 15m、1H 的均线排列同向时才接受。不再分别拉取各周期数据手工对齐，而是在一次处理中：
+1. 从基础周期K线重采样出各高周期K线（OKX 对齐规则：6H/12H/1D/1W 等按香港时间，*utc 周期按 UTC）
+2. 在高周期K线上计算指标与状态信号（与基础周期相同的 PineSignalDetector）
+3. 前向对齐：每根基础K线只使用收盘时间不晚于其收盘时间的最后一根高周期K线，没有未来数据；
+   尚未收盘的高周期K线（数据末尾不完整的一段）永远不会被使用
+4. 组合条件全部向量化：LONG 需要各高周期 is_bullish_alignment，SHORT 需要 is_bearish_alignment
+   （min_agree 可放宽为至少 N 个周期同向）
+
+使用：
+    python scripts/sliding_window_signal.py --symbol ETH-USDT-SWAP --bar 5m --confluence 15m,1H
+    python scripts/mtf_confluence.py     # 模拟数据演示 + 无未来函数自检
+"""
+
+import os
+import sys
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from okx_utils import bar_to_seconds
+
+# =================配置=================
+HK_OFFSET_MS = -8 * 3600 * 1000                 # 香港时间 00:00 = UTC 16:00
+WEEK_OFFSET_MS = 4 * 86400 * 1000 + HK_OFFSET_MS  # 周线从周一 (香港时间) 开始，1970-01-01 为周四
+HK_ALIGNED_UNITS = ('D', 'W')
+HK_ALIGNED_HOURS = (6, 12)
+# =====================================
+
+
+@dataclass
+class ConfluenceConfig:
+    """多周期共振参数"""
+    timeframes: Tuple[str, ...] = ('15m', '1H')
+    long_state: str = 'is_bullish_alignment'   # 高周期上确认 LONG 的状态列
+    short_state: str = 'is_bearish_alignment'  # 高周期上确认 SHORT 的状态列
+    min_agree: Optional[int] = None            # 至少几个周期同向 (None 表示全部)
+
+
+def bucket_offset_ms(bar: str) -> int:
+    """OKX K线的分桶起点偏移：6H/12H/日/周线默认按香港时间对齐，带 utc 后缀的按 UTC"""
+    if bar.endswith('utc'):
+        return 0
+    unit, count = bar[-1], int(bar[:-1])
+    if unit == 'W':
+        return WEEK_OFFSET_MS
+    if unit == 'D' or (unit == 'H' and count in HK_ALIGNED_HOURS):
+        return HK_OFFSET_MS
+    return 0
+
+
+def resample_candles(df: pd.DataFrame, bar: str) -> pd.DataFrame:
+    """
+    把按时间升序的基础周期K线聚合为 bar 周期（open 取首根，high/low 取极值，close 取末根，成交量求和）
+
+    返回的 timestamp 为高周期K线的开盘时间；缺失的基础K线不补齐。
+    """
+    if bar.replace('utc', '')[-1] == 'M':
+        raise ValueError(f"不支持按月重采样: {bar}")
+    tf_ms = bar_to_seconds(bar) * 1000
+    offset = bucket_offset_ms(bar)
+    ts = df['timestamp'].to_numpy(dtype=np.int64)
+    bucket = (ts - offset) // tf_ms * tf_ms + offset
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+
+    out = pd.DataFrame({
+        'timestamp': bucket[starts],
+        'open': df['open'].to_numpy(dtype=float)[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype=float), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype=float), starts),
+        'close': df['close'].to_numpy(dtype=float)[ends],
+    })
+    if 'vol' in df.columns:
+        out['vol'] = np.add.reduceat(df['vol'].to_numpy(dtype=float), starts)
+    out['datetime'] = pd.to_datetime(out['timestamp'], unit='ms')
+    return out
+
+
+def align_states(base_ts: np.ndarray, base_bar: str, higher: pd.DataFrame, higher_bar: str,
+                 columns: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+    """
+    把高周期状态前向对齐到基础K线（无未来数据）
+
+    基础K线 i 收盘于 base_ts[i] + 基础周期；高周期K线 h 收盘于 higher_ts[h] + 高周期。
+    基础K线只能看到 收盘时间 <= 自身收盘时间 的最后一根高周期K线；没有可用K线时为 False。
+    """
+    base_close = base_ts + bar_to_seconds(base_bar) * 1000
+    higher_close = higher['timestamp'].to_numpy(dtype=np.int64) + bar_to_seconds(higher_bar) * 1000
+    idx = np.searchsorted(higher_close, base_close, side='right') - 1
+    available = idx >= 0
+    aligned = {}
+    for col in columns:
+        values = higher[col].to_numpy(dtype=bool)
+        aligned[col] = np.where(available, values[np.maximum(idx, 0)], False)
+    return aligned
+
+
+class ConfluenceFilter:
+    """多周期共振：一次处理得到各高周期的对齐状态与组合掩码"""
+
+    def __init__(self, detector, base_bar: str, config: ConfluenceConfig = None):
+        self.detector = detector
+        self.base_bar = base_bar
+        self.config = config or ConfluenceConfig()
+        base_s = bar_to_seconds(base_bar)
+        for tf in self.config.timeframes:
+            tf_s = bar_to_seconds(tf)
+            if tf_s <= base_s or tf_s % base_s:
+                raise ValueError(f"高周期 {tf} 必须是基础周期 {base_bar} 的整数倍")
+
+    def states(self, df: pd.DataFrame) -> pd.DataFrame:
+        """各高周期对齐到基础K线的状态，列名为 '<状态>@<周期>'"""
+        cfg = self.config
+        ts = df['timestamp'].to_numpy(dtype=np.int64)
+        columns = tuple(dict.fromkeys((cfg.long_state, cfg.short_state)))
+        out = {}
+        for tf in cfg.timeframes:
+            higher = resample_candles(df, tf)
+            higher = self.detector.calculate_stateful_signals(self.detector.calculate_indicators(higher))
+            for col, values in align_states(ts, self.base_bar, higher, tf, columns).items():
+                out[f"{col}@{tf}"] = values
+        return pd.DataFrame(out, index=df.index)
+
+    def masks(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """(long_ok, short_ok)：各高周期同向的基础K线"""
+        cfg = self.config
+        states = self.states(df)
+        need = cfg.min_agree or len(cfg.timeframes)
+        long_votes = np.sum([states[f"{cfg.long_state}@{tf}"].to_numpy() for tf in cfg.timeframes], axis=0)
+        short_votes = np.sum([states[f"{cfg.short_state}@{tf}"].to_numpy() for tf in cfg.timeframes], axis=0)
+        return long_votes >= need, short_votes >= need
+
+    def apply(self, df: pd.DataFrame, long_mask: np.ndarray, short_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """过滤基础周期信号掩码（df 为基础周期K线）"""
+        long_ok, short_ok = self.masks(df)
+        return long_mask & long_ok, short_mask & short_ok
+
+
+def parse_timeframes(text: str) -> Tuple[str, ...]:
+    return tuple(tf.strip() for tf in text.split(',') if tf.strip())
+
+
+if __name__ == "__main__":
+    from pine_signal_detector import PineSignalDetector, SignalConfig
+
+    np.random.seed(42)
+    n = 20000
+    close = 100 + np.cumsum(np.random.randn(n) * 0.3)
+    df = pd.DataFrame({
+        'timestamp': 1_700_000_000_000 + np.arange(n) * 300_000,  # 5m
+        'open': close + np.random.randn(n) * 0.05,
+        'high': close + np.abs(np.random.randn(n) * 0.2),
+        'low': close - np.abs(np.random.randn(n) * 0.2),
+        'close': close,
+    })
+    detector = PineSignalDetector(SignalConfig(use_strict_filter=False, min_ma_confirm=3, osc_threshold=30,
+                                               power_ratio=40, use_alignment_filter=False))
+    base = detector.calculate_stateful_signals(detector.calculate_indicators(df))
+    long_mask, short_mask = detector.check_signals_vectorized(base)
+
+    confluence = ConfluenceFilter(detector, '5m', ConfluenceConfig(timeframes=('15m', '1H')))
+    long_ok, short_ok = confluence.apply(df, long_mask, short_mask)
+    print("MTF Confluence - 5m 信号 + 15m/1H 均线排列共振")
+    print(f"   LONG:  {int(long_mask.sum())} -> {int(long_ok.sum())}")
+    print(f"   SHORT: {int(short_mask.sum())} -> {int(short_ok.sum())}")
+
+    # 无未来函数自检：截断到第 i 根K线后重算，对齐状态应与全量一致
+    full = confluence.states(df)
+    bad = 0
+    for i in np.random.randint(2000, n, 50):
+        truncated = confluence.states(df.iloc[:i + 1])
+        bad += int((truncated.iloc[-1] != full.iloc[i]).any())
+    print(f"   截断重算自检: {50 - bad}/50 一致")
@@ -4,30 +4,54 @@ OKX API 工具模块
 1. 获取所有 USDT 永续合约交易对列表
 2. 获取成交量前 N 的热门交易对
 3. 获取指定交易对的历史 K 线数据 (支持自动翻页分页)
+4. 获取指定交易对最新的已收盘 K 线 (实时扫描增量拉取)
 
 依赖：
 - requests
 - pandas
 """
 
-import requests
 import pandas as pd
 import time
 from datetime import datetime
 
+from metrics import REGISTRY
+
 # OKX API 基础 URL
 BASE_URL = "https://www.okx.com"
 
+OKX_REQUEST_SECONDS = REGISTRY.histogram('okx_request_seconds', 'OKX REST 请求延迟 (秒)', ['endpoint'])
+OKX_REQUEST_ERRORS = REGISTRY.counter('okx_request_errors_total', 'OKX 请求错误数 (api: 返回码非 0, exception: 网络/解析异常)', ['endpoint', 'kind'])
+OKX_BARS_FETCHED = REGISTRY.counter('okx_bars_fetched_total', '拉取到的 K 线根数', ['bar'])
+
+def _get_json(endpoint, params, session=None, timeout=None):
+    """
+    GET {BASE_URL}/api/v5/{endpoint}，记录延迟与错误数
+    返回码非 0 计为 api 错误（由调用方处理），网络/解析异常计数后继续抛出
+    """
+    import requests  # 约 0.1s，只在真正请求时加载（--csv 等离线路径不需要）
+
+    t0 = time.perf_counter()
+    try:
+        response = (session or requests).get(f"{BASE_URL}/api/v5/{endpoint}", params=params, timeout=timeout)
+        data = response.json()
+    except Exception:
+        OKX_REQUEST_ERRORS.inc(endpoint=endpoint, kind='exception')
+        raise
+    finally:
+        OKX_REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint)
+    if data.get('code') != '0':
+        OKX_REQUEST_ERRORS.inc(endpoint=endpoint, kind='api')
+    return data
+
 def get_usdt_pairs():
     """
     获取 OKX 所有 USDT 结算的永续合约交易对 (SWAP)
     """
-    url = f"{BASE_URL}/api/v5/public/instruments"
     params = {"instType": "SWAP"}
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = _get_json("public/instruments", params)
         
         if data['code'] != '0':
             print(f"❌ 获取交易对失败: {data['msg']}")
@@ -54,12 +78,10 @@ def get_top_volume_pairs(limit=50):
     Returns:
         list: 按成交量从高到低排序的 instId 列表
     """
-    url = f"{BASE_URL}/api/v5/market/tickers"
     params = {"instType": "SWAP"}
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = _get_json("market/tickers", params)
         
         if data['code'] != '0':
             print(f"❌ 获取行情失败: {data['msg']}")
@@ -92,6 +114,15 @@ def get_top_volume_pairs(limit=50):
         print(f"❌ 获取热门币种异常: {e}")
         return []
 
+_BAR_UNITS = {'s': 1, 'm': 60, 'H': 3600, 'D': 86400, 'W': 604800, 'M': 2592000}
+
+def bar_to_seconds(bar):
+    """
+    OKX K线周期字符串转秒数 ('5m' -> 300, '1H' -> 3600, '1Dutc' -> 86400)
+    """
+    bar = bar.replace('utc', '')
+    return int(bar[:-1]) * _BAR_UNITS[bar[-1]]
+
 def fetch_candles(instId, bar='1D', limit=100):
     """
     获取指定交易对的历史 K 线数据
@@ -104,8 +135,6 @@ def fetch_candles(instId, bar='1D', limit=100):
     remaining = limit
     
     while remaining > 0:
-        url = f"{BASE_URL}/api/v5/market/history-candles"
-        
         params = {
             "instId": instId,
             "bar": bar,
@@ -116,8 +145,7 @@ def fetch_candles(instId, bar='1D', limit=100):
             params["after"] = after
         
         try:
-            response = requests.get(url, params=params)
-            data = response.json()
+            data = _get_json("market/history-candles", params)
             
             if data['code'] != '0':
                 # 如果 history-candles 失败(例如太新或某些限制), 尝试普通 candles 接口
@@ -141,8 +169,15 @@ def fetch_candles(instId, bar='1D', limit=100):
     if not all_data:
         return None
     
+    OKX_BARS_FETCHED.inc(len(all_data), bar=bar)
+    return _candles_to_df(all_data)
+
+def _candles_to_df(rows):
+    """
+    OKX K线原始数组 -> 按时间升序的 DataFrame
+    """
     cols = ['timestamp', 'open', 'high', 'low', 'close', 'vol', 'volCcy', 'volCcyQuote', 'confirm']
-    df = pd.DataFrame(all_data, columns=cols)
+    df = pd.DataFrame(rows, columns=cols)
     
     df['timestamp'] = pd.to_numeric(df['timestamp'])
     df['open'] = pd.to_numeric(df['open'])
@@ -156,6 +191,83 @@ def fetch_candles(instId, bar='1D', limit=100):
     
     return df
 
+def fetch_latest_candles(instId, bar='5m', limit=3, session=None):
+    """
+    获取最新的 limit 根已收盘 K 线 (market/candles 接口，单次请求，不翻页)
+    
+    Args:
+        instId (str): 交易对
+        bar (str): K线周期
+        limit (int): 需要的已收盘 K 线数量 (最多 299，接口单次上限 300 含未收盘的一根)
+        session (requests.Session): 可选，复用连接以降低并发拉取的延迟
+        
+    Returns:
+        DataFrame 或 None: 按时间升序，只包含 confirm == '1' 的 K 线
+    """
+    # 最新一根通常未收盘，多取一根
+    params = {"instId": instId, "bar": bar, "limit": min(limit + 1, 300)}
+    
+    try:
+        data = _get_json("market/candles", params, session=session, timeout=10)
+        
+        if data['code'] != '0':
+            print(f"⚠️ API 警告 ({instId}): {data['msg']}")
+            return None
+        
+        rows = [r for r in data['data'] if str(r[8]) == '1']
+        if not rows:
+            return None
+        OKX_BARS_FETCHED.inc(min(len(rows), limit), bar=bar)
+        return _candles_to_df(rows).iloc[-limit:].reset_index(drop=True)
+        
+    except Exception as e:
+        print(f"❌ 获取最新 K 线异常 ({instId}): {e}")
+        return None
+
+def iter_candles(instId, bar='5m', start=None, end=None, per_request=100):
+    """
+    从 start 开始按时间正序分页获取历史 K 线，逐页产出（不在内存中累积全部历史）
+
+    每页用 before/after 限定 (before, after) 区间，恰好覆盖 per_request 根 K 线。
+
+    Args:
+        instId (str): 交易对
+        bar (str): K线周期
+        start (int): 起始毫秒时间戳 (含)
+        end (int): 结束毫秒时间戳 (不含)，默认当前时间
+        per_request (int): 每页根数 (history-candles 上限 100)
+
+    Yields:
+        DataFrame: 按时间升序的一页 K 线
+
+    Raises:
+        RuntimeError: 请求异常或接口返回错误码（中途失败不会被当作数据结束）
+    """
+    bar_ms = bar_to_seconds(bar) * 1000
+    end = end or int(time.time() * 1000)
+    before = start - 1
+
+    while before < end - 1:
+        after = min(before + (per_request + 1) * bar_ms, end)
+        params = {"instId": instId, "bar": bar, "limit": per_request, "before": before, "after": after}
+        try:
+            data = _get_json("market/history-candles", params)
+        except Exception as e:
+            raise RuntimeError(f"获取 K 线异常 ({instId}): {e}") from e
+
+        if data['code'] != '0':
+            raise RuntimeError(f"获取 K 线失败 ({instId}): {data['msg']}")
+
+        if data['data']:
+            df = _candles_to_df(data['data'])
+            OKX_BARS_FETCHED.inc(len(df), bar=bar)
+            before = int(df['timestamp'].iloc[-1])
+            yield df
+        else:
+            # 区间内没有 K 线（上线之前），直接跳到下一段
+            before = after - 1
+        time.sleep(0.1)
+
 if __name__ == "__main__":
     print("正在获取成交量前 10 的币种...")
     top10 = get_top_volume_pairs(10)
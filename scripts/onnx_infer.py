@@ -0,0 +1,192 @@
+"""
+ONNX Runtime 推理后端
+
+在纯 CPU 的告警机器上替代 ultralytics/torch 推理：
+1. 启动只需加载 onnxruntime 会话，不导入 torch
+2. 预处理（letterbox）、解码、NMS 全部用 NumPy 实现
+3. 输出格式与 infer.py 的 torch 后端一致：每张图一个检测列表，
+   每个检测为 {'cls': int, 'name': str, 'conf': float, 'xyxy': [x1, y1, x2, y2]}（原图像素坐标）
+
+模型由 export_onnx.py 导出（YOLOv8/11 检测头输出形状为 (batch, 4 + nc, N)）。
+"""
+
+import ast
+from typing import Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+# 默认类别 (必须与 prepare_yolo_data.py 一致)，模型元数据中有 names 时以元数据为准
+DEFAULT_NAMES = {0: 'LONG', 1: 'SHORT'}
+
+ImageInput = Union[str, np.ndarray]
+
+
+def letterbox(img: np.ndarray, new_shape: int, color=(114, 114, 114)):
+    """等比缩放并填充到 new_shape x new_shape，返回 (图像, 缩放比例, (左填充, 上填充))"""
+    h, w = img.shape[:2]
+    r = min(new_shape / h, new_shape / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    pad_w, pad_h = (new_shape - new_w) / 2, (new_shape - new_h) / 2
+
+    if (w, h) != (new_w, new_h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, r, (left, top)
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """一个 xyxy 框与多个 xyxy 框的 IoU"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (box[2] - box[0]) * (box[3] - box[1])
+    area_b = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (area_a + area_b - inter + 1e-9)
+
+
+def nms_numpy(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray,
+              iou_threshold: float = 0.7, max_det: int = 300) -> np.ndarray:
+    """
+    按类别的贪心 NMS（与 ultralytics 一样，用类别偏移把不同类别的框错开）
+
+    Returns:
+        保留框的索引（按置信度降序）
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    offset = classes[:, None].astype(np.float32) * 7680.0
+    shifted = boxes + offset
+
+    order = np.argsort(-scores)
+    keep = []
+    while order.size > 0 and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = box_iou(shifted[i], shifted[order[1:]])
+        order = order[1:][ious <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class OnnxDetector:
+    """基于 onnxruntime 的 YOLO 检测器（CPU）"""
+
+    def __init__(
+        self,
+        model_path: str,
+        conf: float = 0.25,
+        iou: float = 0.7,
+        imgsz: Optional[int] = None,
+        intra_op_threads: int = 0,
+    ):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opts.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, sess_options=opts,
+                                            providers=['CPUExecutionProvider'])
+        self.model_path = model_path
+        self.conf = conf
+        self.iou = iou
+
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # 固定输入尺寸的模型以模型为准；动态输入时使用 imgsz (默认 640)
+        fixed = inp.shape[2] if isinstance(inp.shape[2], int) else None
+        self.imgsz = fixed or imgsz or 640
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = DEFAULT_NAMES
+        if 'names' in meta:
+            try:
+                self.names = {int(k): v for k, v in ast.literal_eval(meta['names']).items()}
+            except (ValueError, SyntaxError):
+                pass
+
+    @staticmethod
+    def _load(image: ImageInput) -> np.ndarray:
+        if isinstance(image, np.ndarray):
+            return image
+        img = cv2.imread(image, cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"无法读取图像: {image}")
+        return img
+
+    def preprocess(self, img: np.ndarray):
+        """BGR 图像 -> (1, 3, imgsz, imgsz) float32 张量，以及还原坐标所需参数"""
+        boxed, ratio, pad = letterbox(img, self.imgsz)
+        tensor = boxed[:, :, ::-1].transpose(2, 0, 1)  # BGR -> RGB, HWC -> CHW
+        tensor = np.ascontiguousarray(tensor, dtype=np.float32) / 255.0
+        return tensor[None], ratio, pad
+
+    def postprocess(self, output: np.ndarray, ratio: float, pad, orig_shape) -> List[dict]:
+        """单张图的原始输出 (4 + nc, N) -> 检测列表"""
+        pred = output.T  # (N, 4 + nc)
+        cls_scores = pred[:, 4:]
+        classes = cls_scores.argmax(axis=1)
+        scores = cls_scores[np.arange(len(pred)), classes]
+
+        mask = scores >= self.conf
+        if not mask.any():
+            return []
+        xywh, scores, classes = pred[mask, :4], scores[mask], classes[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        keep = nms_numpy(boxes, scores, classes, self.iou)
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+        # 去掉 letterbox 填充并还原到原图尺寸
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+        h, w = orig_shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+
+        return [
+            {'cls': int(c), 'name': self.names.get(int(c), str(c)),
+             'conf': float(s), 'xyxy': [float(v) for v in b]}
+            for b, s, c in zip(boxes, scores, classes)
+        ]
+
+    def predict(self, images: Sequence[ImageInput]) -> List[List[dict]]:
+        """对一批图像（路径或 BGR 数组）推理"""
+        imgs = [self._load(im) for im in images]
+        prepped = [self.preprocess(img) for img in imgs]
+
+        if self.dynamic_batch and len(prepped) > 1:
+            batch = np.concatenate([p[0] for p in prepped])
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            outputs = np.concatenate(
+                [self.session.run(None, {self.input_name: p[0]})[0] for p in prepped])
+
+        return [
+            self.postprocess(out, ratio, pad, img.shape)
+            for out, (_, ratio, pad), img in zip(outputs, prepped, imgs)
+        ]
+
+    def predict_one(self, image: ImageInput) -> List[dict]:
+        return self.predict([image])[0]
+
+
+if __name__ == "__main__":
+    # 简单测试：NMS
+    print("ONNX Infer - NMS Test")
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30], [0, 0, 10, 10]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+    classes = np.array([0, 0, 0, 1])
+    print(f"Keep: {nms_numpy(boxes, scores, classes, 0.5).tolist()}")  # 期望 [0, 2, 3]
@@ -18,6 +18,11 @@ import pandas as pd
 from dataclasses import dataclass
 from typing import Tuple, Optional
 
+from metrics import REGISTRY, timed_function
+
+DETECTOR_SECONDS = REGISTRY.histogram('detector_seconds', '检测器单次调用耗时 (每次调用处理一个交易对的数据)', ['stage'])
+SIGNALS_TOTAL = REGISTRY.counter('signals_total', '检测到的信号数', ['type'])
+
 
 @dataclass
 class SignalConfig:
@@ -57,6 +62,7 @@ class PineSignalDetector:
     def __init__(self, config: SignalConfig = None):
         self.config = config or SignalConfig()
         
+    @timed_function(DETECTOR_SECONDS, stage='indicators')
     def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         计算所有技术指标
@@ -132,6 +138,7 @@ class PineSignalDetector:
         
         return df
     
+    @timed_function(DETECTOR_SECONDS, stage='stateful')
     def calculate_stateful_signals(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         计算需要状态跟踪的信号（方案A和方案D）
@@ -306,8 +313,82 @@ class PineSignalDetector:
         final_long = filtered_cross_up and osc_up_ok and alignment_long and power_long
         final_short = filtered_cross_dn and osc_dn_ok and alignment_short and power_short
         
+        if final_long:
+            SIGNALS_TOTAL.inc(type='LONG')
+        if final_short:
+            SIGNALS_TOTAL.inc(type='SHORT')
+        
         return final_long, final_short
     
+    @timed_function(DETECTOR_SECONDS, stage='vectorized')
+    def check_signals_vectorized(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        对所有K线一次性计算最终信号（与逐行调用 check_signal 结果完全一致）
+        
+        Args:
+            df: 已计算指标（及状态信号）的 DataFrame
+            
+        Returns:
+            (long_mask, short_mask) 两个 bool 数组
+        """
+        cfg = self.config
+        n = len(df)
+        
+        def col(name):
+            return df[name].to_numpy(dtype=bool) if name in df.columns else np.zeros(n, dtype=bool)
+        
+        open_ = df['open'].to_numpy(dtype=float)
+        high = df['high'].to_numpy(dtype=float)
+        low = df['low'].to_numpy(dtype=float)
+        close = df['close'].to_numpy(dtype=float)
+        
+        # ========== 基础过滤（A+B+D方案组合）==========
+        cross_up = col('cross_up_1') | col('adhesion_breakout_up')
+        cross_dn = col('cross_dn_1') | col('adhesion_breakout_down')
+        breakout_up = col('breakout_above_range') | col('cross_up_1')
+        breakout_dn = col('breakout_below_range') | col('cross_dn_1')
+        
+        # 六均线过滤（与 NaN 比较恒为 False，与 _is_candle_above/below 一致）
+        above_count = np.zeros(n, dtype=int)
+        below_count = np.zeros(n, dtype=int)
+        for ma_col in ('SMA20', 'SMA60', 'SMA120', 'EMA20', 'EMA60', 'EMA120'):
+            ma = df[ma_col].to_numpy(dtype=float)
+            above_count += (open_ > ma) & (close > ma)
+            below_count += (open_ < ma) & (close < ma)
+        
+        min_count = 6 if cfg.use_strict_filter else cfg.min_ma_confirm
+        long_mask = cross_up & (above_count >= min_count) & breakout_up
+        short_mask = cross_dn & (below_count >= min_count) & breakout_dn
+        
+        # ========== 动能过滤：[idx - osc_confirm_bars, idx] 窗口内任一满足 ==========
+        if cfg.use_osc_filter:
+            osc = df['osc'].to_numpy(dtype=float)
+            long_mask &= self._window_any(osc >= cfg.osc_threshold, cfg.osc_confirm_bars)
+            short_mask &= self._window_any(osc <= -cfg.osc_threshold, cfg.osc_confirm_bars)
+        
+        # ========== 均线排列过滤 ==========
+        if cfg.use_alignment_filter:
+            long_mask &= col('is_bullish_alignment')
+            short_mask &= col('is_bearish_alignment')
+        
+        # ========== K线力度过滤 ==========
+        if cfg.use_candle_power:
+            candle_range = high - low
+            has_range = candle_range > 0
+            safe_range = np.where(has_range, candle_range, 1.0)
+            long_mask &= has_range & ((close - low) / safe_range * 100 >= cfg.power_ratio)
+            short_mask &= has_range & ((high - close) / safe_range * 100 >= cfg.power_ratio)
+        
+        # 掩码覆盖整段历史，信号计数由调用方对新信号记录 (SIGNALS_TOTAL)
+        return long_mask, short_mask
+    
+    @staticmethod
+    def _window_any(mask: np.ndarray, lookback: int) -> np.ndarray:
+        """out[i] = mask[max(0, i - lookback): i + 1].any()"""
+        counts = np.concatenate(([0], np.cumsum(mask)))
+        idx = np.arange(len(mask))
+        return counts[idx + 1] - counts[np.maximum(idx - lookback, 0)] > 0
+    
     def _crossover(self, series_a: pd.Series, series_b: pd.Series) -> pd.Series:
         """Pine Script ta.crossover: a > b AND a[1] <= b[1]"""
         return (series_a > series_b) & (series_a.shift(1) <= series_b.shift(1))
@@ -0,0 +1,528 @@
+"""
+Pipeline - 统一入口：按 DAG 运行 拉取 → 指标 → 信号 → 渲染 → 划分 → 训练 → 推理
+
+原来的流程是几个独立脚本串起来 (sliding_window_signal → prepare_yolo_data → train_yolo → infer)，
+路径写死在各脚本里，每次都从头算。这里把各阶段建成一个 DAG：
+
+    fetch:SYM → indicators:SYM → signals:SYM → render:SYM ─┐
+    fetch:SYM2 → ...                                       ├→ split → train → infer
+                                                           ┘
+- 每个节点的输出目录以 key 命名：key = 哈希(阶段, 阶段版本, 参数, 上游输出的内容摘要)
+  目录写完后最后写入 _stage.json (key + 本节点输出的内容摘要)，有它才算完成，中断的输出下次重跑
+- key 对应的输出已存在时直接跳过；上游重跑但输出内容不变时，下游摘要不变，同样跳过
+- 依赖都已完成的节点立即提交到进程池，不同交易对的拉取/指标/渲染并行执行 (--jobs)
+- fetch 的参数包含截止时间 (默认为最后一根已收盘K线的收盘时间)，同一根K线内重复运行命中缓存；
+  --csv 离线数据以文件内容摘要作为参数
+- 每个节点的输出打印到其目录下的 stage.log，终端只显示节点状态
+
+输出位于 data/pipeline/<阶段>/[<交易对>-]<key>/，不会覆盖 data/pine_signals、data/yolo_dataset 等原脚本的目录。
+
+使用：
+    python scripts/pipeline.py --symbols BTC-USDT-SWAP,ETH-USDT-SWAP --until render
+    python scripts/pipeline.py --symbol ETH-USDT-SWAP --csv data/eth_5m.csv --until split
+    python scripts/pipeline.py --symbols BTC-USDT-SWAP,ETH-USDT-SWAP --epochs 50    # 一直到推理
+    python scripts/pipeline.py --plan                        # 只列出节点与缓存状态
+    python scripts/pipeline.py --force render                # 忽略指定阶段的缓存
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import contextlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from okx_utils import bar_to_seconds
+from mtf_confluence import bucket_offset_ms
+from sample_index import to_ms
+from pine_signal_detector import SignalConfig
+from chart_generator import CHART_VARIANTS
+from sliding_window_signal import DEFAULT_SYMBOL, DEFAULT_BAR, DEFAULT_LIMIT, DEFAULT_STRIDE
+from prepare_yolo_data import TRAIN_RATIO
+from train_yolo import EPOCHS, BATCH
+from infer import CONF_THRESHOLD
+
+# =================配置=================
+PIPELINE_DIR = "data/pipeline"
+MARKER_FILE = "_stage.json"  # 节点完成标记（最后写入）
+LOG_FILE = "stage.log"       # 节点的标准输出 / 错误输出
+STAGE_ORDER = ('fetch', 'indicators', 'signals', 'render', 'split', 'train', 'infer')
+# 阶段实现变化时加一，使该阶段（及内容随之变化的下游）的旧缓存失效
+STAGE_VERSIONS = {'fetch': 2, 'indicators': 1, 'signals': 1, 'render': 1, 'split': 1, 'train': 1, 'infer': 1}
+CANDLE_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'vol')
+# =====================================
+
+
+@dataclass
+class PipelineConfig:
+    """流水线参数（除 device 外都计入各阶段的 key）"""
+    symbols: Tuple[str, ...] = (DEFAULT_SYMBOL,)
+    bar: str = DEFAULT_BAR
+    limit: int = DEFAULT_LIMIT
+    asof: Optional[int] = None       # 拉取截止 (毫秒，含该时刻收盘的K线)；默认最后一根已收盘K线
+    csv: Optional[str] = None        # 单交易对的离线K线 CSV，代替 OKX 拉取
+    signal_config: SignalConfig = field(default_factory=SignalConfig)
+    variant: str = 'full'
+    window: Optional[int] = None     # 默认取变体的窗口大小
+    stride: int = DEFAULT_STRIDE
+    seed: int = 0
+    train_ratio: float = TRAIN_RATIO
+    epochs: int = EPOCHS
+    batch: int = BATCH
+    imgsz: Optional[int] = None      # 默认取变体的图像尺寸
+    conf: float = CONF_THRESHOLD
+    device: str = 'auto'
+    until: str = 'infer'             # 运行到哪个阶段为止
+
+
+@dataclass
+class Node:
+    """DAG 节点：params 计入 key，options 不计入（如训练设备）"""
+    name: str
+    stage: str
+    params: dict
+    deps: Tuple[str, ...] = ()
+    options: dict = field(default_factory=dict)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dir_digest(path: str) -> str:
+    """目录内容摘要：按相对路径排序，对路径与文件内容求哈希（不含完成标记与日志）"""
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if root == path and name in (MARKER_FILE, LOG_FILE):
+                continue
+            full = os.path.join(root, name)
+            h.update(os.path.relpath(full, path).encode('utf-8'))
+            h.update(file_digest(full).encode('ascii'))
+    return h.hexdigest()
+
+
+def node_key(node: Node, dep_digests: Dict[str, str]) -> str:
+    payload = {
+        'stage': node.stage,
+        'version': STAGE_VERSIONS[node.stage],
+        'params': node.params,
+        'inputs': sorted(dep_digests.items()),
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def last_closed_ms(bar: str, now: Optional[float] = None) -> int:
+    """最后一根已收盘K线的收盘时间 (毫秒，按 OKX 分桶对齐)"""
+    now_ms = int((time.time() if now is None else now) * 1000)
+    bar_ms = bar_to_seconds(bar) * 1000
+    offset = bucket_offset_ms(bar)
+    return (now_ms - offset) // bar_ms * bar_ms + offset
+
+
+def build_nodes(config: PipelineConfig) -> List[Node]:
+    """按配置生成 DAG 节点（按拓扑顺序），止于 config.until"""
+    if config.until not in STAGE_ORDER:
+        raise ValueError(f"未知阶段: {config.until}")
+    if config.csv and len(config.symbols) != 1:
+        raise ValueError("--csv 只能用于单个交易对")
+    stages = STAGE_ORDER[:STAGE_ORDER.index(config.until) + 1]
+    variant = CHART_VARIANTS[config.variant]
+    window = config.window or variant.window_size
+    signal_params = asdict(config.signal_config)
+
+    if config.csv:
+        fetch_params = {'bar': config.bar, 'csv_digest': file_digest(config.csv)}
+    else:
+        fetch_params = {'bar': config.bar, 'limit': config.limit,
+                        'asof': config.asof or last_closed_ms(config.bar)}
+
+    nodes = []
+    for symbol in config.symbols:
+        per_symbol = [
+            Node(f"fetch:{symbol}", 'fetch', dict(fetch_params, symbol=symbol),
+                 options={'csv': config.csv} if config.csv else {}),
+            Node(f"indicators:{symbol}", 'indicators', {'signal_config': signal_params},
+                 deps=(f"fetch:{symbol}",)),
+            Node(f"signals:{symbol}", 'signals', {'signal_config': signal_params, 'window': window,
+                                                  'stride': config.stride},
+                 deps=(f"indicators:{symbol}",)),
+            Node(f"render:{symbol}", 'render', {'symbol': symbol, 'bar': config.bar, 'window': window,
+                                                'chart_config': asdict(variant.chart_config())},
+                 deps=(f"indicators:{symbol}", f"signals:{symbol}")),
+        ]
+        nodes.extend(n for n in per_symbol if n.stage in stages)
+
+    renders = tuple(f"render:{symbol}" for symbol in config.symbols)
+    imgsz = config.imgsz or variant.img_size
+    shared = [
+        Node('split', 'split', {'seed': config.seed, 'train_ratio': config.train_ratio}, deps=renders),
+        Node('train', 'train', {'epochs': config.epochs, 'batch': config.batch, 'imgsz': imgsz},
+             deps=('split',), options={'device': config.device}),
+        Node('infer', 'infer', {'conf': config.conf, 'imgsz': imgsz}, deps=('split', 'train')),
+    ]
+    nodes.extend(n for n in shared if n.stage in stages)
+    return nodes
+
+
+# ============================================================
+# 阶段实现：(参数, {上游节点名: 输出目录}, 输出目录)
+# 在进程池的工作进程中执行，重依赖在这里才导入
+# ============================================================
+
+def _dep(inputs: Dict[str, str], stage: str) -> str:
+    return next(path for name, path in inputs.items() if name.split(':')[0] == stage)
+
+
+def _read_candles(inputs: Dict[str, str]):
+    import pandas as pd
+    df = pd.read_csv(os.path.join(_dep(inputs, 'fetch'), 'candles.csv'))
+    df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+def stage_fetch(params: dict, inputs: Dict[str, str], out: str):
+    """拉取 asof 之前已收盘的 limit 根K线（或读取离线 CSV）-> candles.csv"""
+    import pandas as pd
+    from okx_utils import iter_candles
+
+    if params.get('csv'):
+        df = pd.read_csv(params['csv'])
+    else:
+        bar_ms = bar_to_seconds(params['bar']) * 1000
+        end = params['asof'] - bar_ms + 1  # 收盘时间 <= asof
+        start = end - params['limit'] * bar_ms
+        # 请求失败时 iter_candles 抛出异常，不会留下截断的 candles.csv 和完成标记
+        pages = list(iter_candles(params['symbol'], params['bar'], start=start, end=end))
+        if not pages:
+            raise RuntimeError(f"{params['symbol']}: 没有拉取到K线")
+        df = pd.concat(pages, ignore_index=True).drop_duplicates('timestamp')
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    if not params.get('csv'):
+        # 必须覆盖 [start, end)：首根为 asof 之前第 limit 根，末根在 asof 收盘
+        first, last = int(df['timestamp'].iloc[0]), int(df['timestamp'].iloc[-1])
+        want_first, want_last = params['asof'] - params['limit'] * bar_ms, params['asof'] - bar_ms
+        if first > want_first or last < want_last:
+            raise RuntimeError(f"{params['symbol']}: K线不完整 ({first} - {last}，需要 {want_first} - {want_last})，"
+                               f"新上线的交易对请减小 --limit")
+        missing = params['limit'] - len(df)
+        if missing > 0:
+            print(f"⚠️ 区间内缺少 {missing} 根K线 (交易所停机等)")
+    df[[c for c in CANDLE_COLUMNS if c in df.columns]].to_csv(os.path.join(out, 'candles.csv'), index=False)
+    print(f"📥 {len(df)} 根K线")
+
+
+def stage_indicators(params: dict, inputs: Dict[str, str], out: str):
+    """整表计算指标与状态信号 -> indicators.pkl"""
+    from pine_signal_detector import PineSignalDetector
+
+    detector = PineSignalDetector(SignalConfig(**params['signal_config']))
+    df = detector.calculate_stateful_signals(detector.calculate_indicators(_read_candles(inputs)))
+    df.to_pickle(os.path.join(out, 'indicators.pkl'))
+
+
+def stage_signals(params: dict, inputs: Dict[str, str], out: str):
+    """按步长扫描信号 -> signals.json"""
+    import pandas as pd
+    from pine_signal_detector import PineSignalDetector
+    from sliding_window_signal import scan_signals
+
+    df = pd.read_pickle(os.path.join(_dep(inputs, 'indicators'), 'indicators.pkl'))
+    detector = PineSignalDetector(SignalConfig(**params['signal_config']))
+    long_mask, short_mask = detector.check_signals_vectorized(df)
+    signals, _ = scan_signals(df, long_mask, short_mask, max(120, params['window']), params['stride'])
+    with open(os.path.join(out, 'signals.json'), 'w') as f:
+        json.dump(signals, f, ensure_ascii=False, indent=1)
+    print(f"✅ {len(signals)} 个信号")
+
+
+def stage_render(params: dict, inputs: Dict[str, str], out: str):
+    """信号图像与 YOLO 标签 -> images/, labels/"""
+    import pandas as pd
+    import sliding_window_signal
+    from chart_generator import ChartConfig, ChartGenerator
+
+    df = pd.read_pickle(os.path.join(_dep(inputs, 'indicators'), 'indicators.pkl'))
+    with open(os.path.join(_dep(inputs, 'signals'), 'signals.json')) as f:
+        signals = json.load(f)
+
+    sliding_window_signal.IMAGE_DIR = os.path.join(out, 'images')
+    sliding_window_signal.LABEL_DIR = os.path.join(out, 'labels')
+    os.makedirs(sliding_window_signal.IMAGE_DIR)
+    os.makedirs(sliding_window_signal.LABEL_DIR)
+    timestamps = [df['datetime'].iloc[sig['df_index']] for sig in signals]
+    saved = sliding_window_signal.render_signals(df, signals, timestamps,
+                                                 ChartGenerator(ChartConfig(**params['chart_config'])),
+                                                 params['symbol'], params['window'], bar=params['bar'])
+    # 单个样本保存失败只会打印并返回 False：这里不允许静默缺样本的阶段被标记为完成
+    expected = sum(1 for sig in signals if sig['df_index'] + 2 < len(df))
+    if saved < expected:
+        raise RuntimeError(f"{params['symbol']} 渲染失败: {expected - saved}/{expected} 个样本未写出")
+
+
+def stage_split(params: dict, inputs: Dict[str, str], out: str):
+    """汇总各交易对的样本并确定性划分 -> dataset/ (dataset.yaml)"""
+    import prepare_yolo_data
+
+    source = os.path.join(out, 'source')
+    for kind in ('images', 'labels'):
+        os.makedirs(os.path.join(source, kind))
+        for render_dir in inputs.values():
+            for name in sorted(os.listdir(os.path.join(render_dir, kind))):
+                src, dst = os.path.join(render_dir, kind, name), os.path.join(source, kind, name)
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy(src, dst)
+
+    prepare_yolo_data.SOURCE_IMG_DIR = os.path.join(source, 'images')
+    prepare_yolo_data.SOURCE_LBL_DIR = os.path.join(source, 'labels')
+    prepare_yolo_data.DEST_DIR = os.path.join(out, 'dataset')
+    prepare_yolo_data.prepare_data(seed=params['seed'], train_ratio=params['train_ratio'])
+    if not os.path.exists(os.path.join(out, 'dataset', 'dataset.yaml')):
+        raise RuntimeError("没有有效样本，未生成数据集")
+
+
+def stage_train(params: dict, inputs: Dict[str, str], out: str):
+    """训练 -> train/weights/best.pt"""
+    import train_yolo
+
+    train_yolo.DATA_YAML = os.path.join(_dep(inputs, 'split'), 'dataset', 'dataset.yaml')
+    train_yolo.PROJECT = out
+    train_yolo.NAME = 'train'
+    train_yolo.train(params['device'], params['epochs'], params['batch'], params['imgsz'])
+    if not os.path.exists(os.path.join(out, 'train', 'weights', 'best.pt')):
+        raise RuntimeError("训练没有产出 best.pt")
+
+
+def stage_infer(params: dict, inputs: Dict[str, str], out: str):
+    """用训练出的模型对验证集推理 -> predictions.jsonl"""
+    import infer
+
+    infer.TEST_SOURCE = os.path.join(_dep(inputs, 'split'), 'dataset', 'val', 'images')
+    infer.MODEL_PATH = os.path.join(_dep(inputs, 'train'), 'train', 'weights', 'best.pt')
+    infer.CONF_THRESHOLD = params['conf']
+    infer.IMGSZ = params['imgsz']
+    infer.stream_infer('torch', results_path=os.path.join(out, 'predictions.jsonl'))
+
+
+STAGES = {
+    'fetch': stage_fetch,
+    'indicators': stage_indicators,
+    'signals': stage_signals,
+    'render': stage_render,
+    'split': stage_split,
+    'train': stage_train,
+    'infer': stage_infer,
+}
+
+
+def _run_stage(stage: str, params: dict, inputs: Dict[str, str], out: str) -> float:
+    """工作进程入口：输出重定向到 stage.log，返回耗时"""
+    os.makedirs(out)
+    t0 = time.perf_counter()
+    with open(os.path.join(out, LOG_FILE), 'w') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        STAGES[stage](params, inputs, out)
+    return time.perf_counter() - t0
+
+
+class Pipeline:
+    """按依赖调度节点：依赖完成即提交，key 命中的节点直接跳过"""
+
+    def __init__(self, nodes: List[Node], root: str = PIPELINE_DIR, jobs: int = None, force: Tuple[str, ...] = ()):
+        self.nodes = nodes
+        self.root = os.path.abspath(root)
+        self.jobs = jobs or min(4, os.cpu_count() or 1)
+        self.force = set(force)
+        names = set()
+        for node in nodes:
+            missing = [d for d in node.deps if d not in names]
+            if missing:
+                raise ValueError(f"{node.name} 依赖未定义（或不在其之前）的节点: {missing}")
+            names.add(node.name)
+
+    def output_dir(self, node: Node, key: str) -> str:
+        prefix = f"{node.name.split(':', 1)[1]}-" if ':' in node.name else ''
+        return os.path.join(self.root, node.stage, prefix + key)
+
+    def _cached(self, node: Node, key: str) -> Optional[dict]:
+        if node.stage in self.force:
+            return None
+        path = os.path.join(self.output_dir(node, key), MARKER_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            marker = json.load(f)
+        return marker if marker.get('key') == key else None
+
+    def _finish(self, node: Node, key: str, out: str, seconds: float) -> str:
+        digest = dir_digest(out)
+        marker = {'node': node.name, 'key': key, 'digest': digest, 'params': node.params,
+                  'seconds': round(seconds, 3), 'finished_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        tmp = os.path.join(out, MARKER_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(marker, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp, os.path.join(out, MARKER_FILE))
+        return digest
+
+    def plan(self) -> List[Tuple[Node, str]]:
+        """不执行，推断各节点状态：cached / run（上游需要重跑时下游的 key 暂时未知，也记为 run）"""
+        digests, result = {}, []
+        for node in self.nodes:
+            marker = None
+            if all(d in digests for d in node.deps):
+                marker = self._cached(node, node_key(node, {d: digests[d] for d in node.deps}))
+            if marker is not None:
+                digests[node.name] = marker['digest']
+            result.append((node, 'cached' if marker is not None else 'run'))
+        return result
+
+    def run(self) -> Dict[str, str]:
+        """执行 DAG，返回 {节点: done / cached / failed / skipped}"""
+        pending = {node.name: node for node in self.nodes}
+        digests, dirs, status = {}, {}, {}
+        running = {}
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                # 可能连续命中缓存，循环到没有新节点就绪为止
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name, node in list(pending.items()):
+                        if any(status.get(d) in ('failed', 'skipped') for d in node.deps):
+                            del pending[name]
+                            status[name] = 'skipped'
+                            print(f"⏸️ {name}: 上游失败，跳过")
+                            progressed = True
+                            continue
+                        if not all(d in digests for d in node.deps):
+                            continue
+                        del pending[name]
+                        progressed = True
+                        key = node_key(node, {d: digests[d] for d in node.deps})
+                        out = dirs[name] = self.output_dir(node, key)
+                        marker = self._cached(node, key)
+                        if marker is not None:
+                            digests[name] = marker['digest']
+                            status[name] = 'cached'
+                            print(f"⏭️ {name}: 缓存命中 ({key})")
+                            continue
+                        if os.path.exists(out):
+                            shutil.rmtree(out)  # 上次中断或被 --force 的输出
+                        inputs = {d: dirs[d] for d in node.deps}
+                        future = pool.submit(_run_stage, node.stage, dict(node.params, **node.options), inputs, out)
+                        running[future] = (node, key, out)
+                        print(f"▶️ {name}: 运行 ({key})")
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node, key, out = running.pop(future)
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        status[node.name] = 'failed'
+                        print(f"❌ {node.name}: {e} (日志: {os.path.join(out, LOG_FILE)})")
+                        continue
+                    digests[node.name] = self._finish(node, key, out, seconds)
+                    status[node.name] = 'done'
+                    print(f"✅ {node.name}: {seconds:.1f}s -> {out}")
+        return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="信号检测 → 数据集 → 训练 → 推理 流水线 (内容哈希缓存)")
+    parser.add_argument('--symbol', type=str, default=DEFAULT_SYMBOL, help=f'单交易对 (default: {DEFAULT_SYMBOL})')
+    parser.add_argument('--symbols', type=str, default=None, help='多交易对 (逗号分隔)')
+    parser.add_argument('--bar', type=str, default=DEFAULT_BAR, help=f'K线周期 (default: {DEFAULT_BAR})')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f'每个交易对拉取的K线数 (default: {DEFAULT_LIMIT})')
+    parser.add_argument('--asof', type=str, default=None,
+                        help='拉取截止时间 (毫秒或 ISO 时间，UTC)，默认最后一根已收盘K线')
+    parser.add_argument('--csv', type=str, default=None, help='离线K线 CSV (单交易对)，代替 OKX 拉取')
+    parser.add_argument('--no-strict', action='store_true', help='禁用严格的6均线过滤模式')
+    parser.add_argument('--min-ma', type=int, default=4, help='非严格模式下最少需满足的均线数量')
+    parser.add_argument('--no-osc-filter', action='store_true', help='禁用动能过滤')
+    parser.add_argument('--no-alignment-filter', action='store_true', help='禁用均线排列过滤')
+    parser.add_argument('--no-power-filter', action='store_true', help='禁用K线力度过滤')
+    parser.add_argument('--variant', choices=list(CHART_VARIANTS), default='full', help='图表变体')
+    parser.add_argument('--window', type=int, default=None, help='窗口大小 (default: 变体的窗口大小)')
+    parser.add_argument('--stride', type=int, default=DEFAULT_STRIDE, help=f'滑动步长 (default: {DEFAULT_STRIDE})')
+    parser.add_argument('--seed', type=int, default=0, help='train/val 划分种子 (default: 0)')
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help=f'训练轮数 (default: {EPOCHS})')
+    parser.add_argument('--batch', type=int, default=BATCH, help=f'批次大小 (default: {BATCH})')
+    parser.add_argument('--imgsz', type=int, default=None, help='训练/推理输入尺寸 (default: 变体的图像尺寸)')
+    parser.add_argument('--conf', type=float, default=CONF_THRESHOLD, help=f'推理置信度阈值 (default: {CONF_THRESHOLD})')
+    parser.add_argument('--device', type=str, default='auto', help='训练设备 (不影响缓存 key)')
+    parser.add_argument('--until', choices=STAGE_ORDER, default='infer', help='运行到该阶段为止 (default: infer)')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数 (default: min(4, CPU 核数))')
+    parser.add_argument('--force', type=str, default='', help='忽略这些阶段的缓存 (逗号分隔)，例如 fetch,render')
+    parser.add_argument('--root', type=str, default=PIPELINE_DIR, help=f'输出根目录 (default: {PIPELINE_DIR})')
+    parser.add_argument('--plan', action='store_true', help='只列出节点与缓存状态，不执行')
+    args = parser.parse_args()
+
+    force = tuple(s.strip() for s in args.force.split(',') if s.strip())
+    unknown = [s for s in force if s not in STAGE_ORDER]
+    if unknown:
+        parser.error(f"未知阶段: {unknown}")
+
+    config = PipelineConfig(
+        symbols=tuple(s.strip() for s in args.symbols.split(',')) if args.symbols else (args.symbol,),
+        bar=args.bar,
+        limit=args.limit,
+        asof=to_ms(int(args.asof) if args.asof and args.asof.isdigit() else args.asof),
+        csv=args.csv,
+        signal_config=SignalConfig(
+            use_strict_filter=not args.no_strict,
+            min_ma_confirm=args.min_ma,
+            use_osc_filter=not args.no_osc_filter,
+            use_alignment_filter=not args.no_alignment_filter,
+            use_candle_power=not args.no_power_filter,
+        ),
+        variant=args.variant,
+        window=args.window,
+        stride=args.stride,
+        seed=args.seed,
+        epochs=args.epochs,
+        batch=args.batch,
+        imgsz=args.imgsz,
+        conf=args.conf,
+        device=args.device,
+        until=args.until,
+    )
+    try:
+        nodes = build_nodes(config)
+    except ValueError as e:
+        parser.error(str(e))
+    pipeline = Pipeline(nodes, root=args.root, jobs=args.jobs, force=force)
+
+    if args.plan:
+        for node, state in pipeline.plan():
+            deps = f" <- {', '.join(node.deps)}" if node.deps else ''
+            print(f"{'⏭️' if state == 'cached' else '▶️'} {node.name:<32s}{state:<8s}{deps}")
+        return 0
+
+    t0 = time.perf_counter()
+    status = pipeline.run()
+    counts = {s: sum(1 for v in status.values() if v == s) for s in ('done', 'cached', 'failed', 'skipped')}
+    print(f"\n🎉 流水线结束 ({time.perf_counter() - t0:.1f}s): 运行 {counts['done']}，缓存命中 {counts['cached']}，"
+          f"失败 {counts['failed']}，跳过 {counts['skipped']}")
+    return 1 if counts['failed'] or counts['skipped'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Prediction Cache - 推理结果缓存 (SQLite)
+
+以 (图像内容哈希, 模型权重哈希, 推理参数) 为键持久化检测结果：
+- 数据集扩充后重新推理时，未变化的图片直接命中缓存，只对新增/变化的图片运行模型
+- 权重文件一旦更新（重新训练），模型哈希随之变化，旧结果自动失效
+- conf / imgsz 等参数参与键计算，不同参数的结果互不干扰
+
+用法：
+    python scripts/prediction_cache.py            # 打印统计
+    python scripts/prediction_cache.py --prune    # 删除非当前模型的缓存
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# =================配置=================
+PREDICTION_DB = "data/predictions.db"
+MODEL_PATH = 'runs/detect/kline_cluster_yolo11/weights/best.pt'
+HASH_CHUNK = 1 << 20
+# =====================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    image_hash   TEXT NOT NULL,
+    model_hash   TEXT NOT NULL,
+    params       TEXT NOT NULL,
+    image_path   TEXT,
+    detections   TEXT NOT NULL,
+    created_at   REAL,
+    PRIMARY KEY (image_hash, model_hash, params)
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_model ON predictions (model_hash);
+"""
+
+
+def file_hash(path: str) -> str:
+    """文件内容 sha1"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def params_key(**params) -> str:
+    """推理参数的稳定字符串表示"""
+    return json.dumps(params, sort_keys=True)
+
+
+class PredictionCache:
+    """推理结果缓存：lookup 批量查询，put 缓冲写入，flush 批量提交"""
+
+    def __init__(self, db_path: str = PREDICTION_DB, model_path: Optional[str] = None, **params):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.model_hash = file_hash(model_path) if model_path else ''
+        self.params = params_key(**params)
+        self._buffer: List[tuple] = []
+        # 图片路径 -> (size, mtime_ns, sha1)，同一进程内避免重复读文件
+        self._hash_memo: Dict[str, Tuple[int, int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def image_hash(self, path: str) -> str:
+        st = os.stat(path)
+        memo = self._hash_memo.get(path)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        digest = file_hash(path)
+        self._hash_memo[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def lookup(self, paths: Sequence[str]) -> Dict[str, List[dict]]:
+        """批量查询，返回命中的 {路径: 检测列表}"""
+        hashes = {p: self.image_hash(p) for p in paths}
+        found: Dict[str, List[dict]] = {}
+        unique = list(set(hashes.values()))
+        rows = {}
+        # SQLite 变量数上限默认 999，分段查询
+        for i in range(0, len(unique), 900):
+            part = unique[i:i + 900]
+            sql = (f"SELECT image_hash, detections FROM predictions "
+                   f"WHERE model_hash = ? AND params = ? AND image_hash IN ({', '.join('?' * len(part))})")
+            rows.update(self.conn.execute(sql, [self.model_hash, self.params, *part]).fetchall())
+        for p, h in hashes.items():
+            if h in rows:
+                found[p] = json.loads(rows[h])
+        self.hits += len(found)
+        self.misses += len(paths) - len(found)
+        return found
+
+    def put(self, path: str, detections: List[dict]):
+        self._buffer.append((self.image_hash(path), self.model_hash, self.params, path,
+                             json.dumps(detections), datetime.now().timestamp()))
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO predictions "
+                "(image_hash, model_hash, params, image_path, detections, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                self._buffer,
+            )
+        self._buffer = []
+
+    def prune(self) -> int:
+        """删除非当前模型的缓存条目"""
+        self.flush()
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM predictions WHERE model_hash != ?", (self.model_hash,))
+        return cur.rowcount
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"推理缓存: 命中 {self.hits}, 未命中 {self.misses} (命中率 {rate:.1f}%)"
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理结果缓存")
+    parser.add_argument('--db', type=str, default=PREDICTION_DB, help=f'缓存数据库 (default: {PREDICTION_DB})')
+    parser.add_argument('--model', type=str, default=MODEL_PATH, help='当前模型权重')
+    parser.add_argument('--prune', action='store_true', help='删除非当前模型的缓存')
+    args = parser.parse_args()
+
+    model_path = args.model if os.path.exists(args.model) else None
+    with PredictionCache(args.db, model_path) as cache:
+        if args.prune:
+            if model_path is None:
+                print(f"❌ 模型文件不存在: {args.model}")
+                return
+            print(f"🧹 已删除 {cache.prune()} 条旧模型缓存")
+        print(f"📊 推理缓存 ({args.db}):")
+        sql = "SELECT model_hash, params, COUNT(*) FROM predictions GROUP BY model_hash, params"
+        for model_hash, params, n in cache.conn.execute(sql):
+            mark = " (当前模型)" if model_hash == cache.model_hash else ""
+            print(f"   model={model_hash[:12]} {params} n={n}{mark}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,30 @@
 YOLO 数据集准备脚本
 功能：
 1. 从 data/pine_signals 读取生成的图像和标签
-2. 随机划分为训练集 (train) 和验证集 (val)
-3. 整理为 YOLOv8/v11 标准目录结构
+2. 按文件名哈希确定性划分为训练集 (train) 和验证集 (val)
+3. 整理为 YOLOv8/v11 标准目录结构（默认硬链接，不复制文件内容）
 4. 生成 dataset.yaml 配置文件
+
+增量模式 (--incremental)：保留已有数据集，根据 manifest.jsonl 只加入新样本。
+查询模式 (--index + 过滤条件)：从样本索引按 symbol / 时间 / 类别查询子集，不扫描源目录。
+
+分片模式 (--shards)：直接根据分片索引生成 train/val 的 key 列表，不复制任何文件。
 """
 
 import os
+import sys
+import json
 import shutil
-import random
+import argparse
 import yaml
 from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from shard_dataset import SHARD_DIR, load_index, split_index, split_of, write_split_files
+from sample_index import SampleIndex, SAMPLE_DB
+from chart_generator import CHART_VARIANTS
 
 # =================配置=================
 # 原始数据目录
@@ -21,6 +35,9 @@ SOURCE_LBL_DIR = 'data/pine_signals/labels'
 # 目标输出目录
 DEST_DIR = 'data/yolo_dataset'
 
+# 样本 -> split 的持久化清单（位于 DEST_DIR 内）
+MANIFEST_FILE = 'manifest.jsonl'
+
 # 划分比例
 TRAIN_RATIO = 0.8  # 80% 训练, 20% 验证
 
@@ -31,12 +48,59 @@ CLASS_NAMES = {
 }
 # =====================================
 
-def prepare_data():
-    """执行数据准备流程"""
+def _list_stems(directory: str, ext: str) -> set:
+    """一次 scandir 列出目录下指定扩展名的文件名（不含扩展名）"""
+    with os.scandir(directory) as it:
+        return {e.name[:-len(ext)] for e in it if e.name.endswith(ext)}
+
+
+def load_manifest(dest_dir: str = DEST_DIR) -> dict:
+    """读取样本 -> split 的持久化清单（追加写入，后出现的记录覆盖先出现的）"""
+    path = os.path.join(dest_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = json.loads(line)
+                    manifest[rec['key']] = rec['split']
+    return manifest
+
+
+def _link_file(src: str, dst: str, mode: str):
+    """按 mode 将 src 放到 dst：hard 硬链接（跨设备时退化为软链接），symlink 软链接，copy 复制"""
+    if mode == 'hard':
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            mode = 'symlink'
+    if mode == 'symlink':
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return
+        except OSError:
+            pass
+    shutil.copy(src, dst)
+
+
+def prepare_data(incremental: bool = False, link: str = 'hard', seed: int = 0,
+                 train_ratio: float = TRAIN_RATIO, keys: Optional[set] = None):
+    """
+    执行数据准备流程
+    
+    Args:
+        incremental: 增量模式，保留已有数据集与清单，只加入新样本
+        link: 文件放置方式 ('hard' / 'symlink' / 'copy')
+        seed: train/val 划分的哈希种子（同一样本在多次运行中归属不变）
+        train_ratio: 训练集比例
+        keys: 样本索引查询得到的子集；提供时不再扫描源目录
+    """
     print(f"🚀 开始准备 YOLO 数据集...")
     
-    # 1. 清理并创建目标目录
-    if os.path.exists(DEST_DIR):
+    # 1. 清理并创建目标目录（增量模式保留已有数据）
+    if os.path.exists(DEST_DIR) and not incremental:
         shutil.rmtree(DEST_DIR)
         print(f"   已清理旧目录: {DEST_DIR}")
     
@@ -45,55 +109,78 @@ def prepare_data():
         for kind in ['images', 'labels']:
             os.makedirs(os.path.join(DEST_DIR, split, kind), exist_ok=True)
             
-    # 2. 收集匹配的文件对
+    # 2. 收集匹配的文件对（每个目录只列一次，用集合求交）
     if not os.path.exists(SOURCE_IMG_DIR) or not os.path.exists(SOURCE_LBL_DIR):
         print(f"❌ 源目录不存在！请先运行 detection 脚本生成数据。")
         return
 
-    images = [f for f in os.listdir(SOURCE_IMG_DIR) if f.endswith('.png')]
-    valid_pairs = []
-    
-    print(f"   扫描源目录...")
-    for img_file in images:
-        base_name = os.path.splitext(img_file)[0]
-        txt_file = base_name + '.txt'
-        
-        src_img_path = os.path.join(SOURCE_IMG_DIR, img_file)
-        src_txt_path = os.path.join(SOURCE_LBL_DIR, txt_file)
-        
-        # 检查对应的标签文件是否存在
-        if os.path.exists(src_txt_path):
-            valid_pairs.append((src_img_path, src_txt_path))
-        else:
-            # 只有标签存在才算有效样本
-            pass
+    if keys is not None:
+        print(f"   使用索引查询结果: {len(keys)} 个样本")
+        valid_keys = set(keys)
+    else:
+        print(f"   扫描源目录...")
+        # 只有标签存在才算有效样本
+        valid_keys = _list_stems(SOURCE_IMG_DIR, '.png') & _list_stems(SOURCE_LBL_DIR, '.txt')
             
-    if not valid_pairs:
+    if not valid_keys:
         print("❌ 未找到有效的 图像-标签 对！")
         return
 
-    # 3. 随机划分
-    random.shuffle(valid_pairs)
-    split_idx = int(len(valid_pairs) * TRAIN_RATIO)
-    train_pairs = valid_pairs[:split_idx]
-    val_pairs = valid_pairs[split_idx:]
+    # 目标目录只列一次（补建清单与跳过已放置的样本共用）
+    existing = {
+        split: _list_stems(os.path.join(DEST_DIR, split, 'images'), '.png')
+        for split in ('train', 'val')
+    }
+    
+    # 3. 确定性划分：已在清单中的样本保持原归属，新样本按 key 哈希分配
+    manifest = load_manifest(DEST_DIR) if incremental else {}
+    seeded = []
+    if incremental and not os.path.exists(os.path.join(DEST_DIR, MANIFEST_FILE)):
+        # 旧版本（随机划分）生成的数据集没有清单：按已有放置补建，
+        # 否则按哈希重新分配会把 val 中的样本再放进 train，造成验证集泄漏
+        for split in ('train', 'val'):
+            for key in sorted(existing[split] - manifest.keys()):
+                manifest[key] = split
+                seeded.append((key, split))
+        if seeded:
+            print(f"   未找到清单，按已有放置补建: {len(seeded)} 个样本")
+    new_keys = sorted(valid_keys - manifest.keys())
+    if keys is not None:
+        # 索引中的样本文件可能已被删除：与源目录的一次列举求交，跳过并计数，不中断整个划分
+        on_disk = _list_stems(SOURCE_IMG_DIR, '.png') & _list_stems(SOURCE_LBL_DIR, '.txt')
+        present = [k for k in new_keys if k in on_disk]
+        if len(present) < len(new_keys):
+            print(f"⚠️ 跳过 {len(new_keys) - len(present)} 个源文件已不存在的索引样本")
+        new_keys = present
+    new_records = [(key, split_of(key, train_ratio, seed)) for key in new_keys]
+    
+    splits = {'train': 0, 'val': 0}
+    for split in manifest.values():
+        splits[split] += 1
+    for _, split in new_records:
+        splits[split] += 1
     
     print(f"📊 数据集统计:")
-    print(f"   总样本: {len(valid_pairs)}")
-    print(f"   训练集: {len(train_pairs)}")
-    print(f"   验证集: {len(val_pairs)}")
-    
-    # 4. 复制文件
-    def copy_file(pairs, split):
-        print(f"   正在生成 {split} 集...")
-        for img_src, txt_src in pairs:
-            # 复制图片
-            shutil.copy(img_src, os.path.join(DEST_DIR, split, 'images', os.path.basename(img_src)))
-            # 复制标签
-            shutil.copy(txt_src, os.path.join(DEST_DIR, split, 'labels', os.path.basename(txt_src)))
-            
-    copy_file(train_pairs, 'train')
-    copy_file(val_pairs, 'val')
+    print(f"   总样本: {len(manifest) + len(new_records)}")
+    print(f"   训练集: {splits['train']}")
+    print(f"   验证集: {splits['val']}")
+    if incremental:
+        print(f"   已有样本: {len(manifest)}，新增样本: {len(new_records)}")
+    
+    # 4. 链接文件（已在任一 split 中的样本跳过，同一样本不会同时出现在 train 和 val）
+    print(f"   正在放置新样本 ({link})...")
+    for key, split in new_records:
+        if key in existing['train'] or key in existing['val']:
+            continue
+        _link_file(os.path.join(SOURCE_IMG_DIR, key + '.png'),
+                   os.path.join(DEST_DIR, split, 'images', key + '.png'), link)
+        _link_file(os.path.join(SOURCE_LBL_DIR, key + '.txt'),
+                   os.path.join(DEST_DIR, split, 'labels', key + '.txt'), link)
+    
+    # 追加写入清单
+    with open(os.path.join(DEST_DIR, MANIFEST_FILE), 'a') as f:
+        for key, split in seeded + new_records:
+            f.write(json.dumps({'key': key, 'split': split}) + "\n")
     
     # 5. 生成 dataset.yaml
     yaml_content = {
@@ -111,5 +198,84 @@ def prepare_data():
     print(f"   配置文件: {yaml_path}")
     print(f"   训练命令提示: yolo train data={yaml_path} ...")
 
+
+def prepare_shards(shard_dir: str = SHARD_DIR, train_ratio: float = TRAIN_RATIO, seed: int = 0,
+                   keys: Optional[set] = None):
+    """根据分片索引划分 train/val（只写 key 列表与 dataset.yaml，不复制文件）"""
+    print(f"🚀 开始准备分片数据集: {shard_dir}")
+    
+    entries = load_index(shard_dir)
+    if keys is not None:
+        entries = [e for e in entries if e['key'] in keys]
+    if not entries:
+        print(f"❌ 分片索引为空！请先运行: python scripts/sliding_window_signal.py --shards {shard_dir}")
+        return
+    
+    splits = split_index(entries, train_ratio=train_ratio, seed=seed)
+    names = write_split_files(shard_dir, splits)
+    
+    print(f"📊 数据集统计:")
+    print(f"   总样本: {len(entries)}")
+    print(f"   训练集: {len(splits['train'])}")
+    print(f"   验证集: {len(splits['val'])}")
+    
+    # shards: true 告诉 train_yolo.py 使用分片加载器
+    yaml_content = {
+        'path': os.path.abspath(shard_dir),
+        'train': names['train'],
+        'val': names['val'],
+        'names': CLASS_NAMES,
+        'shards': True,
+    }
+    
+    yaml_path = os.path.join(shard_dir, 'dataset.yaml')
+    with open(yaml_path, 'w') as f:
+        yaml.dump(yaml_content, f, sort_keys=False)
+    
+    print(f"✅ 分片数据集准备完成！")
+    print(f"   配置文件: {yaml_path}")
+
+
 if __name__ == "__main__":
-    prepare_data()
+    parser = argparse.ArgumentParser(description="YOLO 数据集准备")
+    parser.add_argument('--shards', nargs='?', const=SHARD_DIR, default=None,
+                        help=f'从 tar 分片索引划分数据集，不复制文件 (default: {SHARD_DIR})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：保留已有数据集，只加入新样本')
+    parser.add_argument('--link', choices=['hard', 'symlink', 'copy'], default='hard',
+                        help='文件放置方式 (default: hard)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='train/val 划分的哈希种子')
+    
+    # 样本索引查询（sliding_window_signal.py --sample-index 生成）
+    parser.add_argument('--index', nargs='?', const=SAMPLE_DB, default=None,
+                        help=f'从样本索引查询子集 (default: {SAMPLE_DB})')
+    parser.add_argument('--symbol', action='append', default=None,
+                        help='只使用指定交易对 (可重复)')
+    parser.add_argument('--since', type=str, default=None, help='起始时间 (含)，如 2024-01-01')
+    parser.add_argument('--until', type=str, default=None, help='结束时间 (不含)')
+    parser.add_argument('--class', dest='class_id', type=int, default=None, help='类别ID (0=LONG, 1=SHORT)')
+    parser.add_argument('--config', type=str, default=None, help='只使用指定 config_hash 生成的样本')
+    parser.add_argument('--variant', choices=list(CHART_VARIANTS), default='full',
+                        help='图表变体：紧凑变体读取/写入带后缀的目录 (如 data/yolo_dataset_compact320)')
+    args = parser.parse_args()
+    
+    suffix = CHART_VARIANTS[args.variant].suffix
+    if suffix:
+        SOURCE_IMG_DIR = f'data/pine_signals{suffix}/images'
+        SOURCE_LBL_DIR = f'data/pine_signals{suffix}/labels'
+        DEST_DIR = DEST_DIR + suffix
+        if args.shards == SHARD_DIR:
+            args.shards = SHARD_DIR + suffix
+    
+    keys = None
+    if args.index:
+        with SampleIndex(args.index) as index:
+            keys = index.keys(symbols=args.symbol, start=args.since, end=args.until,
+                              class_id=args.class_id, config=args.config,
+                              sharded=bool(args.shards))
+    
+    if args.shards:
+        prepare_shards(args.shards, seed=args.seed, keys=keys)
+    else:
+        prepare_data(incremental=args.incremental, link=args.link, seed=args.seed, keys=keys)
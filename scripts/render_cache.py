@@ -0,0 +1,189 @@
+"""
+Render Cache - 基于窗口内容的图表渲染缓存
+
+同一窗口（OHLC + 均线数值完全一致）在相同 ChartConfig 下渲染出的图像是确定的，
+因此可以用内容哈希作为 key 复用已渲染的 PNG：
+1. render_key: 对窗口数值 + ChartConfig 字段 + 渲染版本号做哈希
+2. RenderCache.fetch: 命中时硬链接（失败则复制）到目标路径，跳过渲染
+3. RenderCache.store: 未命中时将新渲染的图像存入缓存
+4. 按总大小做 LRU 淘汰（以文件 mtime 作为最近使用时间）
+
+缓存目录结构：
+    data/render_cache/ab/abcdef0123....png
+"""
+
+import os
+import shutil
+import hashlib
+import time
+from dataclasses import asdict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from chart_generator import ChartConfig, ChartData, RENDER_VERSION, stack_chart_columns
+
+# =================配置=================
+RENDER_CACHE_DIR = "data/render_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3   # 2 GB
+EVICT_TARGET_RATIO = 0.9            # 淘汰到上限的 90%，避免每次写入都触发淘汰
+# =====================================
+
+
+def render_key(window: ChartData, config: ChartConfig) -> str:
+    """
+    计算窗口的渲染缓存 key
+
+    只使用 generate_chart 实际读取的列；DataFrame 与等价的窗口视图得到相同的 key。
+    """
+    values = np.ascontiguousarray(stack_chart_columns(window))
+
+    h = hashlib.sha1()
+    h.update(f"v{RENDER_VERSION}|{values.shape}|".encode('utf-8'))
+    h.update(repr(sorted(asdict(config).items())).encode('utf-8'))
+    h.update(values.tobytes())
+    return h.hexdigest()
+
+
+class RenderCache:
+    """内容寻址的 PNG 渲染缓存（带大小上限与命中统计）"""
+
+    def __init__(self, cache_dir: str = RENDER_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> (size, last_used)，启动时扫描一次，之后增量维护
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._total_bytes = 0
+        self._scan()
+
+    def _scan(self):
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.png'):
+                    st = entry.stat()
+                    self._entries[entry.name[:-4]] = (st.st_size, st.st_mtime)
+                    self._total_bytes += st.st_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def _touch(self, key: str):
+        now = time.time()
+        try:
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+        size, _ = self._entries[key]
+        self._entries[key] = (size, now)
+
+    def contains(self, key: str) -> bool:
+        return key in self._entries
+
+    def fetch(self, key: str, dest_path: str) -> bool:
+        """命中时将缓存图像硬链接到 dest_path，返回是否命中"""
+        if key not in self._entries:
+            self.misses += 1
+            return False
+
+        src = self._path(key)
+        try:
+            if os.path.lexists(dest_path):
+                if os.path.samefile(src, dest_path):
+                    self.hits += 1
+                    self._touch(key)
+                    return True
+                os.remove(dest_path)
+            try:
+                os.link(src, dest_path)
+            except OSError:
+                shutil.copyfile(src, dest_path)
+        except FileNotFoundError:
+            # 缓存文件被外部删除
+            self._forget(key)
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        self._touch(key)
+        return True
+
+    def read(self, key: str) -> Optional[bytes]:
+        """命中时返回缓存图像字节（用于分片写入）"""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._forget(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        return data
+
+    def store(self, key: str, src_path: str):
+        """将已渲染的图像存入缓存（优先硬链接，不额外占用磁盘）"""
+        if key in self._entries:
+            return
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(src_path, dest)
+        except OSError:
+            shutil.copyfile(src_path, dest)
+        self._add(key, os.path.getsize(dest))
+
+    def store_bytes(self, key: str, data: bytes):
+        """将内存中的图像字节存入缓存"""
+        if key in self._entries:
+            return
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, dest)
+        self._add(key, len(data))
+
+    def _add(self, key: str, size: int):
+        self._entries[key] = (size, time.time())
+        self._total_bytes += size
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _forget(self, key: str):
+        size, _ = self._entries.pop(key, (0, 0))
+        self._total_bytes -= size
+
+    def _evict(self):
+        """按最近使用时间从旧到新淘汰，直到总大小降到上限的 EVICT_TARGET_RATIO"""
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        for key, _ in sorted(self._entries.items(), key=lambda kv: kv[1][1]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._forget(key)
+            self.evictions += 1
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"命中 {self.hits} / 未命中 {self.misses} (命中率 {rate:.1f}%), "
+                f"淘汰 {self.evictions}, 缓存 {len(self._entries)} 张 / {self._total_bytes / 1024 ** 2:.1f} MB")
@@ -0,0 +1,299 @@
+"""
+Sample Index - 可查询的样本索引 (SQLite)
+
+生成器在写出每个样本时同步记录一行元数据，下游按条件查询即可得到子集，无需扫描目录、解析文件名：
+- symbol / bar / ts (毫秒时间戳) / class_id
+  symbol 统一保存为去掉分隔符的形式 (BTCUSDTSWAP，与文件名一致)，查询时 BTC-USDT-SWAP 与 BTCUSDTSWAP 等价
+- YOLO 框 cx, cy, w, h
+- config_hash: SignalConfig + ChartConfig + 窗口大小的哈希，区分不同参数生成的样本
+- 文件位置: image_path / label_path（零散文件）或 shard / offset / size（tar 分片）
+
+用法：
+    python scripts/sample_index.py                      # 打印统计
+    python scripts/sample_index.py --symbol BTC-USDT-SWAP --class 0 --since 2024-01-01
+    python scripts/sample_index.py --backfill           # 从已有目录/分片补建索引
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+import argparse
+from dataclasses import asdict, is_dataclass
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+# =================配置=================
+SAMPLE_DB = "data/samples.db"
+DEFAULT_FLUSH_EVERY = 500
+SCHEMA_VERSION = 1  # PRAGMA user_version：1 = symbol 已统一为无分隔符形式
+# =====================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    key          TEXT PRIMARY KEY,
+    symbol       TEXT NOT NULL,
+    bar          TEXT,
+    ts           INTEGER,
+    class_id     INTEGER,
+    cx           REAL,
+    cy           REAL,
+    w            REAL,
+    h            REAL,
+    config_hash  TEXT,
+    image_path   TEXT,
+    label_path   TEXT,
+    shard        TEXT,
+    offset       INTEGER,
+    size         INTEGER,
+    created_at   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_samples_symbol_ts ON samples (symbol, ts);
+CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples (ts);
+CREATE INDEX IF NOT EXISTS idx_samples_class ON samples (class_id);
+CREATE INDEX IF NOT EXISTS idx_samples_config ON samples (config_hash);
+"""
+
+COLUMNS = ('key', 'symbol', 'bar', 'ts', 'class_id', 'cx', 'cy', 'w', 'h', 'config_hash',
+           'image_path', 'label_path', 'shard', 'offset', 'size', 'created_at')
+
+
+def config_hash(*configs, **extra) -> str:
+    """对若干 dataclass 配置与额外参数做稳定哈希（用于区分不同参数生成的结果）"""
+    parts = []
+    for cfg in configs:
+        fields = asdict(cfg) if is_dataclass(cfg) else dict(cfg)
+        parts.append((type(cfg).__name__, sorted(fields.items())))
+    parts.append(('extra', sorted(extra.items())))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def normalize_symbol(symbol: str) -> str:
+    """去掉分隔符 (BTC-USDT-SWAP -> BTCUSDTSWAP)，与样本文件名中的形式一致"""
+    return symbol.replace('-', '').replace('_', '')
+
+
+def to_ms(timestamp) -> Optional[int]:
+    """将 Timestamp / datetime / 字符串转为 UTC 毫秒时间戳（无时区视为 UTC）"""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def parse_box(label: str):
+    """取标签第一行的 (class_id, cx, cy, w, h)，空标签返回全 None"""
+    parts = label.split()
+    if len(parts) < 5:
+        return None, None, None, None, None
+    return int(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])
+
+
+class SampleIndex:
+    """样本索引（写入缓冲 + 批量事务提交）"""
+
+    def __init__(self, db_path: str = SAMPLE_DB, flush_every: int = DEFAULT_FLUSH_EVERY):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._buffer: List[tuple] = []
+
+    def _migrate(self):
+        """按 PRAGMA user_version 只执行一次的迁移（新建的库直接标记为最新版本）"""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.conn:
+            if version < 1:
+                # 旧版本生成器写入的是带分隔符的 symbol，与补建的行统一
+                self.conn.execute("UPDATE samples SET symbol = REPLACE(REPLACE(symbol, '-', ''), '_', '') "
+                                  "WHERE instr(symbol, '-') > 0 OR instr(symbol, '_') > 0")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def add(self, key: str, symbol: str, label: str = "", **fields):
+        """记录一个样本；class_id 与框坐标从 label 解析（fields 中显式给出的优先）"""
+        class_id, cx, cy, w, h = parse_box(label)
+        rec = {'key': key, 'symbol': normalize_symbol(symbol), 'class_id': class_id,
+               'cx': cx, 'cy': cy, 'w': w, 'h': h,
+               'created_at': datetime.now().timestamp()}
+        rec.update({k: v for k, v in fields.items() if v is not None})
+        self._buffer.append(tuple(rec.get(c) for c in COLUMNS))
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        placeholders = ", ".join("?" * len(COLUMNS))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO samples ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                self._buffer,
+            )
+        self._buffer = []
+
+    def _where(self, symbols=None, start=None, end=None, class_id=None, config=None,
+               min_w=None, max_w=None, min_h=None, max_h=None, sharded=None):
+        clauses, params = [], []
+        if symbols:
+            clauses.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+            params.extend(normalize_symbol(s) for s in symbols)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_ms(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(to_ms(end))
+        if class_id is not None:
+            clauses.append("class_id = ?")
+            params.append(class_id)
+        if config is not None:
+            clauses.append("config_hash = ?")
+            params.append(config)
+        for col, op, val in (('w', '>=', min_w), ('w', '<=', max_w), ('h', '>=', min_h), ('h', '<=', max_h)):
+            if val is not None:
+                clauses.append(f"{col} {op} ?")
+                params.append(val)
+        if sharded is not None:
+            clauses.append("shard IS NOT NULL" if sharded else "image_path IS NOT NULL")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[dict]:
+        """
+        按条件查询样本
+
+        filters: symbols, start, end, class_id, config, min_w, max_w, min_h, max_h, sharded
+        """
+        self.flush()
+        where, params = self._where(**filters)
+        sql = f"SELECT * FROM samples{where} ORDER BY symbol, ts"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(r) for r in self.conn.execute(sql, params)]
+
+    def keys(self, **filters) -> set:
+        """只返回满足条件的样本 key 集合"""
+        self.flush()
+        where, params = self._where(**filters)
+        return {r[0] for r in self.conn.execute(f"SELECT key FROM samples{where}", params)}
+
+    def stats(self) -> List[dict]:
+        """按 symbol / class 汇总样本数"""
+        self.flush()
+        sql = ("SELECT symbol, class_id, COUNT(*) AS n, MIN(ts) AS first_ts, MAX(ts) AS last_ts "
+               "FROM samples GROUP BY symbol, class_id ORDER BY n DESC")
+        return [dict(r) for r in self.conn.execute(sql)]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================================
+# 从已有数据补建索引
+# ============================================================
+
+_NAME_RE = re.compile(r"^(?P<symbol>.+)_(?P<type>LONG|SHORT)_(?P<ts>\d{8}_\d{4})$")
+
+
+def _ts_from_name(ts_str: str) -> Optional[int]:
+    try:
+        return to_ms(datetime.strptime(ts_str, '%Y%m%d_%H%M'))
+    except ValueError:
+        return None
+
+
+def backfill_from_dirs(index: SampleIndex, img_dir: str, lbl_dir: str) -> int:
+    """解析 {symbol}_{LONG|SHORT}_{YYYYMMDD_HHMM}.png 文件名补建索引"""
+    count = 0
+    with os.scandir(img_dir) as it:
+        for e in it:
+            if not e.name.endswith('.png'):
+                continue
+            key = e.name[:-4]
+            m = _NAME_RE.match(key)
+            if not m:
+                continue
+            label_path = os.path.join(lbl_dir, key + '.txt')
+            try:
+                with open(label_path) as f:
+                    label = f.read()
+            except FileNotFoundError:
+                continue
+            index.add(key, m.group('symbol'), label, ts=_ts_from_name(m.group('ts')),
+                      image_path=e.path, label_path=label_path)
+            count += 1
+    index.flush()
+    return count
+
+
+def backfill_from_shards(index: SampleIndex, entries: Iterable[dict]) -> int:
+    """从分片索引条目补建索引"""
+    count = 0
+    for e in entries:
+        index.add(e['key'], e.get('symbol', ''), e.get('label', ''),
+                  ts=to_ms(e.get('timestamp')), bar=e.get('bar'), config_hash=e.get('config_hash'),
+                  shard=e['shard'], offset=e['offset'], size=e['size'])
+        count += 1
+    index.flush()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="样本索引查询")
+    parser.add_argument('--db', type=str, default=SAMPLE_DB, help=f'索引数据库 (default: {SAMPLE_DB})')
+    parser.add_argument('--symbol', action='append', default=None, help='交易对 (可重复)')
+    parser.add_argument('--since', type=str, default=None, help='起始时间 (含)，如 2024-01-01')
+    parser.add_argument('--until', type=str, default=None, help='结束时间 (不含)')
+    parser.add_argument('--class', dest='class_id', type=int, default=None, help='类别ID (0=LONG, 1=SHORT)')
+    parser.add_argument('--config', type=str, default=None, help='config_hash')
+    parser.add_argument('--min-w', type=float, default=None, help='最小框宽 (归一化)')
+    parser.add_argument('--limit', type=int, default=20, help='最多打印多少条')
+    parser.add_argument('--backfill', action='store_true', help='从 data/pine_signals 与 data/pine_shards 补建索引')
+    args = parser.parse_args()
+
+    index = SampleIndex(args.db)
+
+    if args.backfill:
+        from shard_dataset import SHARD_DIR, load_index
+        n_files = backfill_from_dirs(index, 'data/pine_signals/images', 'data/pine_signals/labels') \
+            if os.path.exists('data/pine_signals/images') else 0
+        n_shards = backfill_from_shards(index, load_index(SHARD_DIR))
+        print(f"✅ 补建完成: 零散文件 {n_files} 个, 分片样本 {n_shards} 个")
+
+    filters = dict(symbols=args.symbol, start=args.since, end=args.until,
+                   class_id=args.class_id, config=args.config, min_w=args.min_w)
+    if any(v is not None for v in filters.values()):
+        rows = index.query(limit=args.limit, **filters)
+        print(f"🔍 共 {len(index.keys(**filters))} 个样本，显示前 {len(rows)} 个:")
+        for r in rows:
+            ts = datetime.fromtimestamp(r['ts'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M') if r['ts'] else '-'
+            print(f"   {r['symbol']:16} {ts} cls={r['class_id']} w={r['w']} h={r['h']} "
+                  f"{r['image_path'] or r['shard']}")
+    else:
+        print(f"📊 样本统计 ({args.db}):")
+        for r in index.stats():
+            print(f"   {r['symbol']:16} cls={r['class_id']} n={r['n']}")
+
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""
+Shard Dataset - 分片数据集容器
+
+将大量小文件（每个信号一张 PNG + 一个 TXT）合并为少量 tar 分片，降低文件系统元数据开销：
+1. ShardWriter: 批量写入 tar 分片（key.png + key.txt），同时追加 index.jsonl 索引
+2. ShardReader: 基于索引 + mmap 随机读取任意样本，无需解包
+3. split_index: 按 key 哈希确定性划分 train/val，只生成 key 列表，不复制任何文件
+4. ShardYOLODataset / ShardDetectionTrainer: 让 ultralytics 直接从分片读取训练数据
+
+目录结构：
+    data/pine_shards/
+    ├── shard-00000.tar
+    ├── shard-00001.tar
+    ├── index.jsonl       # 每行一个样本: key, shard, offset, size, label, 元数据
+    ├── train.keys        # prepare_yolo_data.py --shards 生成
+    ├── val.keys
+    └── dataset.yaml
+"""
+
+import io
+import os
+import json
+import mmap
+import tarfile
+import hashlib
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# =================配置=================
+SHARD_DIR = "data/pine_shards"
+INDEX_FILE = "index.jsonl"
+SHARD_PATTERN = "shard-{:05d}.tar"
+
+DEFAULT_SHARD_SIZE = 5000   # 每个分片的样本数
+DEFAULT_FLUSH_EVERY = 256   # 缓冲多少个样本后批量落盘
+# =====================================
+
+
+class ShardWriter:
+    """
+    tar 分片写入器
+
+    样本先缓存在内存中，攒够 flush_every 个后一次性写入当前分片并追加索引，
+    避免每个样本都触发一次文件创建。已有分片不会被改写，新运行总是从新分片编号开始。
+    on_flush 在每批索引条目落盘后被调用（例如同步写入样本索引数据库）。
+    """
+
+    def __init__(
+        self,
+        shard_dir: str = SHARD_DIR,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        flush_every: int = DEFAULT_FLUSH_EVERY,
+        on_flush: Optional[Callable[[List[dict]], None]] = None,
+    ):
+        self.shard_dir = shard_dir
+        self.shard_size = shard_size
+        self.flush_every = flush_every
+        self.on_flush = on_flush
+        os.makedirs(shard_dir, exist_ok=True)
+
+        self._shard_id = self._next_shard_id()
+        self._tar = None
+        self._in_shard = 0
+        self._buffer: List[Tuple[str, bytes, str, dict]] = []
+        self._keys = set(e['key'] for e in load_index(shard_dir))
+        self.written = 0
+        self.skipped = 0
+
+    def _next_shard_id(self) -> int:
+        ids = [
+            int(f[len("shard-"):-len(".tar")])
+            for f in os.listdir(self.shard_dir)
+            if f.startswith("shard-") and f.endswith(".tar")
+        ]
+        return max(ids) + 1 if ids else 0
+
+    def add(self, key: str, image_bytes: bytes, label: str, meta: Optional[dict] = None):
+        """添加一个样本（重复 key 直接跳过）"""
+        if key in self._keys:
+            self.skipped += 1
+            return
+        self._keys.add(key)
+        self._buffer.append((key, image_bytes, label, meta or {}))
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """将缓冲区中的样本批量写入分片并追加索引"""
+        if not self._buffer:
+            return
+
+        entries = []
+        for key, image_bytes, label, meta in self._buffer:
+            if self._tar is None or self._in_shard >= self.shard_size:
+                self._open_next_shard()
+
+            shard_name = SHARD_PATTERN.format(self._shard_id)
+            offset = self._add_member(key + ".png", image_bytes)
+            self._add_member(key + ".txt", label.encode('utf-8'))
+            self._in_shard += 1
+
+            entry = {
+                'key': key,
+                'shard': shard_name,
+                'offset': offset,
+                'size': len(image_bytes),
+                'label': label,
+            }
+            entry.update(meta)
+            entries.append(entry)
+
+        self._tar.fileobj.flush()
+        with open(os.path.join(self.shard_dir, INDEX_FILE), 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        self.written += len(entries)
+        self._buffer = []
+        if self.on_flush is not None:
+            self.on_flush(entries)
+
+    def _open_next_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._shard_id += 1
+        path = os.path.join(self.shard_dir, SHARD_PATTERN.format(self._shard_id))
+        self._tar = tarfile.open(path, 'w')
+        self._in_shard = 0
+
+    def _add_member(self, name: str, data: bytes) -> int:
+        """写入一个 tar 成员，返回数据区在分片文件中的偏移量"""
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        # 写入模式下 tarfile 不记录 offset_data，数据区按 512 字节块对齐位于末尾
+        padded = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        return self._tar.offset - padded
+
+    def close(self):
+        self.flush()
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_index(shard_dir: str = SHARD_DIR) -> List[dict]:
+    """读取分片索引（不存在时返回空列表）"""
+    path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+class ShardReader:
+    """
+    分片随机读取器
+
+    通过索引中的 (shard, offset, size) 直接从 mmap 中切片读取图像字节，
+    每个分片只打开一次。
+    """
+
+    def __init__(self, shard_dir: str = SHARD_DIR, entries: Optional[List[dict]] = None):
+        self.shard_dir = shard_dir
+        self.entries = entries if entries is not None else load_index(shard_dir)
+        self._by_key = {e['key']: e for e in self.entries}
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._files = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def get(self, key: str) -> dict:
+        return self._by_key[key]
+
+    def read_image(self, entry) -> bytes:
+        """读取样本的 PNG 字节（entry 可以是索引条目或 key）"""
+        if isinstance(entry, str):
+            entry = self._by_key[entry]
+        mm = self._maps.get(entry['shard'])
+        if mm is None:
+            f = open(os.path.join(self.shard_dir, entry['shard']), 'rb')
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._files[entry['shard']] = f
+            self._maps[entry['shard']] = mm
+        return mm[entry['offset']:entry['offset'] + entry['size']]
+
+    def close(self):
+        for mm in self._maps.values():
+            mm.close()
+        for f in self._files.values():
+            f.close()
+        self._maps.clear()
+        self._files.clear()
+
+    def __getstate__(self):
+        # DataLoader 多进程时 mmap 不能被 pickle，子进程中重新打开
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        state['_files'] = {}
+        return state
+
+
+def split_of(key: str, train_ratio: float = 0.8, seed: int = 0) -> str:
+    """按 key 的哈希确定性地分配 train/val，同一样本在多次运行中归属不变"""
+    digest = hashlib.md5(f"{seed}:{key}".encode('utf-8')).digest()
+    bucket = int.from_bytes(digest[:8], 'big') / float(1 << 64)
+    return 'train' if bucket < train_ratio else 'val'
+
+
+def split_index(
+    entries: Iterable[dict],
+    train_ratio: float = 0.8,
+    seed: int = 0,
+) -> Dict[str, List[str]]:
+    """将索引划分为 train/val 的 key 列表"""
+    splits = {'train': [], 'val': []}
+    for e in entries:
+        splits[split_of(e['key'], train_ratio, seed)].append(e['key'])
+    return splits
+
+
+def write_split_files(shard_dir: str, splits: Dict[str, List[str]]) -> Dict[str, str]:
+    """将 key 列表写入 {split}.keys，返回各 split 的文件名（相对 shard_dir）"""
+    names = {}
+    for split, keys in splits.items():
+        name = f"{split}.keys"
+        with open(os.path.join(shard_dir, name), 'w') as f:
+            f.write("\n".join(keys) + ("\n" if keys else ""))
+        names[split] = name
+    return names
+
+
+def parse_label(label: str) -> Tuple[List[int], List[List[float]]]:
+    """解析 YOLO 标签文本，返回 (类别列表, [cx, cy, w, h] 列表)"""
+    classes, boxes = [], []
+    for line in label.splitlines():
+        parts = line.split()
+        if len(parts) != 5:
+            continue
+        classes.append(int(parts[0]))
+        boxes.append([float(v) for v in parts[1:]])
+    return classes, boxes
+
+
+# ============================================================
+# ultralytics 集成（仅在训练时导入）
+# ============================================================
+
+def _build_shard_classes():
+    """延迟构建依赖 ultralytics 的类，避免生成数据时导入 torch"""
+    import math
+    from copy import copy
+
+    import cv2
+    import numpy as np
+    from ultralytics.data.dataset import YOLODataset
+    from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+    from ultralytics.utils.torch_utils import de_parallel
+
+    class ShardYOLODataset(YOLODataset):
+        """直接从 tar 分片读取图像与标签的 YOLO 数据集"""
+
+        def __init__(self, *args, **kwargs):
+            # get_img_files/get_labels 在父类 __init__ 中被调用，需要先准备好 reader
+            self._keys_file = kwargs.get('img_path')
+            self._shard_dir = os.path.dirname(os.path.abspath(self._keys_file))
+            self._reader = ShardReader(self._shard_dir)
+            super().__init__(*args, **kwargs)
+
+        def _virtual_path(self, key: str) -> str:
+            return os.path.join(self._shard_dir, 'images', key + '.png')
+
+        def get_img_files(self, img_path):
+            with open(img_path) as f:
+                keys = [k.strip() for k in f if k.strip()]
+            self._keys = [k for k in keys if k in self._reader._by_key]
+            if not self._keys:
+                raise FileNotFoundError(f"{self.prefix}No shard samples found in {img_path}")
+            if self.fraction < 1:
+                self._keys = self._keys[: round(len(self._keys) * self.fraction)]
+            return [self._virtual_path(k) for k in self._keys]
+
+        def get_labels(self):
+            labels = []
+            for key, im_file in zip(self._keys, self.im_files):
+                entry = self._reader.get(key)
+                classes, boxes = parse_label(entry.get('label', ''))
+                labels.append({
+                    'im_file': im_file,
+                    'shape': (entry.get('height', 640), entry.get('width', 640)),
+                    'cls': np.array(classes, dtype=np.float32).reshape(-1, 1),
+                    'bboxes': np.array(boxes, dtype=np.float32).reshape(-1, 4),
+                    'segments': [],
+                    'keypoints': None,
+                    'normalized': True,
+                    'bbox_format': 'xywh',
+                })
+            return labels
+
+        def load_image(self, i, rect_mode=True):
+            """从分片解码图像（mosaic 已禁用，不维护增强缓冲区）"""
+            if self.ims[i] is not None:
+                return self.ims[i], self.im_hw0[i], self.im_hw[i]
+
+            data = self._reader.read_image(self._keys[i])
+            im = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if im is None:
+                raise FileNotFoundError(f"Image decode failed for shard sample {self._keys[i]}")
+            h0, w0 = im.shape[:2]
+            if rect_mode:
+                r = self.imgsz / max(h0, w0)
+                if r != 1:
+                    w, h = (min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz))
+                    im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+            elif not (h0 == w0 == self.imgsz):
+                im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+            return im, (h0, w0), im.shape[:2]
+
+        def cache_images_to_disk(self, i):
+            # 分片本身就是磁盘缓存，无需再写 .npy
+            pass
+
+    def _build(cfg, img_path, batch, data, mode, stride):
+        return ShardYOLODataset(
+            img_path=img_path,
+            imgsz=cfg.imgsz,
+            batch_size=batch,
+            augment=mode == 'train',
+            hyp=cfg,
+            rect=cfg.rect or mode == 'val',
+            cache=cfg.cache if cfg.cache != 'disk' else None,
+            single_cls=cfg.single_cls or False,
+            stride=int(stride),
+            pad=0.0 if mode == 'train' else 0.5,
+            prefix=f"{mode}: ",
+            task=cfg.task,
+            classes=cfg.classes,
+            data=data,
+            fraction=cfg.fraction if mode == 'train' else 1.0,
+        )
+
+    class ShardDetectionValidator(DetectionValidator):
+        def build_dataset(self, img_path, mode='val', batch=None):
+            return _build(self.args, img_path, batch, self.data, mode, self.stride)
+
+    class ShardDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode='train', batch=None):
+            gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+            return _build(self.args, img_path, batch, self.data, mode, gs)
+
+        def get_validator(self):
+            self.loss_names = "box_loss", "cls_loss", "dfl_loss"
+            return ShardDetectionValidator(
+                self.test_loader, save_dir=self.save_dir,
+                args=copy(self.args), _callbacks=self.callbacks,
+            )
+
+    return ShardYOLODataset, ShardDetectionTrainer
+
+
+def get_shard_trainer():
+    """返回可传给 YOLO.train(trainer=...) 的分片训练器类"""
+    return _build_shard_classes()[1]
+
+
+def is_shard_dataset(yaml_path: str) -> bool:
+    """判断 dataset.yaml 是否描述的是分片数据集"""
+    import yaml
+    with open(yaml_path) as f:
+        cfg = yaml.safe_load(f) or {}
+    return bool(cfg.get('shards'))
+
+
+if __name__ == "__main__":
+    # 简单测试：写入 -> 读取 -> 划分
+    import tempfile
+
+    print("Shard Dataset - Test")
+    tmp = tempfile.mkdtemp()
+    with ShardWriter(tmp, shard_size=3, flush_every=2) as w:
+        for i in range(7):
+            w.add(f"TEST_LONG_{i:04d}", f"png-bytes-{i}".encode(), f"0 0.5 0.5 0.2 0.{i + 1}",
+                  {'symbol': 'TEST', 'type': 'LONG'})
+    reader = ShardReader(tmp)
+    print(f"Shards: {sorted(f for f in os.listdir(tmp) if f.endswith('.tar'))}")
+    print(f"Samples: {len(reader)}, first: {reader.read_image(reader.entries[0]['key'])}")
+    splits = split_index(reader.entries)
+    print(f"Split: train={len(splits['train'])}, val={len(splits['val'])}")
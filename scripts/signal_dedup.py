@@ -0,0 +1,114 @@
+"""
+Signal Dedup - 渲染前折叠近似重复的信号
+
+--stride 1 时连续多根K线常常都满足信号条件（例如 breakout_above_range 持续成立），
+渲染出来的是一串只平移了一根K线的几乎相同的图。这里在渲染前把信号聚类，每簇只保留一个代表：
+
+1. 同一交易对、同一方向、相邻信号间隔不超过 max_gap 根K线 -> 同一簇
+2. 可选：再要求与簇首信号的归一化窗口足够相似（按时间对齐后的收盘价/均线形状距离），
+   形态已经明显变化的信号单独成簇
+3. 代表选择策略：first（最早，最及时） / last / strongest（|osc| 最大） / middle
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from chart_generator import ChartData, stack_chart_columns, COL
+
+DEDUP_POLICIES = ('first', 'last', 'strongest', 'middle')
+
+# 相似度比较使用的列（与图上可见的线一致）
+_SHAPE_COLS = [COL[c] for c in ('close', 'SMA20', 'SMA60', 'SMA120')]
+
+
+@dataclass
+class DedupConfig:
+    """信号去重参数"""
+    max_gap: int = 3                      # 同簇相邻信号的最大间隔（根K线），0 表示不去重
+    policy: str = 'first'                 # 代表选择策略
+    max_distance: Optional[float] = None  # 归一化窗口距离阈值（None 表示只按时间聚类）
+    window_size: int = 60                 # 计算相似度的窗口大小（与渲染窗口一致）
+
+
+def _normalized_window(data: np.ndarray, end: int, window_size: int) -> np.ndarray:
+    """取 [end - window_size + 1, end] 的形状列，并按窗口自身的价格范围归一化（与图表 y 轴一致）"""
+    window = data[max(0, end - window_size + 1): end + 1][:, _SHAPE_COLS]
+    lo, hi = np.nanmin(window), np.nanmax(window)
+    return (window - lo) / (hi - lo) if hi > lo else np.zeros_like(window)
+
+
+def window_distance(data: np.ndarray, end_a: int, end_b: int, window_size: int) -> float:
+    """
+    两个窗口按时间对齐后重叠部分的平均绝对差（各自归一化后）
+
+    两个窗口平移 k 根K线时，渲染图中相同K线的位置也平移 k，
+    比较的是同一批K线在两张图中的相对高度是否一致；无重叠时返回 inf。
+    """
+    if end_a > end_b:
+        end_a, end_b = end_b, end_a
+    shift = end_b - end_a
+    if shift >= window_size:
+        return float('inf')
+    a = _normalized_window(data, end_a, window_size)
+    b = _normalized_window(data, end_b, window_size)
+    overlap = min(len(a) - shift, len(b))
+    if overlap <= 0:
+        return float('inf')
+    diff = np.abs(a[shift:shift + overlap] - b[:overlap])
+    return float(np.nanmean(diff)) if np.isfinite(diff).any() else float('inf')
+
+
+def _pick(cluster: List[int], signals: List[dict], policy: str, osc: Optional[np.ndarray]) -> int:
+    if policy == 'first':
+        return cluster[0]
+    if policy == 'last':
+        return cluster[-1]
+    if policy == 'middle':
+        return cluster[len(cluster) // 2]
+    # strongest: 动能绝对值最大（并列时取最早）
+    strength = [abs(osc[signals[i]['df_index']]) if osc is not None else 0.0 for i in cluster]
+    return cluster[int(np.nanargmax(strength))] if np.isfinite(strength).any() else cluster[0]
+
+
+def dedup_signals(signals: List[dict], df: ChartData, config: DedupConfig = None) -> List[int]:
+    """
+    对单个交易对的信号列表聚类，返回保留下来的信号下标（升序）
+
+    每个信号会被写入 'cluster' 字段（簇编号）；signals 需按 df_index 升序（sliding_window_detect 的输出即是）。
+    df: 已计算指标的 DataFrame（strongest 策略需要 osc 列）或 stack_chart_columns 数组
+    """
+    config = config or DedupConfig()
+    if config.policy not in DEDUP_POLICIES:
+        raise ValueError(f"未知的去重策略: {config.policy} (可选: {', '.join(DEDUP_POLICIES)})")
+    if config.max_gap <= 0:
+        for i, sig in enumerate(signals):
+            sig['cluster'] = i
+        return list(range(len(signals)))
+
+    data = stack_chart_columns(df) if config.max_distance is not None else None
+    osc = df['osc'].to_numpy(dtype=float) if config.policy == 'strongest' and hasattr(df, 'columns') \
+        and 'osc' in df.columns else None
+
+    # 按方向分别追踪当前簇：LONG 与 SHORT 交替出现时互不打断
+    clusters: List[List[int]] = []
+    open_cluster = {}  # type -> clusters 中的下标
+    for i, sig in enumerate(signals):
+        c = open_cluster.get(sig['type'])
+        if c is not None:
+            members = clusters[c]
+            last = signals[members[-1]]['df_index']
+            same = sig['df_index'] - last <= config.max_gap
+            if same and data is not None:
+                anchor = signals[members[0]]['df_index']
+                same = window_distance(data, anchor, sig['df_index'], config.window_size) <= config.max_distance
+            if same:
+                members.append(i)
+                sig['cluster'] = c
+                continue
+        open_cluster[sig['type']] = len(clusters)
+        sig['cluster'] = len(clusters)
+        clusters.append([i])
+
+    return sorted(_pick(members, signals, config.policy, osc) for members in clusters)
@@ -0,0 +1,271 @@
+"""
+Signal Store - 只追加的信号库 (SQLite)
+
+sliding_window_signal.py 检测到的每个信号写入一行，下游评估/数据集工具直接查询，无需重新检测：
+- symbol / bar / ts (毫秒时间戳) / type (LONG / SHORT) / close / df_index / cluster
+- config_hash: SignalConfig 的哈希（同一根K线在不同参数下的信号分别保存）
+- snapshot: 信号K线的指标快照 (均线、osc、交叉/突破/排列状态)，JSON 文本
+- source: 写入来源 (sliding_window / live_scanner ...)
+
+(symbol, bar, ts, type, config_hash) 为主键，重复运行时 INSERT OR IGNORE，保留第一次记录；
+主键本身即按 symbol + 时间的范围索引，另建 ts 与 config_hash 索引。
+
+用法：
+    python scripts/signal_store.py                                    # 按 symbol / 方向汇总
+    python scripts/signal_store.py --symbol BTC-USDT-SWAP --since 2024-06-01 --type LONG
+    python scripts/signal_store.py --since 2024-06-01 --export-json reports/signals.json
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sample_index import config_hash, to_ms
+
+# =================配置=================
+SIGNAL_DB = "data/signals.db"
+DEFAULT_FLUSH_EVERY = 500
+# =====================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    symbol       TEXT NOT NULL,
+    bar          TEXT NOT NULL,
+    ts           INTEGER NOT NULL,
+    type         TEXT NOT NULL,
+    config_hash  TEXT NOT NULL,
+    close        REAL,
+    osc          REAL,
+    df_index     INTEGER,
+    cluster      INTEGER,
+    snapshot     TEXT,
+    source       TEXT,
+    created_at   REAL,
+    PRIMARY KEY (symbol, bar, ts, type, config_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_signals_ts ON signals (ts);
+CREATE INDEX IF NOT EXISTS idx_signals_config ON signals (config_hash);
+"""
+
+COLUMNS = ('symbol', 'bar', 'ts', 'type', 'config_hash', 'close', 'osc', 'df_index', 'cluster',
+           'snapshot', 'source', 'created_at')
+
+# 信号K线的指标快照列（calculate_indicators + calculate_stateful_signals 的输出）
+SNAPSHOT_COLUMNS = (
+    'SMA20', 'SMA60', 'SMA120', 'EMA20', 'EMA60', 'EMA120', 'osc',
+    'cross_up_1', 'cross_dn_1', 'adhesion_breakout_up', 'adhesion_breakout_down',
+    'breakout_above_range', 'breakout_below_range', 'is_bullish_alignment', 'is_bearish_alignment',
+)
+
+
+def signal_config_hash(signal_config) -> str:
+    """信号库使用的参数哈希：只取决于 SignalConfig（与绘图参数无关）"""
+    return config_hash(signal_config)
+
+
+def indicator_snapshot(df: pd.DataFrame, idx: int) -> dict:
+    """取第 idx 根K线的指标快照（NaN 记为 None，bool 保持 bool）"""
+    snapshot = {}
+    for col in SNAPSHOT_COLUMNS:
+        if col not in df.columns:
+            continue
+        value = df[col].iloc[idx]
+        if isinstance(value, (bool, np.bool_)):
+            snapshot[col] = bool(value)
+        elif pd.isna(value):
+            snapshot[col] = None
+        else:
+            snapshot[col] = float(value)
+    return snapshot
+
+
+class SignalStore:
+    """信号库（写入缓冲 + 批量事务提交，只追加）"""
+
+    def __init__(self, db_path: str = SIGNAL_DB, flush_every: int = DEFAULT_FLUSH_EVERY):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._buffer: List[tuple] = []
+        self.inserted = 0
+        self.duplicates = 0
+
+    def add(self, symbol: str, bar: str, signal_info: dict, cfg_hash: str,
+            snapshot: Optional[dict] = None, source: str = 'sliding_window', ts: Optional[int] = None):
+        """记录一个信号（signal_info 为 sliding_window_detect 输出的字典；ts 缺省时从其 timestamp 解析）"""
+        snapshot = snapshot or {}
+        rec = {
+            'symbol': symbol,
+            'bar': bar,
+            'ts': ts if ts is not None else to_ms(signal_info['timestamp']),
+            'type': signal_info['type'],
+            'config_hash': cfg_hash,
+            'close': signal_info.get('close'),
+            'osc': snapshot.get('osc'),
+            'df_index': signal_info.get('df_index'),
+            'cluster': signal_info.get('cluster'),
+            'snapshot': json.dumps(snapshot) if snapshot else None,
+            'source': source,
+            'created_at': datetime.now().timestamp(),
+        }
+        self._buffer.append(tuple(rec[c] for c in COLUMNS))
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> int:
+        """提交缓冲区，返回新写入的行数（已存在的信号被忽略）"""
+        if not self._buffer:
+            return 0
+        placeholders = ", ".join("?" * len(COLUMNS))
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO signals ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                self._buffer,
+            )
+        inserted = self.conn.total_changes - before
+        self.inserted += inserted
+        self.duplicates += len(self._buffer) - inserted
+        self._buffer = []
+        return inserted
+
+    def _where(self, symbols=None, bar=None, start=None, end=None, signal_type=None, config=None):
+        clauses, params = [], []
+        if symbols:
+            clauses.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+            params.extend(symbols)
+        if bar is not None:
+            clauses.append("bar = ?")
+            params.append(bar)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_ms(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(to_ms(end))
+        if signal_type is not None:
+            clauses.append("type = ?")
+            params.append(signal_type)
+        if config is not None:
+            clauses.append("config_hash = ?")
+            params.append(config)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[dict]:
+        """
+        按条件查询信号（按 symbol, ts 排序），snapshot 解析为字典
+
+        filters: symbols, bar, start, end, signal_type, config
+        """
+        self.flush()
+        where, params = self._where(**filters)
+        sql = f"SELECT * FROM signals{where} ORDER BY symbol, ts"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        rows = []
+        for r in self.conn.execute(sql, params):
+            row = dict(r)
+            row['snapshot'] = json.loads(row['snapshot']) if row['snapshot'] else {}
+            rows.append(row)
+        return rows
+
+    def to_frame(self, **filters) -> pd.DataFrame:
+        """查询结果转 DataFrame（快照列展开），供评估脚本使用"""
+        rows = self.query(**filters)
+        if not rows:
+            return pd.DataFrame(columns=[c for c in COLUMNS if c != 'snapshot'])
+        df = pd.DataFrame(rows).drop(columns=['snapshot'])
+        snap = pd.DataFrame([r['snapshot'] for r in rows]).drop(columns=['osc'], errors='ignore')
+        df = pd.concat([df, snap], axis=1)
+        df['datetime'] = pd.to_datetime(df['ts'], unit='ms')
+        return df
+
+    def count(self, **filters) -> int:
+        self.flush()
+        where, params = self._where(**filters)
+        return self.conn.execute(f"SELECT COUNT(*) FROM signals{where}", params).fetchone()[0]
+
+    def latest_ts(self, symbol: str, bar: str, config: Optional[str] = None) -> Optional[int]:
+        """某交易对已入库的最新信号时间（增量检测时可从此处继续）"""
+        self.flush()
+        where, params = self._where(symbols=[symbol], bar=bar, config=config)
+        return self.conn.execute(f"SELECT MAX(ts) FROM signals{where}", params).fetchone()[0]
+
+    def stats(self) -> List[dict]:
+        """按 symbol / bar / 方向汇总信号数"""
+        self.flush()
+        sql = ("SELECT symbol, bar, type, COUNT(*) AS n, MIN(ts) AS first_ts, MAX(ts) AS last_ts "
+               "FROM signals GROUP BY symbol, bar, type ORDER BY n DESC")
+        return [dict(r) for r in self.conn.execute(sql)]
+
+    def summary(self) -> str:
+        return f"新增 {self.inserted} 条, 已存在 {self.duplicates} 条 ({self.db_path})"
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fmt_ts(ts: Optional[int]) -> str:
+    return pd.to_datetime(ts, unit='ms').strftime('%Y-%m-%d %H:%M') if ts is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="信号库查询")
+    parser.add_argument('--db', type=str, default=SIGNAL_DB, help=f'信号库 (default: {SIGNAL_DB})')
+    parser.add_argument('--symbol', action='append', default=None, help='交易对 (可重复)')
+    parser.add_argument('--bar', type=str, default=None, help='K线周期')
+    parser.add_argument('--since', type=str, default=None, help='起始时间 (含)，如 2024-01-01')
+    parser.add_argument('--until', type=str, default=None, help='结束时间 (不含)')
+    parser.add_argument('--type', dest='signal_type', choices=['LONG', 'SHORT'], default=None, help='信号方向')
+    parser.add_argument('--config', type=str, default=None, help='config_hash')
+    parser.add_argument('--limit', type=int, default=20, help='最多打印多少条')
+    parser.add_argument('--export-json', type=str, default=None, help='把查询结果导出为 JSON')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ 信号库不存在: {args.db}")
+        return
+
+    filters = dict(symbols=args.symbol, bar=args.bar, start=args.since, end=args.until,
+                   signal_type=args.signal_type, config=args.config)
+    with SignalStore(args.db) as store:
+        if not any(v is not None for v in filters.values()) and not args.export_json:
+            print(f"📊 信号库: {args.db}")
+            for row in store.stats():
+                print(f"   {row['symbol']:18} {row['bar']:5} {row['type']:5} {row['n']:7d} 条  "
+                      f"{_fmt_ts(row['first_ts'])} ~ {_fmt_ts(row['last_ts'])}")
+            return
+
+        print(f"🔎 匹配 {store.count(**filters)} 条")
+        if args.export_json:
+            rows = store.query(**filters)
+            os.makedirs(os.path.dirname(os.path.abspath(args.export_json)), exist_ok=True)
+            with open(args.export_json, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+            print(f"💾 已导出 {len(rows)} 条: {args.export_json}")
+            return
+        for row in store.query(limit=args.limit, **filters):
+            print(f"   {row['symbol']:18} {row['bar']:5} {_fmt_ts(row['ts'])} {row['type']:5} "
+                  f"close={row['close']:.6g} osc={row['osc'] if row['osc'] is None else round(row['osc'], 1)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,13 @@ Sliding Window Signal Detection - 滑动窗口信号检测与图像生成
 4. 生成标准化图像（信号点在最右侧）
 """
 
+import io
 import os
 import sys
 import argparse
 import json
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Iterable, Iterator, List, Tuple, Optional
 
 import pandas as pd
 import numpy as np
@@ -21,9 +22,16 @@ import numpy as np
 # 添加脚本目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from okx_utils import fetch_candles, get_top_volume_pairs
-from pine_signal_detector import PineSignalDetector, SignalConfig, detect_signals_in_window
-from chart_generator import ChartGenerator, ChartConfig, find_adhesion_region
+from okx_utils import fetch_candles, get_top_volume_pairs, bar_to_seconds, iter_candles
+from pine_signal_detector import PineSignalDetector, SignalConfig, detect_signals_in_window, SIGNALS_TOTAL
+from chart_generator import ChartGenerator, ChartConfig, ChartData, find_adhesion_region, stack_chart_columns, chart_windows, CHART_VARIANTS, RENDER_QUEUE_DEPTH
+from shard_dataset import ShardWriter, SHARD_DIR
+from render_cache import RenderCache, render_key, RENDER_CACHE_DIR
+from sample_index import SampleIndex, SAMPLE_DB, config_hash, to_ms, backfill_from_shards
+from signal_dedup import DedupConfig, DEDUP_POLICIES, dedup_signals
+from signal_store import SignalStore, SIGNAL_DB, signal_config_hash, indicator_snapshot
+from mtf_confluence import ConfluenceConfig, ConfluenceFilter, parse_timeframes
+from detect_checkpoint import DetectCheckpoint, CHECKPOINT_DB, CHECKPOINT_LAG, TAIL_MARGIN, checkpoint_key, continues_from, resume_frame, replay_state, warmup_bars, MemoryCheckpoint
 
 
 # ============================================================
@@ -53,6 +61,15 @@ def sliding_window_detect(
     stride: int = DEFAULT_STRIDE,
     signal_config: SignalConfig = None,
     dry_run: bool = False,
+    shard_writer: Optional[ShardWriter] = None,
+    render_cache: Optional[RenderCache] = None,
+    sample_index: Optional[SampleIndex] = None,
+    bar: str = DEFAULT_BAR,
+    dedup: Optional[DedupConfig] = None,
+    chart_config: Optional[ChartConfig] = None,
+    signal_store: Optional[SignalStore] = None,
+    checkpoint: Optional[DetectCheckpoint] = None,
+    confluence: Optional[ConfluenceConfig] = None,
 ) -> List[dict]:
     """
     滑动窗口信号检测
@@ -64,42 +81,135 @@ def sliding_window_detect(
         stride: 滑动步长
         signal_config: 信号检测配置
         dry_run: 如果为 True，只输出信号时间戳，不生成图像
+        shard_writer: 如果提供，图像和标签写入 tar 分片而不是零散文件
+        render_cache: 如果提供，窗口内容相同的图表直接复用缓存图像
+        sample_index: 如果提供，每个写出的样本同步记录到样本索引
+        bar: K线周期（记录到样本元数据中）
+        dedup: 如果提供，渲染前把相邻的近似重复信号聚成一簇，每簇只渲染一个代表
+        chart_config: 图表配置（紧凑变体使用更小的画布）
+        signal_store: 如果提供，每个信号连同指标快照写入信号库（重复运行自动去重）
+        checkpoint: 如果提供 (DetectCheckpoint / MemoryCheckpoint)，从上次的检查点继续，只检测/渲染新K线上的信号（df 只需包含检查点之后的K线），
+            结束时保存新的检查点；返回信号的 df_index 为相对首次运行数据起点的绝对索引
+        confluence: 如果提供，信号还需高周期（由本周期K线重采样，无未来数据）的均线排列同向；
+            高周期指标需要完整历史，不能与 checkpoint 同时使用
     
     Returns:
         检测到的信号列表
     """
+    if confluence is not None and checkpoint is not None:
+        raise ValueError("多周期共振需要完整历史，不能与检查点/分块检测同时使用")
     setup_dirs()
     
     detector = PineSignalDetector(signal_config or SignalConfig())
-    chart_gen = ChartGenerator()
+    chart_gen = ChartGenerator(chart_config)
+    cfg_hash = config_hash(detector.config, chart_gen.config, window_size=window_size)
     
     signals = []
-    n = len(df)
-    
-    # 先在整个数据上计算所有指标
-    print(f"📊 预计算指标...")
-    df = detector.calculate_indicators(df)
-    df = detector.calculate_stateful_signals(df)
     
     # 需要足够的数据来计算 SMA120
     min_start = max(120, window_size)
     
+    # offset: df 第 0 行在完整历史中的位置；scan_from: 第一根未处理的K线
+    offset, scan_from, snapshot = 0, min_start, None
+    ckpt_key = checkpoint_key(detector.config, chart_gen.config, window_size, stride)
+    state = checkpoint.load(symbol, bar, ckpt_key) if checkpoint is not None else None
+    had_checkpoint = state is not None
+    if state is not None and not continues_from(state, df):
+        print(f"   ⚠️ 新数据与检查点之间有缺口，全量检测")
+        state = None
+    if state is not None:
+        # 检查点尾部 + 新K线，逐K线推进指标状态
+        df, offset, first_new, snapshot = resume_frame(detector, state, df)
+        print(f"⏩ 从检查点继续: 新增 {len(df) - first_new} 根K线 (已处理到 #{state['abs_index']})")
+        scan_from = max(first_new, min_start - offset)
+        scan_from += (min_start - offset - scan_from) % stride  # 与全量运行的步长对齐
+    else:
+        # 先在整个数据上计算所有指标
+        print(f"📊 预计算指标...")
+        df = detector.calculate_indicators(df)
+        df = detector.calculate_stateful_signals(df)
+    n = len(df)
+    
     print(f"📊 开始滑动窗口检测...")
     print(f"   数据总长度: {n}")
     print(f"   窗口大小: {window_size}")
     print(f"   滑动步长: {stride}")
-    print(f"   检测范围: {min_start} - {n}")
+    print(f"   检测范围: {offset + scan_from} - {offset + n}")
+    
+    # 一次性计算所有K线的最终信号（与逐行 check_signal 一致）
+    long_mask, short_mask = detector.check_signals_vectorized(df)
+    if confluence is not None:
+        raw_count = int(long_mask.sum() + short_mask.sum())
+        long_mask, short_mask = ConfluenceFilter(detector, bar, confluence).apply(df, long_mask, short_mask)
+        print(f"   多周期共振 ({'/'.join(confluence.timeframes)}): {raw_count} -> {int(long_mask.sum() + short_mask.sum())} 个候选")
+    signals, signal_timestamps = scan_signals(df, long_mask, short_mask, scan_from, stride)
+    
+    if not dry_run:
+        render_signals(df, signals, signal_timestamps, chart_gen, symbol, window_size, dedup=dedup,
+                       shard_writer=shard_writer, render_cache=render_cache, sample_index=sample_index,
+                       bar=bar, cfg_hash=cfg_hash)
+    
+    # 写入信号库（放在去重之后，记录 cluster）
+    if signal_store is not None and signals:
+        store_hash = signal_config_hash(detector.config)
+        ts_col = df['timestamp'].to_numpy() if 'timestamp' in df.columns else None
+        for sig in signals:
+            idx = sig['df_index']
+            signal_store.add(symbol, bar, dict(sig, df_index=offset + idx), store_hash,
+                             snapshot=indicator_snapshot(df, idx),
+                             ts=int(ts_col[idx]) if ts_col is not None else None)
+    
+    # 保存检查点：停在最后一根可出图的K线，之后的K线（含未收盘K线）下次重新处理
+    # dry_run 没有生成图像，不推进持久化检查点（否则下次增量运行会跳过这些信号的渲染）；
+    # 分块检测的进程内 MemoryCheckpoint 仍需逐块衔接
+    if checkpoint is not None and dry_run and not isinstance(checkpoint, MemoryCheckpoint):
+        print(f"   Dry Run: 不更新检查点")
+    elif checkpoint is not None:
+        upto = n - 1 - CHECKPOINT_LAG
+        if state is None and had_checkpoint and upto < max(min_start, warmup_bars(detector.config)):
+            # 有缺口且数据不足以预热指标：保存会用几根K线的状态覆盖有效的检查点，之后的续算与全量结果不一致
+            print(f"   ⚠️ 数据太短 ({n} 根)，保留原检查点")
+        elif state is None:
+            snapshot = replay_state(detector, df, upto)
+        if snapshot is not None:
+            checkpoint.save(symbol, bar, ckpt_key, df, upto, offset, snapshot,
+                            max(window_size, warmup_bars(detector.config)) + TAIL_MARGIN)
+            print(f"📍 检查点: 已处理到 #{offset + upto} ({df['datetime'].iloc[upto] if 'datetime' in df.columns else upto})")
+    
+    for sig in signals:
+        sig['df_index'] += offset
     
+    print(f"\n✅ 检测完成！共发现 {len(signals)} 个信号")
+    return signals
+
+
+def scan_signals(
+    df: pd.DataFrame,
+    long_mask: np.ndarray,
+    short_mask: np.ndarray,
+    scan_from: int,
+    stride: int = DEFAULT_STRIDE,
+) -> Tuple[List[dict], list]:
+    """
+    按步长扫描信号掩码（df 已计算指标），跳过 SMA120 尚未就绪的K线
+    
+    Returns:
+        (信号列表, 对应的K线时间)
+    """
+    signals = []
+    signal_timestamps = []
     detected_count = 0
+    n = len(df)
+    sma120_ready = df['SMA120'].notna().to_numpy()
     
     # 遍历每个K线索引，检查信号
-    for current_idx in range(min_start, n, stride):
+    for current_idx in range(scan_from, n, stride):
         
         # 确保有足够数据
-        if pd.isna(df['SMA120'].iloc[current_idx]):
+        if not sma120_ready[current_idx]:
             continue
         
-        is_long, is_short = detector.check_signal(df, current_idx)
+        is_long, is_short = long_mask[current_idx], short_mask[current_idx]
         
         if is_long or is_short:
             signal_type = 'LONG' if is_long else 'SHORT'
@@ -118,40 +228,158 @@ def sliding_window_detect(
             }
             
             signals.append(signal_info)
+            signal_timestamps.append(timestamp)
             detected_count += 1
+            SIGNALS_TOTAL.inc(type=signal_type)
             
             # 进度输出
             if detected_count % 10 == 0:
                 print(f"   已检测到 {detected_count} 个信号...")
-            
-            if not dry_run:
-                # 提取窗口数据用于图像生成
-                # 信号K线之后的第2根K线作为图片最右边
-                # signal at current_idx, chart ends at current_idx + 2
-                chart_end_idx = current_idx + 2
-                if chart_end_idx >= len(df):
-                    continue  # 数据不够，跳过
-                start_idx = max(0, chart_end_idx - window_size + 1)
-                window_df = df.iloc[start_idx:chart_end_idx + 1].copy()
-                
-                # 生成图像
-                _save_signal_chart(window_df, signal_type, timestamp, chart_gen, symbol)
     
-    print(f"\n✅ 检测完成！共发现 {len(signals)} 个信号")
-    return signals
+    return signals, signal_timestamps
+
+
+def render_signals(
+    df: pd.DataFrame,
+    signals: List[dict],
+    signal_timestamps: list,
+    chart_gen: ChartGenerator,
+    symbol: str = "UNKNOWN",
+    window_size: int = DEFAULT_WINDOW_SIZE,
+    dedup: Optional[DedupConfig] = None,
+    shard_writer: Optional[ShardWriter] = None,
+    render_cache: Optional[RenderCache] = None,
+    sample_index: Optional[SampleIndex] = None,
+    bar: str = DEFAULT_BAR,
+    cfg_hash: Optional[str] = None,
+) -> int:
+    """为信号批量生成图像和 YOLO 标签（df 已计算指标；dedup 会给信号写入 cluster），返回成功写出的样本数"""
+    n = len(df)
+    
+    # 信号K线之后的第2根K线作为图片最右边
+    # signal at current_idx, chart ends at current_idx + 2，数据不够的信号跳过
+    renderable = [i for i, sig in enumerate(signals) if sig['df_index'] + 2 < n]
+    
+    # 近似重复信号只渲染每簇的代表
+    if dedup is not None and dedup.max_gap > 0:
+        keep = set(dedup_signals(signals, df, dedup))
+        skipped = sum(1 for i in renderable if i not in keep)
+        renderable = [i for i in renderable if i in keep]
+        print(f"🧹 去重: {len(signals)} 个信号聚为 {len({s['cluster'] for s in signals})} 簇，"
+              f"跳过 {skipped} 次渲染 (策略: {dedup.policy})")
+    
+    # 一次性批量生成所有信号的 YOLO 标签
+    labels = chart_gen.generate_yolo_labels_batch(
+        df,
+        [signals[i]['df_index'] for i in renderable],
+        [0 if signals[i]['type'] == 'LONG' else 1 for i in renderable],
+        window_size,
+    )
+    
+    # 绘图列只堆叠一次，每个信号窗口都是其零拷贝视图
+    chart_data = stack_chart_columns(df)
+    windows = chart_windows(chart_data, window_size) if n >= window_size else None
+    
+    saved = 0
+    for done, (i, label) in enumerate(zip(renderable, labels)):
+        RENDER_QUEUE_DEPTH.set(len(renderable) - done)
+        # 提取窗口数据用于图像生成
+        chart_end_idx = signals[i]['df_index'] + 2
+        start_idx = chart_end_idx - window_size + 1
+        window = windows[start_idx] if start_idx >= 0 else chart_data[:chart_end_idx + 1]
+        
+        # 生成图像
+        saved += _save_signal_chart(window, signals[i]['type'], signal_timestamps[i], chart_gen, symbol,
+                                    shard_writer=shard_writer, render_cache=render_cache, label=label,
+                                    sample_index=sample_index, bar=bar, cfg_hash=cfg_hash)
+    RENDER_QUEUE_DEPTH.set(0)
+    return saved
+
+
+def iter_csv_candles(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按块读取K线 CSV（按时间升序，至少含 timestamp(毫秒)/open/high/low/close 列）"""
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        if 'datetime' in chunk.columns:
+            chunk['datetime'] = pd.to_datetime(chunk['datetime'])
+        else:
+            chunk['datetime'] = pd.to_datetime(chunk['timestamp'], unit='ms')
+        yield chunk
+
+
+def rechunk(frames: Iterable[pd.DataFrame], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """把小页（如 OKX 每页 100 根）合并为 chunk_size 根一块"""
+    buf, rows = [], 0
+    for frame in frames:
+        buf.append(frame)
+        rows += len(frame)
+        if rows >= chunk_size:
+            yield pd.concat(buf, ignore_index=True)
+            buf, rows = [], 0
+    if buf:
+        yield pd.concat(buf, ignore_index=True)
+
+
+def chunked_detect(
+    chunks: Iterable[pd.DataFrame],
+    symbol: str = "UNKNOWN",
+    bar: str = DEFAULT_BAR,
+    checkpoint: Optional[DetectCheckpoint] = None,
+    **kwargs,
+) -> List[dict]:
+    """
+    分块检测：K线按块流入，内存占用只取决于块大小，与历史长度无关
+    
+    块之间通过检查点传递逐K线指标状态（均线/EMA/动能缓冲区、粘合状态）以及上一块末尾
+    max(窗口, 指标预热) 根K线，每块只检测/渲染新K线，结果与整段历史一次性检测一致。
+    上一块最后几根尚未处理的K线（信号还不能出图）并入下一块重新处理。
+    
+    Args:
+        chunks: 按时间升序的K线块
+        checkpoint: 默认使用进程内 MemoryCheckpoint；传入 DetectCheckpoint 时从已有检查点继续，结束后可增量续跑
+        kwargs: 透传给 sliding_window_detect（window_size / stride / signal_config / dry_run ...）
+    """
+    checkpoint = checkpoint if checkpoint is not None else MemoryCheckpoint()
+    ckpt_key = checkpoint_key(kwargs.get('signal_config') or SignalConfig(), kwargs.get('chart_config') or ChartConfig(),
+                              kwargs.get('window_size', DEFAULT_WINDOW_SIZE), kwargs.get('stride', DEFAULT_STRIDE))
+    signals, pending = [], []
+    carry = None
+    for block, chunk in enumerate(chunks):
+        if carry is not None and len(carry):
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        print(f"🧱 第 {block + 1} 块: {len(chunk)} 根K线 ({chunk['datetime'].iloc[0]} - {chunk['datetime'].iloc[-1]})")
+        found = sliding_window_detect(chunk, symbol=symbol, bar=bar, checkpoint=checkpoint, **kwargs)
+        state = checkpoint.load(symbol, bar, ckpt_key)
+        if state is None:
+            raise RuntimeError(f"{symbol}: 第 {block + 1} 块之后没有检查点（块太小或逐K线状态校验失败），无法分块检测")
+        # 检查点之后的信号会在下一块中重新检测（届时才能出图），只有最后一块保留它们
+        signals.extend(sig for sig in found if sig['df_index'] <= state['abs_index'])
+        pending = [sig for sig in found if sig['df_index'] > state['abs_index']]
+        carry = chunk[chunk['timestamp'] > state['last_ts']]
+    return signals + pending
 
 
 def _save_signal_chart(
-    window_df: pd.DataFrame,
+    window_df: ChartData,
     signal_type: str,
     timestamp,
     chart_gen: ChartGenerator,
     symbol: str = "UNKNOWN",
+    shard_writer: Optional[ShardWriter] = None,
+    render_cache: Optional[RenderCache] = None,
+    label: Optional[str] = None,
+    sample_index: Optional[SampleIndex] = None,
+    bar: str = DEFAULT_BAR,
+    cfg_hash: Optional[str] = None,
 ) -> bool:
     """
     保存信号对应的图表
     
     关键：信号点位于图片最右侧（window_df 的最后一行就是信号K线）
+    window_df 可以是 DataFrame，也可以是 stack_chart_columns 的零拷贝窗口视图。
+    如果提供了 shard_writer，图像渲染到内存并批量写入分片，不创建零散文件。
+    如果提供了 render_cache，窗口内容命中缓存时跳过渲染。
+    如果提供了 label（批量预计算的 YOLO 标签），不再逐信号计算粘合区。
+    如果提供了 sample_index，零散文件样本在写出后立即记录（分片样本由 ShardWriter 落盘时记录）。
     """
     try:
         # 生成文件名（增加 symbol 前缀防止冲突）
@@ -162,26 +390,61 @@ def _save_signal_chart(
         img_path = os.path.join(IMAGE_DIR, base_name + ".png")
         txt_path = os.path.join(LABEL_DIR, base_name + ".txt")
         
-        # 生成图像
-        chart_gen.generate_chart(
-            window_df,
-            signal_type=signal_type,
-            output_path=img_path,
-            show_signal_marker=True
-        )
-        
-        # 生成 YOLO 标签
-        start_idx, end_idx = find_adhesion_region(window_df)
+        # 生成图像（命中渲染缓存时跳过）
+        cache_key = render_key(window_df, chart_gen.config) if render_cache is not None else None
+        img_bytes = None
+        if shard_writer is not None:
+            img_bytes = render_cache.read(cache_key) if render_cache is not None else None
+            if img_bytes is None:
+                img_buf = io.BytesIO()
+                chart_gen.generate_chart(window_df, signal_type=signal_type,
+                                         output_path=img_buf, show_signal_marker=True)
+                img_bytes = img_buf.getvalue()
+                if render_cache is not None:
+                    render_cache.store_bytes(cache_key, img_bytes)
+        elif render_cache is None or not render_cache.fetch(cache_key, img_path):
+            if render_cache is not None and os.path.lexists(img_path):
+                # 旧文件可能是指向缓存条目的硬链接，原地覆盖会污染缓存
+                os.remove(img_path)
+            chart_gen.generate_chart(
+                window_df,
+                signal_type=signal_type,
+                output_path=img_path,
+                show_signal_marker=True
+            )
+            if render_cache is not None:
+                render_cache.store(cache_key, img_path)
         
         # 确定类别ID (LONG=0, SHORT=1)
         class_id = 0 if signal_type == 'LONG' else 1
         
-        label = chart_gen.generate_yolo_label(window_df, start_idx, end_idx, class_id=class_id)
+        # 生成 YOLO 标签
+        if label is None:
+            start_idx, end_idx = find_adhesion_region(window_df)
+            label = chart_gen.generate_yolo_label(window_df, start_idx, end_idx, class_id=class_id)
+        
+        if shard_writer is not None:
+            cfg = chart_gen.config
+            shard_writer.add(base_name, img_bytes, label + "\n" if label else "", {
+                'symbol': symbol,
+                'type': signal_type,
+                'class_id': class_id,
+                'timestamp': str(timestamp),
+                'bar': bar,
+                'config_hash': cfg_hash,
+                'width': int(cfg.fig_width * cfg.dpi),
+                'height': int(cfg.fig_height * cfg.dpi),
+            })
+            return True
         
         with open(txt_path, 'w') as f:
             if label:
                 f.write(label + "\n")
         
+        if sample_index is not None:
+            sample_index.add(base_name, symbol, label, ts=to_ms(timestamp), bar=bar,
+                             config_hash=cfg_hash, image_path=img_path, label_path=txt_path)
+        
         return True
         
     except Exception as e:
@@ -211,6 +474,32 @@ def main():
                         help='只输出信号时间戳，不生成图像')
     parser.add_argument('--output-json', type=str, default=None,
                         help='将检测结果保存到 JSON 文件')
+    parser.add_argument('--shards', nargs='?', const=SHARD_DIR, default=None,
+                        help=f'将图像和标签写入 tar 分片而不是零散文件 (default: {SHARD_DIR})')
+    parser.add_argument('--render-cache', nargs='?', const=RENDER_CACHE_DIR, default=None,
+                        help=f'启用基于窗口内容的渲染缓存 (default: {RENDER_CACHE_DIR})')
+    parser.add_argument('--render-cache-mb', type=int, default=2048,
+                        help='渲染缓存大小上限 (MB, default: 2048)')
+    parser.add_argument('--dedup-gap', type=int, default=0,
+                        help='同方向信号间隔不超过 N 根K线视为近似重复，每簇只渲染一个 (default: 0 不去重)')
+    parser.add_argument('--dedup-policy', choices=DEDUP_POLICIES, default='first',
+                        help='每簇保留哪个信号 (default: first)')
+    parser.add_argument('--dedup-distance', type=float, default=None,
+                        help='额外要求归一化窗口距离不超过该值才合并 (如 0.02)')
+    parser.add_argument('--sample-index', nargs='?', const=SAMPLE_DB, default=None,
+                        help=f'将样本元数据写入可查询的 SQLite 索引 (default: {SAMPLE_DB})')
+    parser.add_argument('--signal-db', nargs='?', const=SIGNAL_DB, default=None,
+                        help=f'将信号与指标快照写入只追加的信号库，重复运行自动去重 (default: {SIGNAL_DB})')
+    parser.add_argument('--chunk-size', type=int, default=0,
+                        help='分块检测：每次只载入 N 根K线，内存占用与历史长度无关 (default: 0 一次性载入)')
+    parser.add_argument('--csv', type=str, default=None,
+                        help='从K线 CSV 读取 --symbol 的历史 (timestamp/open/high/low/close，按时间升序)')
+    parser.add_argument('--confluence', type=str, default=None,
+                        help='多周期共振：信号需这些高周期的均线排列同向，例如 15m,1H')
+    parser.add_argument('--confluence-min', type=int, default=None,
+                        help='至少几个高周期同向 (default: 全部)')
+    parser.add_argument('--checkpoint', nargs='?', const=CHECKPOINT_DB, default=None,
+                        help=f'增量检测：从检查点继续，只拉取并处理新K线 (default: {CHECKPOINT_DB})')
     
     # 信号配置参数
     parser.add_argument('--no-strict', action='store_true',
@@ -224,7 +513,25 @@ def main():
     parser.add_argument('--no-power-filter', action='store_true',
                         help='禁用K线力度过滤')
     
+    parser.add_argument('--variant', choices=list(CHART_VARIANTS), default='full',
+                        help='图表变体: full (60根/640px) 或紧凑的右侧变体 (覆盖 --window，输出到独立目录)')
     args = parser.parse_args()
+    if args.confluence and (args.checkpoint or args.chunk_size):
+        parser.error("--confluence 需要完整历史，不能与 --checkpoint / --chunk-size 同时使用")
+    if args.dry_run and args.checkpoint:
+        parser.error("--dry-run 不生成图像，不能与 --checkpoint 同时使用（会推进检查点并跳过这些信号）")
+    
+    # 紧凑变体：只渲染窗口右侧部分、使用更小的画布，输出到独立目录
+    global OUTPUT_DIR, IMAGE_DIR, LABEL_DIR
+    variant = CHART_VARIANTS[args.variant]
+    chart_config = variant.chart_config()
+    if args.variant != 'full':
+        args.window = variant.window_size
+        OUTPUT_DIR = OUTPUT_DIR + variant.suffix
+        IMAGE_DIR = os.path.join(OUTPUT_DIR, "images")
+        LABEL_DIR = os.path.join(OUTPUT_DIR, "labels")
+        if args.shards == SHARD_DIR:
+            args.shards = SHARD_DIR + variant.suffix
     
     # 创建信号配置
     signal_config = SignalConfig(
@@ -242,15 +549,23 @@ def main():
     print(f"📌 K线周期: {args.bar}")
     print(f"📌 获取数量: {args.limit}")
     print(f"📌 窗口大小: {args.window}")
+    if args.variant != 'full':
+        print(f"📌 图表变体: {args.variant} ({variant.img_size}px, 输出: {OUTPUT_DIR})")
     print(f"📌 滑动步长: {args.stride}")
     print(f"📌 严格模式: {not args.no_strict}")
     print(f"📌 Dry Run: {args.dry_run}")
+    if args.confluence:
+        print(f"📌 多周期共振: {args.confluence}")
+    if args.shards:
+        print(f"📌 分片输出: {args.shards}")
     print()
     
     # 确定要处理的 symbol 列表
     symbol_list = []
     
-    if args.top:
+    if args.csv:
+        symbol_list = [args.symbol]
+    elif args.top:
         print(f"🌟 正在获取 OKX 成交量前 {args.top} 的币种...")
         symbol_list = get_top_volume_pairs(args.top)
         print(f"👉 获取到: {len(symbol_list)} 个币种")
@@ -261,37 +576,102 @@ def main():
         symbol_list = [args.symbol]
     
     total_signals_all = 0
+    sample_index = SampleIndex(args.sample_index) if args.sample_index and not args.dry_run else None
+    shard_writer = None
+    if args.shards and not args.dry_run:
+        on_flush = (lambda entries: backfill_from_shards(sample_index, entries)) if sample_index else None
+        shard_writer = ShardWriter(args.shards, on_flush=on_flush)
+    dedup = None
+    if args.dedup_gap > 0:
+        dedup = DedupConfig(max_gap=args.dedup_gap, policy=args.dedup_policy,
+                            max_distance=args.dedup_distance, window_size=args.window)
+    render_cache = None
+    if args.render_cache and not args.dry_run:
+        render_cache = RenderCache(args.render_cache, max_bytes=args.render_cache_mb * 1024 ** 2)
+    signal_store = SignalStore(args.signal_db) if args.signal_db else None
+    checkpoint = DetectCheckpoint(args.checkpoint) if args.checkpoint else None
+    ckpt_key = checkpoint_key(signal_config, chart_config, args.window, args.stride)
+    bar_ms = bar_to_seconds(args.bar) * 1000
+    detect_kwargs = dict(
+        window_size=args.window,
+        stride=args.stride,
+        signal_config=signal_config,
+        dry_run=args.dry_run,
+        shard_writer=shard_writer,
+        render_cache=render_cache,
+        sample_index=sample_index,
+        bar=args.bar,
+        dedup=dedup,
+        chart_config=chart_config,
+        signal_store=signal_store,
+        checkpoint=checkpoint,
+    )
+    if args.confluence:
+        detect_kwargs['confluence'] = ConfluenceConfig(timeframes=parse_timeframes(args.confluence),
+                                                       min_agree=args.confluence_min)
+    all_signals = []
     
     for symbol in symbol_list:
         print("=" * 40)
         print(f"🚀 开始处理: {symbol}")
         print("=" * 40)
         
-        # 获取数据
-        print(f"⏳ 正在获取 {symbol} {args.bar} 数据...")
-        try:
-            df = fetch_candles(symbol, bar=args.bar, limit=args.limit)
-        except Exception as e:
-            print(f"❌ 获取数据异常: {e}")
-            continue
-        
-        if df is None or len(df) < args.window + 120:
-            print(f"❌ 数据获取失败或数据不足")
-            continue
+        # 获取数据（有检查点时只拉取检查点之后的K线，多取几根保证与检查点衔接）
+        limit = args.limit
+        last_ts = checkpoint.last_ts(symbol, args.bar, ckpt_key) if checkpoint is not None else None
+        now_ms = int(datetime.now().timestamp() * 1000)
+        if last_ts is not None:
+            missing = (now_ms - last_ts) // bar_ms + 5
+            if missing <= args.limit:
+                limit = missing
         
-        print(f"✅ 获取到 {len(df)} 根K线")
-        if len(df) > 0:
-            print(f"   时间范围: {df['datetime'].iloc[0]} - {df['datetime'].iloc[-1]}")
-        
-        # 滑动窗口检测
-        signals = sliding_window_detect(
-            df,
-            symbol=symbol,
-            window_size=args.window,
-            stride=args.stride,
-            signal_config=signal_config,
-            dry_run=args.dry_run,
-        )
+        if args.chunk_size > 0:
+            # 分块检测：CSV 按块读取，或从 OKX 按时间正序分页拉取
+            if args.csv:
+                chunks = iter_csv_candles(args.csv, args.chunk_size)
+            else:
+                print(f"⏳ 分页拉取 {symbol} {args.bar} 最近 {limit} 根K线，每块 {args.chunk_size} 根...")
+                chunks = rechunk(iter_candles(symbol, args.bar, start=now_ms - limit * bar_ms), args.chunk_size)
+            try:
+                signals = chunked_detect(chunks, symbol=symbol, **detect_kwargs)
+            except RuntimeError as e:
+                # 拉取中途失败：已处理的块已出图/写入检查点，但本交易对的数据不完整
+                print(f"❌ {symbol} 分块检测中断: {e}")
+                continue
+        else:
+            print(f"⏳ 正在获取 {symbol} {args.bar} 数据...")
+            try:
+                if args.csv:
+                    df = pd.concat(iter_csv_candles(args.csv, 1_000_000), ignore_index=True)
+                else:
+                    df = fetch_candles(symbol, bar=args.bar, limit=limit)
+                    if (limit < args.limit and df is not None and not df.empty
+                            and df['timestamp'].iloc[0] > last_ts + bar_ms):
+                        # 增量拉取没有接上检查点（返回不完整等）：按完整历史重新拉取后全量检测，
+                        # 不能在几根K线上全量检测并覆盖有效的检查点
+                        print(f"   ⚠️ 增量数据与检查点之间有缺口，重新拉取 {args.limit} 根K线")
+                        limit = args.limit
+                        df = fetch_candles(symbol, bar=args.bar, limit=limit)
+            except Exception as e:
+                print(f"❌ 获取数据异常: {e}")
+                continue
+            
+            if df is None or df.empty or (limit == args.limit and len(df) < args.window + 120):
+                print(f"❌ 数据获取失败或数据不足")
+                continue
+            
+            print(f"✅ 获取到 {len(df)} 根K线")
+            if len(df) > 0:
+                print(f"   时间范围: {df['datetime'].iloc[0]} - {df['datetime'].iloc[-1]}")
+            
+            # 滑动窗口检测
+            signals = sliding_window_detect(df, symbol=symbol, **detect_kwargs)
+        if shard_writer is not None:
+            shard_writer.flush()
+        if signal_store is not None:
+            signal_store.flush()
+        if args.output_json:
+            all_signals.extend(dict(sig, symbol=symbol, bar=args.bar) for sig in signals)
         
         if signals:
             total_signals_all += len(signals)
@@ -309,6 +689,29 @@ def main():
         print("\n")
         
     print(f"\n🎉 所有任务完成！总共发现 {total_signals_all} 个信号。")
+    if render_cache is not None:
+        print(f"🗂️ 渲染缓存: {render_cache.summary()}")
+    
+    if shard_writer is not None:
+        shard_writer.close()
+    if sample_index is not None:
+        sample_index.close()
+        print(f"🗃️ 样本索引: {args.sample_index}")
+    if signal_store is not None:
+        signal_store.close()
+        print(f"🗃️ 信号库: {signal_store.summary()}")
+    if checkpoint is not None:
+        checkpoint.close()
+    if args.output_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output_json)), exist_ok=True)
+        with open(args.output_json, 'w', encoding='utf-8') as f:
+            json.dump(all_signals, f, ensure_ascii=False, indent=2, default=str)
+        print(f"💾 信号已保存: {args.output_json} ({len(all_signals)} 条)")
+    
+    if shard_writer is not None:
+        print(f"📦 分片目录: {args.shards} (新增 {shard_writer.written} 个样本，跳过重复 {shard_writer.skipped} 个)")
+        return
+    
     print(f"📁 图像目录: {IMAGE_DIR}")
     print(f"📁 标签目录: {LABEL_DIR}")
     
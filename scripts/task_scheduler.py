@@ -0,0 +1,275 @@
+"""
+Task Scheduler - K线收盘对齐的任务调度服务
+
+- 任务按触发时间放在小顶堆中，调度线程只在堆顶到期（或有新任务插入）时醒来
+- 触发时间对齐到K线收盘边界（任意周期：秒/分/时/日/周/月）再加一个稳定延迟，
+  等交易所把刚收盘的K线落定后再拉数据
+- 状态持久化在 SQLite (WAL)：每次新增/状态变更都是单行事务，不再整体重写 tasks.json；
+  进程重启后从数据库恢复未完成的任务
+- dashboard 通过 pending() 只读查询排队中的任务
+
+使用：
+    python scripts/task_scheduler.py --symbols BTC-USDT-SWAP,ETH-USDT-SWAP --bar 5m       # 每根K线收盘后触发
+    python scripts/task_scheduler.py --symbols BTC-USDT-SWAP --bar 5m --pipeline           # 触发时运行两阶段告警管线
+    python scripts/task_scheduler.py --list                                               # 查看排队任务
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import sqlite3
+import argparse
+import calendar
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from okx_utils import bar_to_seconds
+
+# =================配置=================
+SCHEDULER_DB = "data/scheduler.db"
+DEFAULT_SETTLE = 2.0  # 收盘后的稳定延迟（秒）
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # 与 dashboard 显示格式一致（本地时间）
+# OKX 日线及以上周期默认按 UTC+8 切分，带 utc 后缀的周期按 UTC 切分
+OKX_DAY_OFFSET = 8 * 3600
+# =====================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol       TEXT NOT NULL,
+    bar          TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    payload      TEXT,
+    recurring    INTEGER NOT NULL DEFAULT 0,
+    settle       REAL NOT NULL DEFAULT 0,
+    run_at_ts    REAL NOT NULL,
+    run_at       TEXT NOT NULL,
+    received_at  TEXT NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    updated_at   REAL,
+    UNIQUE (symbol, bar, kind, run_at_ts)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_run ON tasks (status, run_at_ts);
+"""
+
+
+def next_bar_close(bar: str, now: Optional[float] = None, settle: float = 0.0) -> float:
+    """
+    now 之后（不含）的下一个K线收盘时间 + settle，返回 UTC 时间戳
+
+    分钟/小时周期按 UTC 整点对齐；日/周/月周期按 OKX 规则对齐（默认 UTC+8，'utc' 后缀为 UTC），
+    周线从周一开始。
+    """
+    now = time.time() if now is None else now
+    offset = 0 if (bar.endswith('utc') or bar_to_seconds(bar) < 86400) else OKX_DAY_OFFSET
+    unit = bar.replace('utc', '')[-1]
+
+    if unit == 'M':
+        months = int(bar.replace('utc', '')[:-1])
+        local = datetime.fromtimestamp(now + offset, tz=timezone.utc)
+        index = local.year * 12 + local.month - 1
+        index = (index // months + 1) * months
+        boundary = calendar.timegm((index // 12, index % 12 + 1, 1, 0, 0, 0)) - offset
+        return boundary + settle
+
+    period = bar_to_seconds(bar)
+    # 1970-01-01 是周四，周线从 1970-01-05 (周一) 开始对齐
+    origin = -offset + (4 * 86400 if unit == 'W' else 0)
+    boundary = origin + ((now - origin) // period + 1) * period
+    return boundary + settle
+
+
+def _fmt_local(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime(TIME_FORMAT)
+
+
+class TaskScheduler:
+    """堆 + SQLite 的任务调度器"""
+
+    def __init__(self, db_path: str = SCHEDULER_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._heap: List[tuple] = []  # (run_at_ts, id)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._recover()
+
+    def _recover(self):
+        """重启恢复：运行中（上次被中断）的任务重新排队，所有待执行任务入堆"""
+        with self.conn:
+            self.conn.execute("UPDATE tasks SET status = 'pending' WHERE status = 'running'")
+        for row in self.conn.execute("SELECT id, run_at_ts FROM tasks WHERE status = 'pending'"):
+            self._heap.append((row['run_at_ts'], row['id']))
+        heapq.heapify(self._heap)
+
+    # ---------------- 提交 ----------------
+
+    def schedule(self, symbol: str, bar: str, kind: str = 'scan', payload: Optional[dict] = None,
+                 settle: float = DEFAULT_SETTLE, recurring: bool = False,
+                 run_at_ts: Optional[float] = None) -> Optional[int]:
+        """
+        提交任务；默认在下一根K线收盘 + settle 时触发
+
+        同一 (symbol, bar, kind, 触发时间) 只会存在一个任务，重复提交返回 None。
+        """
+        now = time.time()
+        run_at_ts = next_bar_close(bar, now, settle) if run_at_ts is None else run_at_ts
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO tasks (symbol, bar, kind, payload, recurring, settle, run_at_ts, run_at, "
+                "received_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (symbol, bar, kind, json.dumps(payload or {}), int(recurring), settle, run_at_ts,
+                 _fmt_local(run_at_ts), _fmt_local(now), now),
+            )
+            if cur.rowcount == 0:
+                return None
+            task_id = cur.lastrowid
+            heapq.heappush(self._heap, (run_at_ts, task_id))
+        self._wakeup.set()
+        return task_id
+
+    def cancel(self, task_id: int):
+        """取消任务（堆中的条目在出堆时按状态跳过）"""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE tasks SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'pending'",
+                              (time.time(), task_id))
+
+    # ---------------- 查询 ----------------
+
+    def pending(self, limit: int = 100) -> List[dict]:
+        """按触发时间排序的排队任务"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM tasks WHERE status = 'pending' ORDER BY run_at_ts LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    # ---------------- 执行 ----------------
+
+    def _set_status(self, task_id: int, status: str, error: Optional[str] = None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, updated_at = ?, "
+                "attempts = attempts + (? = 'running') WHERE id = ?",
+                (status, error, time.time(), status, task_id))
+
+    def _pop_due(self) -> Optional[dict]:
+        """弹出一个已到期且仍处于 pending 的任务；没有则返回 None"""
+        with self._lock:
+            while self._heap and self._heap[0][0] <= time.time():
+                _, task_id = heapq.heappop(self._heap)
+                row = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                if row is not None and row['status'] == 'pending':
+                    return dict(row)
+        return None
+
+    def _seconds_to_next(self) -> Optional[float]:
+        with self._lock:
+            return max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+
+    def run_forever(self, handlers: Dict[str, Callable[[dict], None]]):
+        """调度循环：到期任务按 kind 分发给 handler；recurring 任务执行后排到下一根K线"""
+        while not self._stop.is_set():
+            # 先清除唤醒标记再查堆，避免在两者之间插入的任务被错过
+            self._wakeup.clear()
+            task = self._pop_due()
+            if task is None:
+                self._wakeup.wait(self._seconds_to_next())
+                continue
+
+            self._set_status(task['id'], 'running')
+            handler = handlers.get(task['kind'])
+            try:
+                if handler is None:
+                    raise KeyError(f"没有处理 {task['kind']} 的 handler")
+                task['payload'] = json.loads(task['payload'] or '{}')
+                handler(task)
+                self._set_status(task['id'], 'done')
+            except Exception as e:
+                print(f"   ⚠️ 任务 {task['id']} ({task['symbol']} {task['kind']}) 失败: {e}")
+                self._set_status(task['id'], 'failed', str(e))
+
+            if task['recurring']:
+                self.schedule(task['symbol'], task['bar'], task['kind'], task['payload'],
+                              settle=task['settle'], recurring=True)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def close(self):
+        self.conn.close()
+
+
+def read_pending(db_path: str = SCHEDULER_DB, limit: int = 100) -> List[dict]:
+    """只读查询排队任务（dashboard 使用，不创建数据库、不加写锁）"""
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute("SELECT symbol, bar, kind, run_at, received_at, run_at_ts FROM tasks "
+                            "WHERE status = 'pending' ORDER BY run_at_ts LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="K线收盘对齐的任务调度服务")
+    parser.add_argument('--db', type=str, default=SCHEDULER_DB, help=f'状态数据库 (default: {SCHEDULER_DB})')
+    parser.add_argument('--symbols', type=str, default=None, help='交易对列表 (逗号分隔)，每根K线收盘后触发扫描')
+    parser.add_argument('--bar', type=str, default='5m', help='K线周期 (default: 5m)')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE, help=f'收盘后的稳定延迟秒数 (default: {DEFAULT_SETTLE})')
+    parser.add_argument('--pipeline', action='store_true', help='触发时运行 live_pipeline 两阶段告警')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch', help='--pipeline 的模型后端')
+    parser.add_argument('--list', action='store_true', help='列出排队任务后退出')
+    args = parser.parse_args()
+
+    scheduler = TaskScheduler(args.db)
+    if args.list:
+        for t in scheduler.pending():
+            print(f"   #{t['id']:<6} {t['symbol']:16} {t['bar']:5} {t['kind']:8} 计划: {t['run_at']}")
+        return
+
+    symbols = [s.strip() for s in (args.symbols or '').split(',') if s.strip()]
+    for symbol in symbols:
+        scheduler.schedule(symbol, args.bar, 'scan', settle=args.settle, recurring=True)
+
+    if args.pipeline:
+        from live_pipeline import TwoStagePipeline, ONNX_MODEL_PATH, MODEL_PATH, run_cycle
+        pipeline = TwoStagePipeline(ONNX_MODEL_PATH if args.backend == 'onnx' else MODEL_PATH,
+                                    backend=args.backend, bar=args.bar)
+
+        def handle_scan(task):
+            run_cycle(pipeline, [task['symbol']])
+    else:
+        def handle_scan(task):
+            lag = time.time() - task['run_at_ts']
+            print(f"⏰ {task['symbol']} {task['bar']} 收盘任务触发 (计划 {task['run_at']}, 偏差 {lag * 1000:.0f}ms)")
+
+    print(f"🚀 调度器启动: 排队任务 {len(scheduler.pending())} 个 (数据库: {args.db})")
+    try:
+        scheduler.run_forever({'scan': handle_scan})
+    except KeyboardInterrupt:
+        print("\n⏹ 已停止")
+    finally:
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,50 +5,183 @@ YOLO 模型训练脚本
 2. 读取数据集配置文件 (dataset.yaml)
 3. 执行模型训练 (Fine-tuning)
 4. 保存最佳权重
+5. 记录训练吞吐遥测：每轮 images/sec、数据加载等待时间、训练/整轮耗时 (JSONL)
 
 使用前请确保：
 1. 已运行 prepare_yolo_data.py 生成了 data/yolo_dataset
 2. 已安装 ultralytics 库
+
+如果使用分片数据集（prepare_yolo_data.py --shards），
+将 DATA_YAML 指向 data/pine_shards/dataset.yaml 即可，训练器会直接从 tar 分片读取。
+
+使用：
+    python scripts/train_yolo.py                                   # 自动选择设备 (cuda -> mps -> cpu)
+    python scripts/train_yolo.py --device cpu --workers 4 --cache ram --epochs 5
+    python scripts/train_yolo.py data/pine_shards/dataset.yaml --batch 32
+    python scripts/train_yolo.py --variant compact320                # 紧凑右侧变体 (320px)
 """
 
-from ultralytics import YOLO
 import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from shard_dataset import is_shard_dataset, get_shard_trainer
+from chart_generator import CHART_VARIANTS
+
+# 数据集配置文件 (prepare_yolo_data.py 生成)
+DATA_YAML = "data/yolo_dataset/dataset.yaml"
+
+# 训练默认参数
+EPOCHS = 50
+BATCH = 16
+IMGSZ = 640
+PROJECT = "runs/detect"
+NAME = "kline_cluster_yolo11"
+METRICS_FILE = "train_metrics.jsonl"  # 写在实验目录下
+
+
+def select_device(requested: str = 'auto') -> str:
+    """auto: cuda -> mps -> cpu；其他值原样返回"""
+    if requested != 'auto':
+        return requested
+    import torch
+    if torch.cuda.is_available():
+        return '0'
+    if getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+class TrainTelemetry:
+    """
+    通过 ultralytics 回调记录每轮训练吞吐
+
+    数据加载等待 = 上一个 batch 结束到下一个 batch 开始之间的时间（即 dataloader 取数耗时）
+    """
+
+    def __init__(self, metrics_path: str, device: str):
+        self.metrics_path = metrics_path
+        self.device = device
+        self._reset()
+
+    def _reset(self):
+        self.epoch_start = self.last_batch_end = time.perf_counter()
+        self.wait = 0.0
+        self.batches = 0
+        self.train_time = None
+
+    def register(self, model):
+        model.add_callback('on_train_epoch_start', self.on_train_epoch_start)
+        model.add_callback('on_train_batch_start', self.on_train_batch_start)
+        model.add_callback('on_train_batch_end', self.on_train_batch_end)
+        model.add_callback('on_train_epoch_end', self.on_train_epoch_end)
+        model.add_callback('on_fit_epoch_end', self.on_fit_epoch_end)
+
+    def on_train_epoch_start(self, trainer):
+        self._reset()
 
-def train():
+    def on_train_batch_start(self, trainer):
+        self.wait += time.perf_counter() - self.last_batch_end
+
+    def on_train_batch_end(self, trainer):
+        self.batches += 1
+        self.last_batch_end = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer):
+        self.train_time = time.perf_counter() - self.epoch_start
+
+    def on_fit_epoch_end(self, trainer):
+        """整轮（训练 + 验证）结束，写一行指标"""
+        epoch_time = time.perf_counter() - self.epoch_start
+        train_time = self.train_time or epoch_time
+        images = self.batches * trainer.batch_size
+        dataset = getattr(getattr(trainer, 'train_loader', None), 'dataset', None)
+        if dataset is not None:
+            images = min(images, len(dataset))
+
+        record = {
+            'epoch': trainer.epoch + 1,
+            'device': self.device,
+            'batches': self.batches,
+            'images': images,
+            'train_time_s': round(train_time, 3),
+            'epoch_time_s': round(epoch_time, 3),
+            'images_per_s': round(images / train_time, 2) if train_time > 0 else None,
+            'dataloader_wait_s': round(self.wait, 3),
+            'dataloader_wait_ratio': round(self.wait / train_time, 4) if train_time > 0 else None,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.metrics_path)), exist_ok=True)
+        with open(self.metrics_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"⏱ epoch {record['epoch']}: {record['images_per_s']} img/s, "
+              f"数据等待 {record['dataloader_wait_s']}s ({(record['dataloader_wait_ratio'] or 0) * 100:.1f}%), "
+              f"整轮 {record['epoch_time_s']}s")
+
+
+def train(device: str = 'auto', epochs: int = EPOCHS, batch: int = BATCH, imgsz: int = IMGSZ,
+          workers: int = None, cache: str = 'none', metrics_path: str = None):
     """执行训练流程"""
     # 1. 加载模型
     # yolo11n.pt 是 Nano 版本，速度最快，适合实时检测
     print("🚀 加载 YOLO11 Nano 模型...")
-    model = YOLO("yolo11n.pt") 
-    
+    from ultralytics import YOLO
+    model = YOLO("yolo11n.pt")
+
     # 2. 配置文件路径
     # 必须指向 prepare_yolo_data.py 生成的 dataset.yaml
-    yaml_path = os.path.abspath("data/yolo_dataset/dataset.yaml")
-    
+    yaml_path = os.path.abspath(DATA_YAML)
+
     if not os.path.exists(yaml_path):
         print(f"❌ 未找到配置文件: {yaml_path}")
         print("   请先运行: python scripts/prepare_yolo_data.py")
         return
-    
+
+    # 分片数据集使用自定义训练器直接读取 tar 分片
+    extra = {}
+    if is_shard_dataset(yaml_path):
+        print("📦 检测到分片数据集，使用分片加载器")
+        extra['trainer'] = get_shard_trainer()
+        if cache == 'disk':
+            # 分片样本没有对应的图像文件，无法在旁边写 .npy
+            print("⚠️ 分片数据集不支持磁盘缓存，改用内存缓存")
+            cache = 'ram'
+
+    device = select_device(device)
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    metrics_path = metrics_path or os.path.join(PROJECT, NAME, METRICS_FILE)
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)
+    TrainTelemetry(metrics_path, device).register(model)
+
     # 3. 开始训练
     print(f"🔥 开始训练 (配置文件: {yaml_path})...")
+    print(f"   设备: {device}, epochs: {epochs}, batch: {batch}, imgsz: {imgsz}, "
+          f"workers: {workers}, cache: {cache}")
     # 参数说明：
     # epochs: 训练轮数 (建议 50-100)
     # imgsz: 输入图像大小 (需与生成图像时保持一致或接近)
     # batch: 批次大小 (根据显存调整)
-    # device: 'mps' (Mac M系列芯片), 'cuda' (NVIDIA GPU), 'cpu'
+    # device: 'mps' (Mac M系列芯片), '0' (NVIDIA GPU), 'cpu'，默认自动选择
+    # workers: 数据加载进程数；cache: 'ram' / 'disk' 缓存解码后的图像，减少每轮 PNG 解码
     # 参考: 金融图表训练最佳实践
     # 严禁使用 flipud, degrees, mosaic 等破坏 K 线结构和时间序列的增强
     results = model.train(
         data=yaml_path,
-        epochs=50,          
-        imgsz=640,          
-        batch=16,
-        project="runs/detect",  # 训练结果保存目录
-        name="kline_cluster_yolo11", # 实验名称
+        epochs=epochs,
+        imgsz=imgsz,
+        batch=batch,
+        workers=workers,
+        cache=False if cache == 'none' else cache,
+        project=PROJECT,    # 训练结果保存目录
+        name=NAME,          # 实验名称
         exist_ok=True,      # 是否覆盖同名实验目录
-        device='mps',       # Mac M系列芯片加速 (如果不适用请改为 'cpu')
-        
+        device=device,
+
         # =========================================
         # 数据增强覆盖 (针对 K 线图优化)
         # =========================================
@@ -62,10 +195,32 @@ def train():
         mosaic=0.0,       # 禁止马赛克 (破坏时间连续性)
         mixup=0.0,        # 禁止混合
         # =========================================
+        **extra,
     )
-    
+
     print("✅ 训练完成！")
-    print(f"   最佳模型权重已保存至: runs/detect/kline_cluster_yolo11/weights/best.pt")
+    print(f"   最佳模型权重已保存至: {PROJECT}/{NAME}/weights/best.pt")
+    print(f"   吞吐遥测: {metrics_path}")
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="YOLO 模型训练")
+    parser.add_argument('data', nargs='?', default=None, help=f'dataset.yaml 路径 (default: {DATA_YAML})')
+    parser.add_argument('--device', type=str, default='auto', help="设备: auto / cpu / mps / 0 (default: auto)")
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help=f'训练轮数 (default: {EPOCHS})')
+    parser.add_argument('--batch', type=int, default=BATCH, help=f'批次大小 (default: {BATCH})')
+    parser.add_argument('--imgsz', type=int, default=None, help=f'输入尺寸 (default: {IMGSZ}，紧凑变体为其图像尺寸)')
+    parser.add_argument('--workers', type=int, default=None, help='数据加载进程数 (default: min(8, CPU 核数))')
+    parser.add_argument('--cache', choices=['none', 'ram', 'disk'], default='none', help='图像缓存方式 (default: none)')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help=f'吞吐遥测输出 (default: {PROJECT}/{NAME}/{METRICS_FILE})')
+    parser.add_argument('--variant', choices=list(CHART_VARIANTS), default='full',
+                        help='图表变体：决定默认数据集、输入尺寸与实验名称')
+    args = parser.parse_args()
+
+    variant = CHART_VARIANTS[args.variant]
+    if variant.suffix:
+        DATA_YAML = f"data/yolo_dataset{variant.suffix}/dataset.yaml"
+        NAME = NAME + variant.suffix
+    DATA_YAML = args.data or DATA_YAML
+    imgsz = args.imgsz or (variant.img_size if variant.suffix else IMGSZ)
+    train(args.device, args.epochs, args.batch, imgsz, args.workers, args.cache, args.metrics)
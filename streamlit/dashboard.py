@@ -1,33 +1,125 @@
 import streamlit as st
-import json, os, time
+import json, os, sys, time
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from file_index import NewestFileIndex, path_mtime
+
 st.set_page_config(page_title="YOLO 采集指挥中心", layout="wide")
 
 # --- 核心修复：向上跳一级定位根目录的 tasks.json ---
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
-BASE_DIR = os.path.dirname(CUR_DIR) 
+BASE_DIR = os.path.dirname(CUR_DIR)
 JSON_PATH = os.path.join(BASE_DIR, "tasks.json")
 # 注意：根据你的截图，图片似乎在根目录的 datasets/raw_signals
 RAW_PATH = os.path.join(BASE_DIR, "datasets", "raw_signals")
+# task_scheduler.py 的状态库；存在时优先从中读取排队任务
+SCHEDULER_DB = os.path.join(BASE_DIR, "data", "scheduler.db")
+# alert_dispatcher.py 的 FileSink 输出
+ALERT_FEED = os.path.join(BASE_DIR, "data", "alert_feed.jsonl")
+ALERT_FEED_ROWS = 10
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+# 刷新策略：每秒只 stat 任务来源与图片目录，有变化才重跑页面；
+# 有排队任务时每 COUNTDOWN_REFRESH 秒刷新一次倒计时
+POLL_INTERVAL = 1.0
+COUNTDOWN_REFRESH = 5.0
+THUMB_WIDTH = 640
+
+
+@st.cache_resource
+def get_file_index(path: str) -> NewestFileIndex:
+    """跨刷新/会话共享的增量索引，只对新增文件 stat"""
+    return NewestFileIndex(path, '.png')
+
+
+@st.cache_data(max_entries=8)
+def load_tasks(path: str, mtime: int) -> list:
+    """tasks.json 只在 mtime 变化时重新解析"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+@st.cache_data(max_entries=32)
+def load_thumbnail(path: str, mtime: int) -> bytes:
+    """缩略图按 (路径, mtime) 缓存"""
+    from io import BytesIO
+    from PIL import Image
+    with Image.open(path) as img:
+        img.thumbnail((THUMB_WIDTH, THUMB_WIDTH))
+        buf = BytesIO()
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@st.cache_data(max_entries=8)
+def load_scheduled(db_path: str, signature: tuple) -> list:
+    """调度器排队任务（只读查询），只在数据库文件变化时重新查询"""
+    from task_scheduler import read_pending
+    return read_pending(db_path)
+
+
+@st.cache_data(max_entries=8)
+def load_alert_feed(path: str, mtime: int, rows: int = ALERT_FEED_ROWS) -> list:
+    """告警流最近 rows 条（只读文件尾部 64KB），只在 mtime 变化时重新读取"""
+    tail = 64 * 1024
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - tail))
+            lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    except OSError:
+        return []
+    if size > tail:
+        lines = lines[1:]  # 第一行可能被截断
+    alerts = []
+    for line in reversed(lines):
+        try:
+            alerts.append(json.loads(line))
+        except ValueError:
+            continue
+        if len(alerts) >= rows:
+            break
+    return alerts
+
+
+def scheduler_signature():
+    """WAL 模式下写入先落在 -wal 文件，两者的 mtime 一起作为变化标记"""
+    return path_mtime(SCHEDULER_DB), path_mtime(SCHEDULER_DB + "-wal")
+
+
+def change_signature(index: NewestFileIndex):
+    """页面依赖的所有输入的变化标记"""
+    index.refresh()
+    return path_mtime(JSON_PATH), scheduler_signature(), path_mtime(ALERT_FEED), index.version
+
+
+file_index = get_file_index(RAW_PATH)
+file_index.refresh()
 
 # 侧边栏调试信息
 st.sidebar.markdown(f"**文件状态检查**")
-if os.path.exists(JSON_PATH):
+tasks_mtime = path_mtime(JSON_PATH)
+use_scheduler = os.path.exists(SCHEDULER_DB)
+if use_scheduler:
+    st.sidebar.success("🔗 调度器数据库已连接")
+elif tasks_mtime is not None:
     st.sidebar.success("🔗 tasks.json 已连接")
 else:
     st.sidebar.error("❓ 未找到 tasks.json")
     st.sidebar.info(f"搜索路径: {JSON_PATH}")
+st.sidebar.caption(f"已索引图片: {len(file_index)}")
 
 st.title("📈 YOLO 实时信号采集流")
 
 # 读取任务
-tasks = []
-if os.path.exists(JSON_PATH):
-    try:
-        with open(JSON_PATH, "r") as f:
-            tasks = json.load(f)
-    except: pass
+if use_scheduler:
+    tasks = load_scheduled(SCHEDULER_DB, scheduler_signature())
+else:
+    tasks = load_tasks(JSON_PATH, tasks_mtime) if tasks_mtime is not None else []
 
 col1, col2 = st.columns([1.2, 1])
 
@@ -39,7 +131,7 @@ with col1:
         for t in tasks:
             run_at = datetime.strptime(t['run_at'], "%Y-%m-%d %H:%M:%S")
             rem = (run_at - datetime.now()).total_seconds()
-            
+
             with st.container():
                 st.markdown(f"""
                 <div style="background:#161b22; padding:15px; border-radius:10px; border-left:5px solid #00ffcc; margin-bottom:10px;">
@@ -55,14 +147,45 @@ with col1:
 with col2:
     st.subheader("📸 最新抓拍预览")
     if os.path.exists(RAW_PATH):
-        files = sorted([f for f in os.listdir(RAW_PATH) if f.endswith('.png')], 
-                       key=lambda x: os.path.getctime(os.path.join(RAW_PATH, x)), reverse=True)
-        if files:
-            st.image(os.path.join(RAW_PATH, files[0]), caption=f"最新: {files[0]}")
+        newest = file_index.newest(1)
+        if newest:
+            _, latest = newest[0]
+            mtime = path_mtime(latest)
+            if mtime is not None:
+                st.image(load_thumbnail(latest, mtime), caption=f"最新: {os.path.basename(latest)}")
         else:
             st.warning("暂无图片预览")
     else:
         st.error(f"路径不存在: {RAW_PATH}")
 
-time.sleep(3)
-st.rerun()
\ No newline at end of file
+feed_mtime = path_mtime(ALERT_FEED)
+if feed_mtime is not None:
+    st.subheader("🔔 最新告警")
+    feed = load_alert_feed(ALERT_FEED, feed_mtime)
+    if feed:
+        st.table([{
+            "交易对": a.get("symbol"),
+            "方向": a.get("type"),
+            "信号时间": a.get("signal_time", datetime.fromtimestamp(a["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+                              if "ts" in a else ""),
+            "收盘价": a.get("close"),
+            "置信度": round(a["model"]["conf"], 2) if isinstance(a.get("model"), dict) else None,
+        } for a in feed])
+
+# 等待输入变化再刷新（而不是固定 3 秒全量重跑）：
+# 只有下面这个片段每 POLL_INTERVAL 秒重跑一次，不阻塞脚本线程，页面关闭后随会话停止
+st.session_state['signature'] = change_signature(file_index)
+st.session_state['next_countdown'] = time.time() + COUNTDOWN_REFRESH if tasks else None
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def watch_changes():
+    """输入变化或倒计时到期时整页重跑"""
+    next_countdown = st.session_state.get('next_countdown')
+    if change_signature(file_index) != st.session_state.get('signature'):
+        st.rerun()
+    if next_countdown is not None and time.time() >= next_countdown:
+        st.rerun()
+
+
+watch_changes()
@@ -0,0 +1,81 @@
+"""
+增量的"最新文件"索引
+
+dashboard 每次刷新都 listdir + 对每个 PNG 调 getctime，开销随归档线性增长。这里改为：
+1. 目录自身的 mtime 不变 -> 目录内没有增删改名，直接返回缓存结果（一次 stat）
+2. 目录 mtime 变化 -> 一次 scandir 拿到文件名，只对新出现的文件 stat，消失的文件从索引删除
+3. 按 ctime 维护最新的若干个文件
+"""
+
+import os
+import heapq
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def path_mtime(path: str) -> Optional[int]:
+    """文件/目录的 mtime (ns)，不存在时返回 None"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class NewestFileIndex:
+    """目录内指定后缀文件的增量索引（线程安全，可放在 st.cache_resource 中跨会话共享）"""
+
+    def __init__(self, directory: str, suffix: str = '.png'):
+        self.directory = directory
+        self.suffix = suffix
+        self._ctimes: Dict[str, float] = {}
+        self._dir_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self.version = 0  # 每次内容变化 +1，可作为缓存键
+        self._newest: Tuple[int, int, List[Tuple[float, str]]] = (-1, 0, [])  # (version, k, 结果)
+
+    def refresh(self) -> bool:
+        """检查目录是否变化并增量更新；返回是否有变化"""
+        with self._lock:
+            mtime = path_mtime(self.directory)
+            if mtime == self._dir_mtime:
+                return False
+            self._dir_mtime = mtime
+            if mtime is None:
+                changed = bool(self._ctimes)
+                self._ctimes.clear()
+                self.version += changed
+                return changed
+
+            with os.scandir(self.directory) as it:
+                present = {e.name: e for e in it if e.name.endswith(self.suffix)}
+
+            removed = self._ctimes.keys() - present.keys()
+            for name in removed:
+                del self._ctimes[name]
+            added = 0
+            for name, entry in present.items():
+                if name in self._ctimes:
+                    continue
+                try:
+                    self._ctimes[name] = entry.stat().st_ctime
+                    added += 1
+                except FileNotFoundError:
+                    continue
+
+            changed = bool(removed or added)
+            self.version += changed
+            return changed
+
+    def newest(self, k: int = 1) -> List[Tuple[float, str]]:
+        """最新的 k 个文件 [(ctime, 完整路径)]，按时间降序"""
+        with self._lock:
+            version, cached_k, result = self._newest
+            if version == self.version and cached_k >= k:
+                return result[:k]
+            top = heapq.nlargest(k, self._ctimes.items(), key=lambda kv: kv[1])
+            result = [(ctime, os.path.join(self.directory, name)) for name, ctime in top]
+            self._newest = (self.version, k, result)
+            return result
+
+    def __len__(self):
+        return len(self._ctimes)